@@ -1,11 +1,15 @@
 from flask import Flask
 from flask_cors import CORS
 import os
-from .routes.views import views_routes
-from .routes.data import data_routes, initialize_data
-from .routes.status import status_routes, health_check
 
-def create_app():
+def create_app(start_scheduler: bool = True):
+    # Routes are imported here as they load the views and start the file watcher on import;
+    # importing the package alone (e.g. in preprocessing worker processes) stays side-effect free
+    from .routes.views import views_routes
+    from .routes.data import data_routes, initialize_data, start_refresh_scheduler
+    from .routes.tiles import tiles_routes
+    from .routes.status import status_routes, health_check
+    
     app = Flask(__name__,
                 template_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates'))
     CORS(app)  # Allow CORS for all routes
@@ -13,6 +17,7 @@ def create_app():
     # Register blueprints with /api prefix
     app.register_blueprint(views_routes, url_prefix='/api')
     app.register_blueprint(data_routes, url_prefix='/api')
+    app.register_blueprint(tiles_routes, url_prefix='/api')
     app.register_blueprint(status_routes, url_prefix='/api')
     
     # Add direct health endpoint at root level
@@ -21,6 +26,13 @@ def create_app():
     # Initialize data processing
     with app.app_context():
         initialize_data()
+    # Keep data sources warm ahead of their refresh_interval (one worker runs the refreshes) and
+    # reload views when their config changes. A preloaded gunicorn master passes
+    # start_scheduler=False to stay single-threaded; workers start both after the fork
+    if start_scheduler:
+        from .routes.views import view_manager
+        view_manager.start_watching()
+        start_refresh_scheduler()
     
     # Print all registered routes
     print("\nRegistered Routes:")
@@ -1,69 +1,144 @@
 import yaml
+import threading
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 from .data_sources import DataSourceType, DataSourceConfigFactory
 
 class ConfigLoader:
+    """
+    Registry of view configurations.
+    
+    Each view file is parsed once and its data sources and layers are indexed by id.
+    The ViewManager file watcher keeps the registry current by calling load_view_config
+    and remove_view_config for created, modified and deleted files.
+    """
+    
     def __init__(self, config_dir: str):
         self.config_dir = Path(config_dir)
+        self._lock = threading.RLock()
+        self._loaded = False
+        # Parsed view files and their modification times by path
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._file_mtimes: Dict[str, Optional[float]] = {}
+        # id -> {path: definition}, ordered by path so the winner of a duplicate id is stable
+        self._data_sources: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._layers: Dict[str, Dict[str, Dict[str, Any]]] = {}
         
-    def load_view_config(self, config_path: str) -> Optional[Dict[str, Any]]:
-        """Load a view configuration from a specific file"""
+    @staticmethod
+    def _normalize_path(config_path: str) -> str:
+        """Index files by absolute path so watcher events and globbed paths match"""
+        return str(Path(config_path).resolve())
+    
+    @staticmethod
+    def _get_mtime(config_path: str) -> Optional[float]:
+        try:
+            return Path(config_path).stat().st_mtime
+        except OSError:
+            return None
+    
+    def _ensure_loaded(self) -> None:
+        """Parse all view files on first use"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            for config_file in sorted(self.config_dir.glob('views/*.yaml')):
+                self._index_file(str(config_file))
+            self._report_duplicates()
+    
+    def _index_file(self, config_path: str) -> Optional[Dict[str, Any]]:
+        """Parse one view file and replace its entries in the id indexes"""
+        config_path = self._normalize_path(config_path)
+        mtime = self._get_mtime(config_path)
         try:
             with open(config_path, 'r') as f:
                 config = yaml.safe_load(f)
-                if self.validate_config(config):
-                    return config
-                else:
-                    print(f"Invalid config format in {config_path}")
-                    return None
         except Exception as e:
             print(f"Error loading view config from {config_path}: {str(e)}")
+            config = None
+        
+        with self._lock:
+            self._unindex_file(config_path)
+            if not isinstance(config, dict):
+                return None
+            self._files[config_path] = config
+            self._file_mtimes[config_path] = mtime
+            for index, key in ((self._data_sources, 'data_sources'), (self._layers, 'layers')):
+                for entry in config.get(key) or []:
+                    if isinstance(entry, dict) and entry.get('id'):
+                        definitions = index.setdefault(entry['id'], {})
+                        definitions[config_path] = entry
+                        index[entry['id']] = dict(sorted(definitions.items()))
+        return config
+    
+    def _unindex_file(self, config_path: str) -> None:
+        """Drop a view file and the ids it defined from the indexes"""
+        config = self._files.pop(config_path, None)
+        self._file_mtimes.pop(config_path, None)
+        if not config:
+            return
+        for index, key in ((self._data_sources, 'data_sources'), (self._layers, 'layers')):
+            for entry in config.get(key) or []:
+                if not isinstance(entry, dict) or entry.get('id') not in index:
+                    continue
+                index[entry['id']].pop(config_path, None)
+                if not index[entry['id']]:
+                    del index[entry['id']]
+    
+    def _report_duplicates(self, config_path: Optional[str] = None) -> None:
+        """Report ids defined in more than one view file (optionally only those involving config_path)"""
+        for kind, index in (('data source', self._data_sources), ('layer', self._layers)):
+            for entry_id, definitions in index.items():
+                if len(definitions) > 1 and (config_path is None or config_path in definitions):
+                    paths = list(definitions)
+                    print(f"Duplicate {kind} id '{entry_id}' defined in {paths}, using {paths[0]}")
+        
+    def load_view_config(self, config_path: str) -> Optional[Dict[str, Any]]:
+        """Load (or reload) a view configuration from a specific file and update the indexes"""
+        config_path = self._normalize_path(config_path)
+        with self._lock:
+            self._ensure_loaded()
+            config = self._files.get(config_path)
+            if config is None or self._file_mtimes.get(config_path) != self._get_mtime(config_path):
+                config = self._index_file(config_path)
+                self._report_duplicates(config_path)
+        if config is None:
+            return None
+        if self.validate_config(config):
+            return config
+        else:
+            print(f"Invalid config format in {config_path}")
             return None
+    
+    def remove_view_config(self, config_path: str) -> None:
+        """Remove a deleted view file from the indexes"""
+        self._ensure_loaded()
+        with self._lock:
+            self._unindex_file(self._normalize_path(config_path))
             
     def load_data_source_config(self, source_id: str) -> Optional[Dict[str, Any]]:
         """Load configuration for a specific data source"""
-        try:
-            # Look for the data source in all view configs
-            for config_file in self.config_dir.glob('views/*.yaml'):
-                with open(config_file, 'r') as f:
-                    config = yaml.safe_load(f)
-                    if not config or 'data_sources' not in config:
-                        continue
-                        
-                    for source in config['data_sources']:
-                        if source.get('id') == source_id:
-                            return source
-                            
-            return None
-            
-        except Exception as e:
-            print(f"Error loading data source config: {str(e)}")
-            return None
+        self._ensure_loaded()
+        with self._lock:
+            definitions = self._data_sources.get(source_id)
+            return next(iter(definitions.values())) if definitions else None
             
     def get_data_source_config(self, source_id: str) -> Optional[Dict[str, Any]]:
         """Get configuration for a specific data source (alias for load_data_source_config)"""
         return self.load_data_source_config(source_id)
+    
+    def get_data_source_configs(self) -> List[Dict[str, Any]]:
+        """Get the configuration of every data source, one per id"""
+        self._ensure_loaded()
+        with self._lock:
+            return [next(iter(definitions.values())) for definitions in self._data_sources.values()]
         
     def get_layer_config(self, layer_id: str) -> Optional[Dict[str, Any]]:
         """Get configuration for a specific layer"""
-        try:
-            # Look for the layer in all view configs
-            for config_file in self.config_dir.glob('views/*.yaml'):
-                with open(config_file, 'r') as f:
-                    config = yaml.safe_load(f)
-                    if not config or 'layers' not in config:
-                        continue
-                        
-                    for layer in config['layers']:
-                        if layer.get('id') == layer_id:
-                            return layer
-                            
-            return None
-            
-        except Exception as e:
-            print(f"Error loading layer config: {str(e)}")
-            return None
+        self._ensure_loaded()
+        with self._lock:
+            definitions = self._layers.get(layer_id)
+            return next(iter(definitions.values())) if definitions else None
 
     def validate_config(self, config: Dict[str, Any]) -> bool:
         """Validate the configuration format"""
@@ -21,7 +21,9 @@ class S3DataSourceConfig(BaseDataSourceConfig):
     bucket: str
     key: str
     region: str
-    format: str  # csv, json, parquet, etc.
+    format: str  # csv, jsonl, json or parquet (from the key's extension when not set)
+    compression: Optional[str]  # gzip (implied by a .gz key)
+    endpoint_url: Optional[str]  # local S3 stand-in (e.g. a moto server or MinIO) for offline testing
 
 class APIDataSourceConfig(BaseDataSourceConfig):
     url: str
@@ -35,9 +37,15 @@ class DatabaseDataSourceConfig(BaseDataSourceConfig):
     query: str
     parameters: Optional[dict]
 
+class H3PyramidConfig(TypedDict):
+    value_field: str
+    min_resolution: int
+    max_resolution: int
+
 class FileDataSourceConfig(BaseDataSourceConfig):
     path: str
     format: str
+    h3_pyramid: Optional[H3PyramidConfig]  # resolutions served without re-aggregation
 
 class FunctionDataSourceConfig(BaseDataSourceConfig):
     module: str
@@ -51,6 +59,7 @@ class AthenaDataSourceConfig(BaseDataSourceConfig):
     region: Optional[str]
     environment: Optional[str]  # prod, preprod, dev
     output_location: Optional[str]  # S3 location for query results
+    endpoint_url: Optional[str]  # local Athena/S3 stand-in (e.g. a moto server) for offline testing
 
 # Factory for creating data source configs
 class DataSourceConfigFactory:
@@ -20,6 +20,20 @@ class ViewConfigHandler(FileSystemEventHandler):
             print(f"Config file modified: {event.src_path}")
             self.view_manager.load_view_config(event.src_path)
             
+    def on_deleted(self, event):
+        if event.src_path.endswith('.yaml'):
+            print(f"Config file deleted: {event.src_path}")
+            self.view_manager.remove_view_config(event.src_path)
+            
+    def on_moved(self, event):
+        # Editors often save by writing a temporary file and renaming it over the original
+        if event.src_path.endswith('.yaml'):
+            print(f"Config file moved away: {event.src_path}")
+            self.view_manager.remove_view_config(event.src_path)
+        if event.dest_path.endswith('.yaml'):
+            print(f"Config file moved in: {event.dest_path}")
+            self.view_manager.load_view_config(event.dest_path)
+            
 class ViewManager:
     def __init__(self, config_dir: str):
         self.config_dir = Path(config_dir)
@@ -70,6 +84,18 @@ class ViewManager:
         except Exception as e:
             print(f"Error loading view configuration {config_path}: {str(e)}")
             
+    def remove_view_config(self, config_path: str):
+        """Forget a deleted view configuration"""
+        try:
+            view_id = Path(config_path).stem
+            self.config_loader.remove_view_config(config_path)
+            if self.views.pop(view_id, None):
+                print(f"Removed view: {view_id}")
+            print(f"Current views: {list(self.views.keys())}")
+            
+        except Exception as e:
+            print(f"Error removing view configuration {config_path}: {str(e)}")
+            
     def load_all_views(self):
         """Load all view configurations from the views directory"""
         print(f"Loading all views from: {self.views_dir}")
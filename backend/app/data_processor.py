@@ -1,89 +1,1074 @@
 import pandas as pd
+import numpy as np
 import h3
+import hashlib
+import io
 import json
+import math
+import multiprocessing
+import os
+import shutil
+import time
+import threading
+import psutil
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any
-from .utils.aggregations import create_heatmap_geojson, create_h3_grid_geojson
+from typing import Dict, Any, List, Optional
+from .utils.aggregations import (
+    create_points_geojson, create_heatmap_geojson, create_h3_grid_geojson, aggregate_h3_cells,
+    roll_up_h3_cells, h3_cells_to_collection, bin_heatmap_cells, heatmap_cell_size, heatmap_cells_to_geojson,
+    merge_h3_cells, merge_heatmap_cells, group_aggregate, dataframe_to_records, HEATMAP_WEIGHTS, H3_METRICS
+)
+from .utils.column_store import ARRAYS_META_FILE, ColumnStore, load_arrays, save_arrays
+from .utils.filters import compile_filters, has_active_filters
+from .utils.cache import DiskLRUCache, LRUCache, make_cache_key
+from .utils.column_stats import compute_column_stats
+from .utils.time_index import (
+    EPOCH_FIELD, ROLLUP_INTERVALS, ROLLUP_STATS, TimeIndex, TimeRange, bucket_rows, bucket_series, build_rollups, epoch_seconds,
+    load_rollups, merge_buckets, pick_interval, rollup_value_fields, save_rollups
+)
+from .utils.downsampling import downsample_series
+from .utils.artifacts import (
+    artifact_hash, current_version_dir, file_lock, new_version_dir, publish_version, write_artifact_variants,
+    write_atomic
+)
+from .utils.spatial_index import (
+    BBox, SpatialIndex, bbox_mask, clip_collection, h3_cell_centroids, h3_margin, pad_bbox,
+    tile_bbox, zoom_to_h3_resolution
+)
+from .utils.binary_transport import encode_collection, encode_points
+from .utils.decimation import (
+    LOD_MODES, build_cluster_levels, clusters_to_geojson, grid_clusters, stratified_sample, zoom_for_width
+)
+
+# Default H3 pyramid settings, overridable per data source with an `h3_pyramid` block
+DEFAULT_H3_PYRAMID = {
+    'value_field': 'Flight_Usage_Mbps',
+    'min_resolution': 2,
+    'max_resolution': 8
+}
+
+# Resolution of the static h3_grid.geojson artifact
+DEFAULT_H3_RESOLUTION = 4
+
+# Parameters of the static heatmap.geojson artifact
+DEFAULT_HEATMAP_PARAMS = {
+    'intensity_field': 'Flight_Usage_Mbps',
+    'resolution': 8,
+    'cell_size': None,
+    'weight': 'sum'
+}
+
+# Heatmap cells along one side of a tile, so the aggregation level follows the zoom
+TILE_HEATMAP_BINS = 64
+
+# Layer data types served as tiles
+TILE_DATA_TYPES = ('points', 'heatmap', 'h3_grid')
+
+# Deepest zoom level tiles are served at
+MAX_TILE_ZOOM = 24
+
+# Points per tile when a request sets no budget, and the largest budget a request may set
+DEFAULT_TILE_MAX_POINTS = 5000
+MAX_TILE_MAX_POINTS = 50000
+
+# Disk space of each dataset's tile cache; least recently used tiles are deleted past it
+TILE_DISK_MAX_BYTES = int(os.getenv('TILE_CACHE_MAX_MB', '256')) * 1024 * 1024
+
+# Artifacts built from a dataset's column store in parallel, one preprocessing process each
+ARTIFACT_STEPS = ('spatial_index', 'time_index', 'clusters', 'points', 'heatmap', 'h3')
+
+# Start method of the preprocessing processes: forking a process running threads is unsafe, and a
+# fork server started by the preloaded gunicorn master cannot be reused by its forked workers
+PREPROCESS_START_METHOD = 'spawn'
+
+# Part of the preprocessing fingerprint: bump it when artifacts change so existing versions are rebuilt
+PREPROCESS_FORMAT = 4
+
+MANIFEST_FILE = 'manifest.json'
+PREPROCESS_LOCK_FILE = '.preprocess.lock'
+
+MB = 1024 * 1024
 
 class DataProcessor:
     def __init__(self, datasets_dir: str = 'datasets', processed_dir: str = 'processed_data'):
         self.base_dir = Path(datasets_dir)
         self.processed_dir = Path(processed_dir)
         self.processed_dir.mkdir(exist_ok=True)
+        self._h3_pyramids: Dict[str, Dict[str, Any]] = {}
+        self._column_stores: Dict[str, ColumnStore] = {}
+        self._column_stats: Dict[str, List[Dict[str, Any]]] = {}
+        self._spatial_indexes: Dict[str, SpatialIndex] = {}
+        self._time_indexes: Dict[str, Optional[TimeIndex]] = {}
+        self._time_rollups: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._cluster_levels: Dict[str, Dict[int, pd.DataFrame]] = {}
+        # Published version each dataset's in-memory state above was loaded from
+        self._loaded_versions: Dict[str, Optional[str]] = {}
+        # Filtered / parameterized aggregates keyed by dataset version, parameters and filters
+        self.aggregate_cache = LRUCache(max_entries=256)
+        # Encoded tiles keyed by dataset version, tile and layer parameters (also kept on disk)
+        self.tile_cache = LRUCache(max_entries=1024)
+        self._tile_stores: Dict[Path, DiskLRUCache] = {}
+        self._lock = threading.Lock()
         
-    def preprocess_dataset(self, file_path: str, dataset_id: str) -> None:
-        """Preprocess a dataset and save different versions (raw points, heatmap, h3) to disk"""
-        print(f"Preprocessing dataset: {dataset_id} from {file_path}")
+    def _preprocess_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Process pool building artifacts in parallel, None when limited to one worker"""
+        workers = int(os.getenv('PREPROCESS_WORKERS', str(os.cpu_count() or 1)))
+        if workers <= 1:
+            return None
+        # Workers start as fresh interpreters importing only this module (the pool may be created from
+        # a preprocessing thread), so they inherit no threads or locks of the app process
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PREPROCESS_START_METHOD))
+    
+    def preprocess_datasets(self, sources: List[Dict[str, Any]]) -> None:
+        """Preprocess several file data sources at once, sharing one process pool for their artifacts"""
+        pool = self._preprocess_pool()
+        try:
+            with ThreadPoolExecutor(max_workers=max(len(sources), 1), thread_name_prefix='preprocess') as threads:
+                futures = {
+                    threads.submit(self.preprocess_dataset, source['path'], source['id'], source.get('h3_pyramid'),
+                                   pool=pool): source['id']
+                    for source in sources
+                }
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        print(f"Error during preprocessing of {futures[future]}: {str(e)}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    
+    def preprocess_dataset(self, file_path: str, dataset_id: str, h3_pyramid: Optional[Dict[str, Any]] = None,
+                           force: bool = False, pool: Optional[Executor] = None) -> bool:
+        """
+        Preprocess a dataset and save different versions (raw points, heatmap, h3) to disk,
+        unless the published version was built from the same source content and parameters.
+        The column store is written first; the other artifacts are then built from it in parallel
+        on the pool (shared between datasets, or a pool of this call). Artifacts are written to
+        a new version directory that is only published once complete, with a manifest recording
+        what was built and how long each step took. Returns whether a new version was published.
+        """
+        pyramid_config = {**DEFAULT_H3_PYRAMID, **(h3_pyramid or {})}
+        params = {
+            'format': PREPROCESS_FORMAT,
+            'h3_pyramid': pyramid_config,
+            'h3_resolution': DEFAULT_H3_RESOLUTION,
+            'heatmap': DEFAULT_HEATMAP_PARAMS
+        }
+        source_path = self.base_dir / file_path
+        root = self.processed_dir / dataset_id
+        root.mkdir(exist_ok=True)
         
-        # Check if processed files already exist
-        if self._check_processed_files_exist(dataset_id):
-            print(f"Processed files already exist for {dataset_id}, skipping preprocessing")
-            return
+        # Workers starting together build a dataset once, the others then find it up to date
+        with file_lock(root / PREPROCESS_LOCK_FILE):
+            manifest = self.get_manifest(dataset_id)
+            source = self._source_fingerprint(source_path, manifest)
+            prefix_sha256 = source.pop('prefix_sha256', None)
+            fingerprint = hashlib.sha256(make_cache_key(source['sha256'], params).encode('utf-8')).hexdigest()
+            
+            if not force and manifest is not None and manifest['fingerprint'] == fingerprint and \
+                    self._check_processed_files_exist(dataset_id):
+                print(f"Processed files for {dataset_id} are up to date, skipping preprocessing")
+                if manifest['source'] != source:
+                    # Same content under a new mtime: remember it so the file is not hashed again
+                    write_atomic(self._dataset_dir(dataset_id) / MANIFEST_FILE,
+                                 json.dumps({**manifest, 'source': source}).encode('utf-8'))
+                self.get_column_store(dataset_id)
+                return False
+            
+            # Rows appended to the file the published version was built from are merged into it
+            if (not force and manifest is not None and manifest['params'] == params and
+                    prefix_sha256 == manifest['source']['sha256'] and self._check_processed_files_exist(dataset_id) and
+                    self._ends_with_newline(source_path, manifest['source']['size'])):
+                if self._append_rows(dataset_id, source_path, manifest, source, fingerprint, pyramid_config):
+                    return True
             
+            print(f"Preprocessing dataset: {dataset_id} from {file_path}")
+            own_pool = pool is None
+            if own_pool:
+                pool = self._preprocess_pool()
+            dataset_dir = None
+            steps = {}
+            started = time.perf_counter()
+            try:
+                # Read the dataset
+                start = time.perf_counter()
+                df = pd.read_csv(source_path)
+                steps['read_csv'] = time.perf_counter() - start
+                print(f"Loaded dataset with {len(df)} rows")
+                
+                # Build the artifacts in a new, unpublished version directory
+                dataset_dir = new_version_dir(root)
+                
+                # 0. Convert the source once into the typed column store the artifacts are built from
+                start = time.perf_counter()
+                ColumnStore.write(df, dataset_dir / 'columns')
+                steps['columns'] = time.perf_counter() - start
+                print(f"Wrote column store for {dataset_id} in {steps['columns']:.2f}s")
+                
+                # 1. Spatial index, point clusters, points / heatmap GeoJSON and the H3 pyramid, in parallel
+                if pool is not None:
+                    futures = {step: pool.submit(_build_artifact, step, dataset_id, dataset_dir, pyramid_config)
+                               for step in ARTIFACT_STEPS}
+                
+                # 2. Column statistics catalog served by /data/<source_id>/columns, from the parsed CSV
+                start = time.perf_counter()
+                with open(dataset_dir / 'stats.json', 'w') as f:
+                    json.dump(compute_column_stats(df), f)
+                steps['stats'] = time.perf_counter() - start
+                print(f"Computed column statistics for {dataset_id} in {steps['stats']:.2f}s")
+                
+                for step in ARTIFACT_STEPS:
+                    if pool is not None:
+                        steps[step] = futures[step].result()
+                    else:
+                        steps[step] = _build_artifact(step, dataset_id, dataset_dir, pyramid_config)
+                
+                steps['total'] = time.perf_counter() - started
+                self._write_manifest(dataset_dir, dataset_id, fingerprint, source, params, len(df), steps,
+                                     mode='full', parallel=pool is not None)
+                
+                publish_version(dataset_dir)
+                print(f"Successfully preprocessed dataset {dataset_id} (version {dataset_dir.name}) in {steps['total']:.2f}s")
+                self.get_column_store(dataset_id)
+                return True
+                
+            except Exception as e:
+                print(f"Error preprocessing dataset {dataset_id}: {str(e)}")
+                if dataset_dir is not None and current_version_dir(root) != dataset_dir:
+                    shutil.rmtree(dataset_dir, ignore_errors=True)
+                raise
+            finally:
+                if own_pool and pool is not None:
+                    pool.shutdown()
+    
+    @staticmethod
+    def _source_fingerprint(source_path: Path, manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Size, mtime and content hash of a source file; the hash is reused while size and mtime
+        are unchanged. When the file grew, prefix_sha256 is the hash of its first bytes up to the
+        previously processed size, which equals the previous hash if rows were only appended.
+        """
+        stat = source_path.stat()
+        source = {'path': str(source_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        previous = manifest['source'] if manifest is not None else None
+        if previous is not None and {key: previous.get(key) for key in source} == source:
+            return {**source, 'sha256': previous['sha256']}
+        
+        prefix_size = previous['size'] if previous is not None and previous['size'] < stat.st_size else None
+        digest = hashlib.sha256()
+        prefix_sha256 = None
+        position = 0
+        with open(source_path, 'rb') as f:
+            while True:
+                # Stop a chunk at the prefix size so the prefix hash can be taken on the way
+                size = MB if prefix_size is None or position >= prefix_size else min(MB, prefix_size - position)
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                position += len(chunk)
+                if position == prefix_size:
+                    prefix_sha256 = digest.hexdigest()
+        
+        source['sha256'] = digest.hexdigest()
+        if prefix_sha256 is not None:
+            source['prefix_sha256'] = prefix_sha256
+        return source
+    
+    @staticmethod
+    def _ends_with_newline(source_path: Path, size: int) -> bool:
+        """Whether the first size bytes of a file end a row, so later bytes are whole new rows"""
+        with open(source_path, 'rb') as f:
+            f.seek(size - 1)
+            return f.read(1) == b'\n'
+    
+    @staticmethod
+    def _write_manifest(dataset_dir: Path, dataset_id: str, fingerprint: str, source: Dict[str, Any],
+                        params: Dict[str, Any], num_rows: int, steps: Dict[str, float], **details: Any) -> None:
+        manifest = {
+            'dataset_id': dataset_id,
+            'fingerprint': fingerprint,
+            'source': source,
+            'params': params,
+            'num_rows': num_rows,
+            'artifacts': sorted(str(path.relative_to(dataset_dir)) for path in dataset_dir.rglob('*') if path.is_file()),
+            'built_at': time.time(),
+            **details,
+            'steps': {step: round(seconds, 4) for step, seconds in steps.items()}
+        }
+        with open(dataset_dir / MANIFEST_FILE, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    
+    def _append_rows(self, dataset_id: str, source_path: Path, manifest: Dict[str, Any], source: Dict[str, Any],
+                     fingerprint: str, pyramid_config: Dict[str, Any]) -> bool:
+        """
+        Publish a new version of a dataset whose source file only grew by appended rows, parsing
+        just the bytes after the previous version's size. Heatmap cells and the H3 pyramid merge
+        their count/sum(/min/max) statistics, new point features are appended to the points GeoJSON,
+        and the column store, indexes, clusters and column statistics are rewritten from the mapped
+        old rows plus the new ones. Returns False without publishing when the new rows change a
+        column's type, which needs a full rebuild.
+        """
+        steps = {}
+        started = time.perf_counter()
+        previous_dir = self._dataset_dir(dataset_id)
+        
+        start = time.perf_counter()
+        with open(source_path, 'rb') as f:
+            header = f.readline()
+            f.seek(manifest['source']['size'])
+            new_rows = pd.read_csv(io.BytesIO(header + f.read()))
+        steps['read_csv'] = time.perf_counter() - start
+        
+        old = ColumnStore.open(previous_dir / 'columns').to_frame()
+        if list(new_rows.columns) != list(old.columns):
+            print(f"Appended rows of {dataset_id} have different columns, rebuilding")
+            return False
+        df = pd.concat([old, new_rows], ignore_index=True) if len(new_rows) else old
+        for name in old.columns:
+            if isinstance(old[name].dtype, pd.CategoricalDtype):
+                compatible = pd.api.types.is_string_dtype(new_rows[name]) or bool(new_rows[name].isna().all())
+            else:
+                compatible = df[name].dtype == old[name].dtype
+            if not compatible:
+                print(f"Appended rows change the type of column {name} of {dataset_id}, rebuilding")
+                return False
+        print(f"Appending {len(new_rows)} rows to {dataset_id} ({len(old)} rows processed before)")
+        appended = df.iloc[len(old):]
+        
+        dataset_dir = new_version_dir(self.processed_dir / dataset_id)
         try:
-            # Read the dataset
-            df = pd.read_csv(self.base_dir / file_path)
-            print(f"Loaded dataset with {len(df)} rows")
+            start = time.perf_counter()
+            ColumnStore.write(df, dataset_dir / 'columns')
+            steps['columns'] = time.perf_counter() - start
             
-            # Create processed data directory if it doesn't exist
-            dataset_dir = self.processed_dir / dataset_id
-            dataset_dir.mkdir(exist_ok=True)
+            start = time.perf_counter()
+            with open(dataset_dir / 'stats.json', 'w') as f:
+                json.dump(compute_column_stats(df), f)
+            steps['stats'] = time.perf_counter() - start
             
-            # 1. Create and save raw points GeoJSON
-            points_geojson = self._create_points_geojson(df)
-            self._save_geojson(points_geojson, dataset_dir / 'points.geojson')
+            start = time.perf_counter()
+            SpatialIndex.write(df, dataset_dir / 'spatial_index')
+            steps['spatial_index'] = time.perf_counter() - start
             
-            # 2. Create and save heatmap GeoJSON
-            heatmap_geojson = create_heatmap_geojson(df)
-            self._save_geojson(heatmap_geojson, dataset_dir / 'heatmap.geojson')
+            start = time.perf_counter()
+            previous_rollups = self._load_time_rollups(dataset_id)
+            self._build_time_index(df, dataset_id, dataset_dir,
+                                   base_buckets=previous_rollups['levels']['minute'] if previous_rollups else None,
+                                   new_rows=appended if previous_rollups else None)
+            steps['time_index'] = time.perf_counter() - start
             
-            # 3. Create and save H3 grid GeoJSON
-            h3_geojson = create_h3_grid_geojson(df, resolution=4)  # Set resolution to 4 for larger hexagons
-            self._save_geojson(h3_geojson, dataset_dir / 'h3_grid.geojson')
+            start = time.perf_counter()
+            self._build_cluster_levels(df, dataset_id, dataset_dir)
+            steps['clusters'] = time.perf_counter() - start
             
-            print(f"Successfully preprocessed dataset {dataset_id}")
+            # The stored points GeoJSON ends with the features array: splice the new features in
+            start = time.perf_counter()
+            points = (previous_dir / 'points.geojson').read_bytes()
+            features = create_points_geojson(appended)['features']
+            if features:
+                separator = b'' if points.endswith(b'[]}') else b', '
+                points = points[:-2] + separator + json.dumps(features)[1:-1].encode('utf-8') + b']}'
+            with open(dataset_dir / 'points.geojson', 'wb') as f:
+                f.write(points)
+            write_artifact_variants(dataset_dir / 'points.geojson')
+            steps['points'] = time.perf_counter() - start
             
-        except Exception as e:
-            print(f"Error preprocessing dataset {dataset_id}: {str(e)}")
+            start = time.perf_counter()
+            with np.load(previous_dir / 'heatmap_cells.npz') as data:
+                cells = pd.DataFrame({column: data[column] for column in data.files})
+            new_cells = bin_heatmap_cells(appended, DEFAULT_HEATMAP_PARAMS['intensity_field'], _heatmap_cell_size())
+            self._save_heatmap(merge_heatmap_cells(pd.concat([cells, new_cells], ignore_index=True)), dataset_dir)
+            steps['heatmap'] = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            previous_pyramid = self._load_h3_pyramid(dataset_id)
+            pyramid = self._build_h3_pyramid(appended, **pyramid_config,
+                                             base_cells=previous_pyramid['levels'][pyramid_config['max_resolution']])
+            self._save_h3(pyramid, dataset_dir)
+            steps['h3'] = time.perf_counter() - start
+            
+            steps['total'] = time.perf_counter() - started
+            self._write_manifest(dataset_dir, dataset_id, fingerprint, source, manifest['params'], len(df), steps,
+                                 mode='append', appended_rows=len(new_rows), parallel=False)
+            publish_version(dataset_dir)
+            print(f"Appended {len(new_rows)} rows to {dataset_id} (version {dataset_dir.name}) in {steps['total']:.2f}s")
+            self.get_column_store(dataset_id)
+            return True
+        
+        except Exception:
+            shutil.rmtree(dataset_dir, ignore_errors=True)
             raise
     
+    def get_manifest(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """Manifest of the published version of a dataset, None if it was never (or not yet versioned) processed"""
+        try:
+            with open(self._dataset_dir(dataset_id) / MANIFEST_FILE, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
+    def _dataset_dir(self, dataset_id: str) -> Path:
+        """
+        Directory holding the published processed artifacts of a dataset. When another
+        process published a new version, the in-memory state of the old one is dropped.
+        """
+        root = self.processed_dir / dataset_id
+        version_dir = current_version_dir(root)
+        version = version_dir.name if version_dir is not None else None
+        with self._lock:
+            if self._loaded_versions.get(dataset_id, version) != version:
+                for loaded in (self._column_stores, self._column_stats, self._spatial_indexes, self._time_indexes,
+                               self._time_rollups, self._cluster_levels, self._h3_pyramids):
+                    loaded.pop(dataset_id, None)
+            self._loaded_versions[dataset_id] = version
+        # Datasets processed before versioning keep their artifacts directly in the root
+        return version_dir if version_dir is not None else root
+    
+    def load_dataset(self, dataset_id: str) -> None:
+        """
+        Map a dataset's column store, spatial index and precomputed aggregates into this process.
+        Run in the gunicorn master before forking (preload_app), the workers inherit the mappings
+        and share one copy of the pages instead of loading the dataset into each heap.
+        """
+        self.get_column_store(dataset_id)
+        self.get_column_stats(dataset_id)
+        self.get_spatial_index(dataset_id)
+        self.get_time_index(dataset_id)
+        self._load_time_rollups(dataset_id)
+        self.get_cluster_levels(dataset_id)
+        self._load_h3_pyramid(dataset_id)
+    
+    def memory_report(self) -> Dict[str, Any]:
+        """Mapped dataset bytes and this worker's memory: rss counts shared pages, uss only its own"""
+        with self._lock:
+            datasets = {dataset_id: {'version': self._loaded_versions.get(dataset_id), 'mapped_mb': store.nbytes / MB}
+                        for dataset_id, store in self._column_stores.items()}
+        memory = psutil.Process().memory_full_info()
+        return {
+            'worker_pid': os.getpid(),
+            'rss_mb': memory.rss / MB,
+            'uss_mb': memory.uss / MB,
+            'pss_mb': getattr(memory, 'pss', memory.uss) / MB,
+            'datasets': datasets
+        }
+    
+    def get_column_store(self, dataset_id: str) -> ColumnStore:
+        """Return the dataset's memory-mapped column store, opening it once per process"""
+        store_dir = self._dataset_dir(dataset_id) / 'columns'
+        with self._lock:
+            if dataset_id in self._column_stores:
+                return self._column_stores[dataset_id]
+            
+            if not ColumnStore.exists(store_dir):
+                raise FileNotFoundError(f"Column store not found: {store_dir}")
+            
+            start = time.perf_counter()
+            store = ColumnStore.open(store_dir)
+            elapsed = time.perf_counter() - start
+            self._column_stores[dataset_id] = store
+        
+        rss = psutil.Process().memory_info().rss
+        print(f"Opened column store for {dataset_id} in worker {os.getpid()}: {len(store)} rows, "
+              f"{len(store.columns)} columns, {store.nbytes / MB:.1f} MB mapped in {elapsed * 1000:.1f} ms "
+              f"(worker RSS {rss / MB:.1f} MB)")
+        return store
+    
+    def get_spatial_index(self, dataset_id: str) -> SpatialIndex:
+        """Return the dataset's spatial index, building it from the column store if an older run has none"""
+        index_dir = self._dataset_dir(dataset_id) / 'spatial_index'
+        with self._lock:
+            if dataset_id in self._spatial_indexes:
+                return self._spatial_indexes[dataset_id]
+        
+        if not SpatialIndex.exists(index_dir):
+            print(f"Building missing spatial index for {dataset_id}")
+            SpatialIndex.write(self.get_dataframe(dataset_id, ['Latitude', 'Longitude']), index_dir)
+        index = SpatialIndex.open(index_dir)
+        
+        with self._lock:
+            self._spatial_indexes[dataset_id] = index
+        return index
+    
+    @staticmethod
+    def _build_time_index(df: pd.DataFrame, dataset_id: str, dataset_dir: Path,
+                          base_buckets: Optional[pd.DataFrame] = None, new_rows: Optional[pd.DataFrame] = None) -> None:
+        """
+        Sort the rows by EPOCH_FIELD and roll the numeric columns up per minute, hour and day.
+        base_buckets are per-minute statistics of earlier rows that only new_rows are merged into.
+        Datasets without the field get neither.
+        """
+        if EPOCH_FIELD not in df.columns:
+            return
+        start = time.perf_counter()
+        TimeIndex.write(df, dataset_dir / 'time_index')
+        value_fields = rollup_value_fields(df)
+        rows = df if new_rows is None else new_rows
+        minutes = bucket_rows(epoch_seconds(rows[EPOCH_FIELD]), rows[value_fields], ROLLUP_INTERVALS['minute'])
+        if base_buckets is not None:
+            minutes = merge_buckets(pd.concat([base_buckets, minutes], ignore_index=True), ROLLUP_INTERVALS['minute'])
+        rollups = build_rollups(minutes)
+        save_rollups(rollups, dataset_dir / 'time_rollups', EPOCH_FIELD, value_fields)
+        print(f"Built time index and rollups for {dataset_id} "
+              f"({', '.join(f'{interval}: {len(buckets)}' for interval, buckets in rollups.items())} buckets) "
+              f"in {time.perf_counter() - start:.2f}s")
+    
+    def get_time_index(self, dataset_id: str) -> Optional[TimeIndex]:
+        """Return the dataset's time index, building it if an older run has none; None without an EPOCH_FIELD"""
+        dataset_dir = self._dataset_dir(dataset_id)
+        with self._lock:
+            if dataset_id in self._time_indexes:
+                return self._time_indexes[dataset_id]
+        
+        if not TimeIndex.exists(dataset_dir / 'time_index'):
+            store = self.get_column_store(dataset_id)
+            if EPOCH_FIELD in store.columns:
+                print(f"Building missing time index for {dataset_id}")
+                self._build_time_index(store.to_frame(), dataset_id, dataset_dir)
+        index = TimeIndex.open(dataset_dir / 'time_index') if TimeIndex.exists(dataset_dir / 'time_index') else None
+        
+        with self._lock:
+            self._time_indexes[dataset_id] = index
+        return index
+    
+    def _load_time_rollups(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """Return the dataset's time rollups (meta and one frame per interval), memory-mapped once per process"""
+        rollup_dir = self._dataset_dir(dataset_id) / 'time_rollups'
+        with self._lock:
+            if dataset_id in self._time_rollups:
+                return self._time_rollups[dataset_id]
+        
+        rollups = None
+        if (rollup_dir / ARRAYS_META_FILE).exists():
+            meta, levels = load_rollups(rollup_dir)
+            rollups = {**meta, 'levels': levels}
+        
+        with self._lock:
+            self._time_rollups[dataset_id] = rollups
+        return rollups
+    
+    def _time_rows(self, dataset_id: str, time_range: TimeRange) -> np.ndarray:
+        index = self.get_time_index(dataset_id)
+        if index is None:
+            raise ValueError(f"Data source {dataset_id} has no {EPOCH_FIELD} column to select a time range")
+        return index.query(time_range)
+    
+    def get_dataframe(self, dataset_id: str, columns: Optional[List[str]] = None,
+                      bbox: Optional[BBox] = None, time_range: Optional[TimeRange] = None) -> pd.DataFrame:
+        """
+        Return the dataset as a DataFrame over its memory-mapped columns, restricted to the
+        rows inside a bounding box and / or a [start, end) time range if one is given
+        """
+        store = self.get_column_store(dataset_id)
+        rows = None
+        if bbox is not None:
+            index = self.get_spatial_index(dataset_id)
+            rows = index.query(bbox, store.column(index.meta['lat_field']), store.column(index.meta['lon_field']))
+        if time_range is not None:
+            time_rows = self._time_rows(dataset_id, time_range)
+            rows = time_rows if rows is None else np.intersect1d(rows, time_rows, assume_unique=True)
+        
+        df = store.to_frame(columns)
+        return df if rows is None else df.iloc[rows]
+    
+    def get_column_stats(self, dataset_id: str) -> List[Dict[str, Any]]:
+        """Return the dataset's precomputed column statistics catalog"""
+        file_path = self._dataset_dir(dataset_id) / 'stats.json'
+        with self._lock:
+            if dataset_id in self._column_stats:
+                return self._column_stats[dataset_id]
+        
+        if not file_path.exists():
+            raise FileNotFoundError(f"Column statistics not found: {file_path}")
+        with open(file_path, 'r') as f:
+            stats = json.load(f)
+        
+        with self._lock:
+            self._column_stats[dataset_id] = stats
+        return stats
+    
+    def get_dataset_version(self, dataset_id: str) -> str:
+        """Identifier that changes whenever the dataset's column store is rewritten"""
+        schema_file = self._dataset_dir(dataset_id) / 'columns' / ColumnStore.SCHEMA_FILE
+        return str(schema_file.stat().st_mtime_ns)
+    
+    def get_aggregate(self, dataset_id: str, aggregation: str, params: Dict[str, Any],
+                      filters: Optional[List[Dict[str, Any]]] = None, filter_logic: str = 'and',
+                      time_range: Optional[TimeRange] = None) -> Dict[str, Any]:
+        """
+        Aggregate the dataset into a heatmap or H3 grid after filtering its raw rows,
+        so filters can use any column of the dataset (not just the aggregated properties).
+        Results are cached by dataset version, aggregation, parameters, filter set and time range.
+        """
+        if aggregation not in ('heatmap', 'h3'):
+            raise ValueError(f"Unsupported aggregation: {aggregation}")
+        
+        cache_key = make_cache_key(dataset_id, self.get_dataset_version(dataset_id), aggregation,
+                                   params, filters or [], filter_logic, time_range)
+        result = self.aggregate_cache.get(cache_key)
+        if result is not None:
+            print(f"Using cached {aggregation} aggregate for {dataset_id}")
+            return result
+        
+        df = self.get_dataframe(dataset_id, time_range=time_range)
+        value_field = params.get('intensity_field' if aggregation == 'heatmap' else 'value_field')
+        columns = [col for col in dict.fromkeys(('Latitude', 'Longitude', value_field)) if col in df.columns]
+        if has_active_filters(filters):
+            mask = compile_filters(filters, filter_logic)(df)
+            df = df.loc[mask, columns]
+            print(f"Filtered {dataset_id} to {len(df)} rows before {aggregation} aggregation")
+        else:
+            df = df[columns]
+        
+        if aggregation == 'heatmap':
+            result = create_heatmap_geojson(df, **params)
+        else:
+            result = create_h3_grid_geojson(df, **params)
+        
+        self.aggregate_cache.put(cache_key, result)
+        return result
+    
+    def get_group_aggregate(self, dataset_id: str, group_by: List[str], value_field: Optional[str] = None,
+                            agg: str = 'count', quantile: float = 0.5, filters: Optional[List[Dict[str, Any]]] = None,
+                            filter_logic: str = 'and', time_range: Optional[TimeRange] = None) -> List[Dict[str, Any]]:
+        """
+        Reduce value_field per group of the group_by columns over the memory-mapped columns,
+        after filtering the raw rows. Returns one record per group with the group columns and a value.
+        Results are cached by dataset version, grouping, aggregation, filter set and time range.
+        """
+        cache_key = make_cache_key(dataset_id, self.get_dataset_version(dataset_id), 'group', group_by, value_field,
+                                   agg, quantile, filters or [], filter_logic, time_range)
+        result = self.aggregate_cache.get(cache_key)
+        if result is not None:
+            print(f"Using cached {agg} by {group_by} aggregate for {dataset_id}")
+            return result
+        
+        start = time.perf_counter()
+        df = self.get_dataframe(dataset_id, time_range=time_range)
+        # Unknown columns are kept out here and reported by group_aggregate
+        columns = list(dict.fromkeys(col for col in group_by + [value_field] if col in df.columns))
+        if has_active_filters(filters):
+            df = df.loc[compile_filters(filters, filter_logic)(df), columns]
+        else:
+            df = df[columns]
+        result = dataframe_to_records(group_aggregate(df, group_by, value_field, agg, quantile))
+        print(f"Computed {agg} by {group_by} for {dataset_id}: {len(result)} groups from {len(df)} rows "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+        
+        self.aggregate_cache.put(cache_key, result)
+        return result
+    
+    def get_time_series(self, dataset_id: str, value_field: Optional[str] = None, agg: str = 'count',
+                        interval: Optional[str] = None, time_range: Optional[TimeRange] = None,
+                        filters: Optional[List[Dict[str, Any]]] = None, filter_logic: str = 'and',
+                        max_points: Optional[int] = None, downsample: str = 'lttb') -> Dict[str, Any]:
+        """
+        Reduce value_field per minute, hour or day bucket of a [start, end) time range (an interval
+        of None picks the finest one within MAX_SERIES_BUCKETS buckets). Whole buckets are read from
+        the precomputed rollups; partial buckets at the range edges, filtered series and fields without
+        rollups are computed from the raw rows the time index selects.
+        Series longer than max_points are downsampled (lttb, minmax or avg) and cached per budget.
+        """
+        index = self.get_time_index(dataset_id)
+        if index is None:
+            raise ValueError(f"Data source {dataset_id} has no {EPOCH_FIELD} column for a time series")
+        start, end = index.bounds(time_range)
+        interval = pick_interval(start, end, interval)
+        width = ROLLUP_INTERVALS[interval]
+        
+        cache_key = make_cache_key(dataset_id, self.get_dataset_version(dataset_id), 'series', value_field, agg,
+                                   interval, start, end, filters or [], filter_logic, max_points, downsample)
+        result = self.aggregate_cache.get(cache_key)
+        if result is None and max_points is not None:
+            # Reduced from the full series, itself cached for other budgets
+            series = self.get_time_series(dataset_id, value_field, agg, interval, time_range, filters, filter_logic)
+            result = downsample_series(series, max_points, downsample)
+            self.aggregate_cache.put(cache_key, result)
+            return result
+        if result is not None:
+            print(f"Using cached {interval} {agg} series for {dataset_id}")
+            return result
+        
+        store = self.get_column_store(dataset_id)
+        if value_field is not None and value_field not in store.columns:
+            raise ValueError(f"Unknown column: {value_field}")
+        value_fields = [value_field] if value_field is not None else []
+        apply_filters = has_active_filters(filters)
+        mask_rows = compile_filters(filters, filter_logic) if apply_filters else None
+        
+        def raw_buckets(range_start: float, range_end: float) -> pd.DataFrame:
+            positions = index.positions((range_start, range_end))
+            epochs, rows = np.asarray(index.epochs[positions]), index.rows[positions]
+            if apply_filters:
+                df = store.to_frame().iloc[rows]
+                mask = mask_rows(df)
+                epochs, df = epochs[mask], df[mask]
+            elif value_fields:
+                df = store.to_frame(value_fields).iloc[rows]
+            else:
+                # Row counts only need the timestamps
+                df = pd.DataFrame(index=pd.RangeIndex(len(rows)))
+            return bucket_rows(epochs, df[value_fields], width)
+        
+        start_time = time.perf_counter()
+        rollups = self._load_time_rollups(dataset_id)
+        first, last = math.ceil(start / width) * width, math.floor(end / width) * width
+        if (rollups is None or apply_filters or first >= last or
+                (value_field is not None and value_field not in rollups['value_fields'])):
+            parts = [raw_buckets(start, end)]
+        else:
+            buckets = rollups['levels'][interval]
+            bounds = np.searchsorted(buckets['bucket'].to_numpy(), [first, last], side='left')
+            whole = buckets.iloc[bounds[0]:bounds[1]]
+            columns = ['bucket', 'rows'] + [f'{field}_{stat}' for field in value_fields for stat in ROLLUP_STATS]
+            parts = [raw_buckets(start, first), whole[columns], raw_buckets(last, end)]
+        buckets = merge_buckets(pd.concat([part for part in parts if len(part)] or parts[:1], ignore_index=True), width)
+        
+        result = {
+            'interval': interval,
+            'start': start,
+            'end': end,
+            'series': bucket_series(buckets, value_field, agg)
+        }
+        print(f"Computed {interval} {agg} series of {value_field or 'rows'} for {dataset_id}: {len(buckets)} buckets "
+              f"in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+        self.aggregate_cache.put(cache_key, result)
+        return result
+    
+    @staticmethod
+    def _build_cluster_levels(df: pd.DataFrame, dataset_id: str, dataset_dir: Path) -> Dict[int, pd.DataFrame]:
+        """Precompute the point clusters of every zoom level and save them as flat NumPy arrays"""
+        start = time.perf_counter()
+        lat = pd.to_numeric(df['Latitude'], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(df['Longitude'], errors='coerce').to_numpy(dtype=float)
+        levels = build_cluster_levels(lat, lon)
+        
+        arrays = {f'{column}_{zoom}': cells[column].to_numpy() for zoom, cells in levels.items() for column in cells.columns}
+        save_arrays(dataset_dir / 'clusters', arrays, {'zooms': sorted(levels)})
+        print(f"Built point clusters for {dataset_id} at zooms {sorted(levels)} in {time.perf_counter() - start:.2f}s")
+        return levels
+    
+    def get_cluster_levels(self, dataset_id: str) -> Dict[int, pd.DataFrame]:
+        """Return the dataset's precomputed point clusters per zoom level, building them if an older run has none"""
+        dataset_dir = self._dataset_dir(dataset_id)
+        with self._lock:
+            if dataset_id in self._cluster_levels:
+                return self._cluster_levels[dataset_id]
+        
+        if not (dataset_dir / 'clusters' / ARRAYS_META_FILE).exists():
+            levels = self._build_cluster_levels(self.get_dataframe(dataset_id, ['Latitude', 'Longitude']), dataset_id, dataset_dir)
+        else:
+            # Frames over the mapped arrays, shared by every worker instead of copied into each heap
+            meta, arrays = load_arrays(dataset_dir / 'clusters')
+            levels = {
+                zoom: pd.DataFrame({column: arrays[f'{column}_{zoom}'] for column in ('cell_x', 'cell_y', 'count', 'sum_lat', 'sum_lon')},
+                                   copy=False)
+                for zoom in meta['zooms']
+            }
+        with self._lock:
+            self._cluster_levels[dataset_id] = levels
+        return levels
+    
+    def get_points(self, dataset_id: str, bbox: Optional[BBox] = None, zoom: Optional[float] = None,
+                   max_points: Optional[int] = None, lod: str = 'cluster',
+                   filters: Optional[List[Dict[str, Any]]] = None, filter_logic: str = 'and',
+                   time_range: Optional[TimeRange] = None):
+        """
+        Select the points of a viewport within a point budget. Returns a DataFrame of rows when
+        they fit max_points (full detail). Otherwise it returns either a stratified spatial
+        sample of rows (lod='sample'), or a FeatureCollection of grid cluster centroids with counts
+        (lod='cluster') at the finest zoom level whose clusters fit the budget, falling back to
+        the sample when no level fits it.
+        Unfiltered clusters come from the precomputed levels, filtered ones (or those of a
+        [start, end) time range) are clustered on the fly.
+        """
+        if lod not in LOD_MODES:
+            raise ValueError(f"Unsupported level of detail: {lod}. Expected one of {LOD_MODES}")
+        
+        df = self.get_dataframe(dataset_id, bbox=bbox, time_range=time_range)
+        apply_filters = has_active_filters(filters)
+        if apply_filters:
+            df = df[compile_filters(filters, filter_logic)(df)]
+        if max_points is None or len(df) <= max_points:
+            return df
+        
+        if zoom is None:
+            zoom = zoom_for_width((bbox[2] - bbox[0]) % 360 or 360 if bbox else 360)
+        zoom = int(zoom)
+        lat = pd.to_numeric(df['Latitude'], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(df['Longitude'], errors='coerce').to_numpy(dtype=float)
+        
+        if lod == 'sample':
+            positions = stratified_sample(lat, lon, df.index.to_numpy(), max_points, zoom)
+            print(f"Sampled {len(positions)} of {len(df)} points for {dataset_id}")
+            return df.iloc[positions]
+        
+        levels = {} if apply_filters or time_range is not None else self.get_cluster_levels(dataset_id)
+        for level in range(zoom, -1, -1):
+            if level in levels:
+                cells = levels[level]
+                if bbox is not None:
+                    counts = cells['count'].to_numpy()
+                    cells = cells[bbox_mask(cells['sum_lat'].to_numpy() / counts, cells['sum_lon'].to_numpy() / counts, bbox)]
+            else:
+                cells = grid_clusters(lat, lon, level)
+            if len(cells) <= max_points:
+                break
+        else:
+            # Even the coarsest clusters exceed the budget: a sample always fits it
+            positions = stratified_sample(lat, lon, df.index.to_numpy(), max_points, zoom)
+            print(f"No cluster level of {dataset_id} fits {max_points} points, sampled {len(positions)} of {len(df)} points")
+            return df.iloc[positions]
+        print(f"Clustered {len(df)} points for {dataset_id} into {len(cells)} clusters at zoom {level}")
+        return clusters_to_geojson(cells)
+    
+    def _tile_params(self, dataset_id: str, data_type: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate the layer parameters of a tile and fill in their defaults, keeping only those of
+        its data type, so every distinct cache key is a distinct, valid tile
+        """
+        if data_type == 'points':
+            max_points = int(params.get('max_points') or DEFAULT_TILE_MAX_POINTS)
+            lod = params.get('lod') or 'cluster'
+            if lod not in LOD_MODES:
+                raise ValueError(f"Unsupported level of detail: {lod}. Expected one of {LOD_MODES}")
+            return {'max_points': min(max(max_points, 1), MAX_TILE_MAX_POINTS), 'lod': lod}
+        
+        numeric = [entry['name'] for entry in self.get_column_store(dataset_id).schema['columns'] if entry['kind'] == 'numeric']
+        if data_type == 'heatmap':
+            default_field = DEFAULT_HEATMAP_PARAMS['intensity_field']
+            field = params.get('intensity_field') or default_field
+            weight = params.get('weight') or DEFAULT_HEATMAP_PARAMS['weight']
+            if weight not in HEATMAP_WEIGHTS:
+                raise ValueError(f"Unsupported heatmap weight: {weight}. Expected one of {HEATMAP_WEIGHTS}")
+            tile_params = {'intensity_field': field, 'weight': weight}
+        else:
+            default_field = DEFAULT_H3_PYRAMID['value_field']
+            field = params.get('value_field') or default_field
+            metrics = sorted(set(params.get('metrics') or ['sum']))
+            unsupported = [metric for metric in metrics if metric not in H3_METRICS]
+            if unsupported:
+                raise ValueError(f"Unsupported H3 metrics: {unsupported}. Expected any of {H3_METRICS}")
+            tile_params = {'value_field': field, 'metrics': metrics}
+        # The default field may be missing (cells then only count points), any other must be a numeric column
+        if field not in numeric and field != default_field:
+            raise ValueError(f"Unknown or non-numeric column: {field}")
+        return tile_params
+    
+    def _tile_store(self, dataset_id: str) -> DiskLRUCache:
+        """On-disk tier of the tile cache, under the published dataset version and within TILE_DISK_MAX_BYTES"""
+        root = self._dataset_dir(dataset_id) / 'tiles'
+        with self._lock:
+            if root not in self._tile_stores:
+                self._tile_stores[root] = DiskLRUCache(root, TILE_DISK_MAX_BYTES)
+            return self._tile_stores[root]
+    
+    def get_tile(self, dataset_id: str, data_type: str, z: int, x: int, y: int,
+                 params: Optional[Dict[str, Any]] = None, tile_format: str = 'json') -> bytes:
+        """
+        Return one web mercator tile of a layer, encoded as GeoJSON or binary columns.
+        Heatmap cell size and H3 resolution follow the zoom level. Aggregates are computed
+        from the rows of the tile grown by one cell and only cells centered in the tile are
+        kept, so every cell is complete and appears in exactly one tile.
+        Tiles are cached in memory and under the dataset directory, keyed by dataset version.
+        """
+        if data_type not in TILE_DATA_TYPES:
+            raise ValueError(f"Unsupported tile data type: {data_type}. Expected one of {TILE_DATA_TYPES}")
+        if not 0 <= z <= MAX_TILE_ZOOM:
+            raise ValueError(f"Tile zoom {z} is outside 0-{MAX_TILE_ZOOM}")
+        params = self._tile_params(dataset_id, data_type, params or {})
+        bbox = tile_bbox(z, x, y)
+        version = self.get_dataset_version(dataset_id)
+        
+        cache_key = make_cache_key(dataset_id, version, data_type, z, x, y, params, tile_format)
+        tile = self.tile_cache.get(cache_key)
+        if tile is not None:
+            return tile
+        
+        store = self._tile_store(dataset_id)
+        tile_name = f"{version}/{hashlib.sha1(cache_key.encode('utf-8')).hexdigest()}.{tile_format}"
+        tile = store.get(tile_name)
+        if tile is not None:
+            self.tile_cache.put(cache_key, tile)
+            return tile
+        
+        start = time.perf_counter()
+        if data_type == 'points':
+            result = self.get_points(dataset_id, bbox, z, params['max_points'], params['lod'])
+            if isinstance(result, pd.DataFrame):
+                tile = encode_points(result) if tile_format == 'binary' else json.dumps(create_points_geojson(result)).encode('utf-8')
+            else:
+                tile = encode_collection(result) if tile_format == 'binary' else json.dumps(result).encode('utf-8')
+        else:
+            if data_type == 'heatmap':
+                cell_size = (bbox[2] - bbox[0]) / TILE_HEATMAP_BINS
+                margin = cell_size
+                value_field = params['intensity_field']
+            else:
+                resolution = zoom_to_h3_resolution(z)
+                margin = h3_margin(resolution)
+                value_field = params['value_field']
+            
+            columns = ['Latitude', 'Longitude'] + ([value_field] if value_field in self.get_column_store(dataset_id).columns else [])
+            df = self.get_dataframe(dataset_id, columns, bbox=pad_bbox(bbox, margin))
+            if data_type == 'heatmap':
+                result = create_heatmap_geojson(df, value_field, cell_size=cell_size, weight=params['weight'])
+            else:
+                result = create_h3_grid_geojson(df, value_field, resolution, params['metrics'])
+            # Keep cells whose center lies in the tile itself
+            result = clip_collection(result, bbox, margin=0.0)
+            tile = encode_collection(result) if tile_format == 'binary' else json.dumps(result).encode('utf-8')
+        
+        store.put(tile_name, tile)
+        self.tile_cache.put(cache_key, tile)
+        print(f"Built {data_type} tile {z}/{x}/{y} for {dataset_id} in {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"({len(tile)} bytes)")
+        return tile
+    
     def _check_processed_files_exist(self, dataset_id: str) -> bool:
         """Check if all processed files exist for a dataset"""
-        dataset_dir = self.processed_dir / dataset_id
-        required_files = ['points.geojson', 'heatmap.geojson', 'h3_grid.geojson']
+        dataset_dir = self._dataset_dir(dataset_id)
+        required_files = ['columns/schema.json', 'spatial_index/meta.json', f'clusters/{ARRAYS_META_FILE}', 'stats.json',
+                          'points.geojson', 'heatmap.geojson', 'heatmap_cells.npz', 'h3_grid.geojson',
+                          f'h3_pyramid/{ARRAYS_META_FILE}']
         return all((dataset_dir / file).exists() for file in required_files)
     
-    def _create_points_geojson(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Convert DataFrame to points GeoJSON"""
-        features = []
-        for _, row in df.iterrows():
-            feature = {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [float(row['Longitude']), float(row['Latitude'])]
-                },
-                "properties": {
-                    key: value for key, value in row.items() 
-                    if key not in ['Latitude', 'Longitude']
-                }
-            }
-            features.append(feature)
+    @staticmethod
+    def _build_h3_pyramid(df: pd.DataFrame, value_field: str, min_resolution: int, max_resolution: int,
+                          base_cells: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        """
+        Aggregate points at the finest resolution once, then roll the mergeable
+        statistics up through parent cells for every coarser resolution.
+        base_cells are finest-resolution statistics of earlier rows the points are merged into.
+        """
+        cells, invalid_rows = aggregate_h3_cells(df, value_field, max_resolution)
+        if invalid_rows:
+            print(f"Skipped {invalid_rows} rows with invalid coordinates or {value_field} values")
+        if base_cells is not None:
+            cells = merge_h3_cells(pd.concat([base_cells, cells]))
+        
+        levels = {max_resolution: cells}
+        for resolution in range(max_resolution - 1, min_resolution - 1, -1):
+            levels[resolution] = roll_up_h3_cells(levels[resolution + 1], resolution)
+        print(f"Built H3 pyramid for {value_field} at resolutions {min_resolution}-{max_resolution} "
+              f"({', '.join(f'r{res}: {len(levels[res])}' for res in sorted(levels))} cells)")
         
         return {
-            "type": "FeatureCollection",
-            "features": features
+            'value_field': value_field,
+            'min_resolution': min_resolution,
+            'max_resolution': max_resolution,
+            'levels': levels
+        }
+    
+    @staticmethod
+    def _save_h3(pyramid: Dict[str, Any], dataset_dir: Path) -> None:
+        """Save the H3 pyramid and its default resolution as H3 grid GeoJSON"""
+        DataProcessor._save_h3_pyramid(pyramid, dataset_dir / 'h3_pyramid')
+        default_resolution = min(max(DEFAULT_H3_RESOLUTION, pyramid['min_resolution']), pyramid['max_resolution'])
+        h3_geojson = {
+            "type": "H3Collection",
+            "features": h3_cells_to_collection(pyramid['levels'][default_resolution])
         }
+        DataProcessor._save_geojson(h3_geojson, dataset_dir / 'h3_grid.geojson')
     
-    def _save_geojson(self, data: Dict[str, Any], file_path: Path) -> None:
-        """Save GeoJSON data to file"""
+    @staticmethod
+    def _save_heatmap(cells: pd.DataFrame, dataset_dir: Path) -> None:
+        """Save the default heatmap's grid cell statistics (merged on append) and its GeoJSON"""
+        np.savez(dataset_dir / 'heatmap_cells.npz', **{column: cells[column].to_numpy() for column in cells.columns})
+        heatmap_geojson = heatmap_cells_to_geojson(cells, _heatmap_cell_size(), DEFAULT_HEATMAP_PARAMS['weight'])
+        DataProcessor._save_geojson(heatmap_geojson, dataset_dir / 'heatmap.geojson')
+    
+    @staticmethod
+    def _save_h3_pyramid(pyramid: Dict[str, Any], pyramid_dir: Path) -> None:
+        """Save every pyramid level as flat NumPy arrays"""
+        arrays = {}
+        for resolution, cells in pyramid['levels'].items():
+            arrays[f'cells_{resolution}'] = cells.index.to_numpy(dtype=np.uint64)
+            for column in cells.columns:
+                arrays[f'{column}_{resolution}'] = cells[column].to_numpy()
+        meta = {key: pyramid[key] for key in ('value_field', 'min_resolution', 'max_resolution')}
+        save_arrays(pyramid_dir, arrays, meta)
+    
+    def _load_h3_pyramid(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """Return the dataset's H3 pyramid, memory-mapped from disk once per process"""
+        pyramid_dir = self._dataset_dir(dataset_id) / 'h3_pyramid'
+        with self._lock:
+            if dataset_id in self._h3_pyramids:
+                return self._h3_pyramids[dataset_id]
+        
+        if not (pyramid_dir / ARRAYS_META_FILE).exists():
+            return None
+        
+        pyramid, arrays = load_arrays(pyramid_dir)
+        pyramid['levels'] = {
+            resolution: pd.DataFrame(
+                {column: arrays[f'{column}_{resolution}'] for column in ('count', 'sum', 'min', 'max')},
+                index=pd.Index(arrays[f'cells_{resolution}'], name='cell', copy=False),
+                copy=False
+            )
+            for resolution in range(pyramid['min_resolution'], pyramid['max_resolution'] + 1)
+        }
+        
+        with self._lock:
+            self._h3_pyramids[dataset_id] = pyramid
+        return pyramid
+    
+    def get_h3_grid(self, dataset_id: str, resolution: int, value_field: Optional[str] = None,
+                    metrics: Optional[List[str]] = None, bbox: Optional[BBox] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up H3 hexagon data for a resolution in the dataset's pyramid, optionally only
+        the hexagons whose centroid is inside a bounding box. value_field None accepts the
+        pyramid's own field. Returns None when the pyramid does not cover the value field or resolution.
+        """
+        pyramid = self._load_h3_pyramid(dataset_id)
+        if (pyramid is None or value_field not in (None, pyramid['value_field']) or
+                resolution not in pyramid['levels']):
+            return None
+        
+        cells = pyramid['levels'][resolution]
+        if bbox is not None:
+            with self._lock:
+                centroids = pyramid.setdefault('centroids', {}).get(resolution)
+            if centroids is None:
+                centroids = h3_cell_centroids(cells.index.to_numpy(dtype=np.uint64))
+                with self._lock:
+                    pyramid['centroids'][resolution] = centroids
+            cells = cells[bbox_mask(centroids[0], centroids[1], pad_bbox(bbox, h3_margin(resolution)))]
+        
+        return {
+            "type": "H3Collection",
+            "features": h3_cells_to_collection(cells, metrics)
+        }
+    
+    @staticmethod
+    def _save_geojson(data: Dict[str, Any], file_path: Path) -> None:
+        """Save GeoJSON data to file along with its precompressed variants and content hash"""
         with open(file_path, 'w') as f:
-            json.dump(data, f)
+            # json.dumps runs the C encoder, json.dump to a file would encode in Python
+            f.write(json.dumps(data))
+        write_artifact_variants(file_path)
+    
+    def get_processed_artifact(self, dataset_id: str, data_type: str = 'points') -> Dict[str, Any]:
+        """
+        Locate a preprocessed artifact for serving as raw bytes: its path, content hash
+        (used as ETag) and modification time. Variants missing from older runs are written here.
+        """
+        file_path = self._dataset_dir(dataset_id) / f'{data_type}.geojson'
+        if not file_path.exists():
+            raise FileNotFoundError(f"Processed data not found: {file_path}")
+        
+        return {
+            'path': file_path.resolve(),
+            'hash': artifact_hash(file_path),
+            'last_modified': file_path.stat().st_mtime
+        }
     
     def get_processed_data(self, dataset_id: str, data_type: str = 'points') -> Dict[str, Any]:
         """Load preprocessed data from disk"""
         try:
-            file_path = self.processed_dir / dataset_id / f'{data_type}.geojson'
+            file_path = self._dataset_dir(dataset_id) / f'{data_type}.geojson'
             if not file_path.exists():
                 raise FileNotFoundError(f"Processed data not found: {file_path}")
                 
@@ -91,4 +1076,37 @@ class DataProcessor:
                 return json.load(f)
         except Exception as e:
             print(f"Error loading processed data: {str(e)}")
-            raise 
\ No newline at end of file
+            raise 
+
+def _heatmap_cell_size() -> float:
+    """Cell size in degrees of the static heatmap.geojson artifact"""
+    cell_size = DEFAULT_HEATMAP_PARAMS['cell_size']
+    return float(cell_size) if cell_size else heatmap_cell_size(DEFAULT_HEATMAP_PARAMS['resolution'])
+
+def _build_artifact(step: str, dataset_id: str, dataset_dir: Path, pyramid_config: Dict[str, Any]) -> float:
+    """Build one artifact of an unpublished dataset version from its column store; returns the seconds taken"""
+    start = time.perf_counter()
+    df = ColumnStore.open(dataset_dir / 'columns').to_frame()
+    
+    if step == 'spatial_index':
+        # Grid-sorted row index answering viewport (bbox) queries
+        SpatialIndex.write(df, dataset_dir / 'spatial_index')
+    elif step == 'time_index':
+        # Epoch-sorted row index answering time ranges, and per minute / hour / day rollups
+        DataProcessor._build_time_index(df, dataset_id, dataset_dir)
+    elif step == 'clusters':
+        # Hierarchical grid clusters per zoom level for point budgets
+        DataProcessor._build_cluster_levels(df, dataset_id, dataset_dir)
+    elif step == 'points':
+        DataProcessor._save_geojson(create_points_geojson(df), dataset_dir / 'points.geojson')
+    elif step == 'heatmap':
+        cells = bin_heatmap_cells(df, DEFAULT_HEATMAP_PARAMS['intensity_field'], _heatmap_cell_size())
+        DataProcessor._save_heatmap(cells, dataset_dir)
+    elif step == 'h3':
+        DataProcessor._save_h3(DataProcessor._build_h3_pyramid(df, **pyramid_config), dataset_dir)
+    else:
+        raise ValueError(f"Unknown preprocessing step: {step}")
+    
+    elapsed = time.perf_counter() - start
+    print(f"Built {step} for {dataset_id} in {elapsed:.2f}s")
+    return elapsed
@@ -1,55 +1,120 @@
-from flask import Blueprint, jsonify, request
-import boto3
-from botocore.exceptions import ClientError
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
 import os
+import re
 import importlib
-from ..config.config_loader import ConfigLoader
 from ..config.data_sources import DataSourceType
-from ..data_processor import DataProcessor
-from ..utils.aggregations import create_heatmap_geojson, create_h3_grid_geojson
+from ..data_processor import DataProcessor, DEFAULT_HEATMAP_PARAMS, DEFAULT_H3_RESOLUTION
+from ..utils.aggregations import (
+    create_points_geojson, create_heatmap_geojson, create_h3_grid_geojson, heatmap_cell_size, group_aggregate,
+    dataframe_to_records
+)
+from ..utils.filters import compile_filters, has_active_filters
+from ..utils.column_stats import compute_column_stats
+from ..utils.cache import LRUCache, make_cache_key
+from ..utils.streaming import (
+    STREAM_FORMATS, STREAM_MIMETYPES, iter_point_feature_batches, iter_record_batches, iter_list_batches,
+    stream_ndjson, stream_json_document
+)
+from ..utils.artifacts import select_variant
+from ..utils.spatial_index import clip_collection, clip_frame, parse_bbox, zoom_to_h3_resolution
+from ..utils.decimation import LOD_MODES
+from ..utils.binary_transport import BINARY_FORMAT, BINARY_MIMETYPE, encode_collection, encode_points
+from ..utils.query_cache import QueryResultCache, query_cache_key
+from ..utils.refresh_scheduler import RefreshScheduler
+from ..utils.time_index import (
+    EPOCH_FIELD, ROLLUP_INTERVALS, TimeIndex, TimeRange, bucket_rows, bucket_series, parse_time_range, pick_interval
+)
+from ..utils.downsampling import DOWNSAMPLE_METHODS, MIN_DOWNSAMPLE_POINTS, downsample_records, downsample_series
 from ..utils.data_connectors.athena_connector import athena
+from ..utils.data_connectors.s3_connector import s3
 import pandas as pd
-import json
 import requests
 from typing import Any, Dict, List
-from pathlib import Path
 from ..mock_data import generate_traffic_data, generate_historical_data
-import yaml
+from .views import view_manager
 
 data_routes = Blueprint('data', __name__)
-config_loader = ConfigLoader(os.getenv('CONFIG_DIR', 'app/config'))
+# Share the view manager's config registry so file watcher updates reach the data routes
+config_loader = view_manager.config_loader
 data_processor = DataProcessor(
     datasets_dir=os.getenv('DATASETS_DIR', 'datasets'),
     processed_dir=os.getenv('PROCESSED_DIR', 'processed_data')
 )
+# Column statistics of non-file sources, computed once per source query result
+column_stats_cache = LRUCache(max_entries=64)
+# Grouped aggregates of non-file sources, computed once per source query result
+group_aggregate_cache = LRUCache(max_entries=256)
+# Epoch-sorted indexes of non-file sources, built once per source query result
+time_index_cache = LRUCache(max_entries=64)
+# Time series of non-file sources, computed once per source query result, window and point budget
+time_series_cache = LRUCache(max_entries=256)
+# Athena query results, kept in memory up to the byte budget and spilled to the processed data dir
+query_result_cache = QueryResultCache(
+    spill_dir=data_processor.processed_dir / 'query_cache',
+    max_bytes=int(os.getenv('ATHENA_CACHE_MAX_MB', '256')) * 1024 * 1024,
+    max_disk_bytes=int(os.getenv('ATHENA_CACHE_DISK_MAX_MB', '1024')) * 1024 * 1024
+)
 
 def initialize_data():
     """Initialize data processing on startup"""
     print("Initializing data processing...")
     try:
         # Get all data sources from config
-        for config_file in Path(os.getenv('CONFIG_DIR', 'app/config')).glob('views/*.yaml'):
-            with open(config_file, 'r') as f:
-                config = yaml.safe_load(f)
-                if not config or 'data_sources' not in config:
-                    continue
-                
-                for source in config['data_sources']:
-                    if source['type'] == DataSourceType.FILE:
-                        data_processor.preprocess_dataset(
-                            file_path=source['path'],
-                            dataset_id=source['id']
-                        )
-                    elif source['type'] == DataSourceType.ATHENA:
-                        # For Athena sources, we don't need to preprocess anything
-                        # but we can log that we found an Athena data source
-                        print(f"Found Athena data source: {source['id']}")
-                        # In a real implementation, you might want to cache some data
-                        # or set up scheduled refreshes
+        sources = config_loader.get_data_source_configs()
+        for source in sources:
+            if source['type'] == DataSourceType.ATHENA:
+                # Athena results are warmed and kept fresh by the refresh scheduler
+                print(f"Found Athena data source: {source['id']}")
+        # File sources are (re)built in parallel when their content or parameters changed
+        file_sources = [source for source in sources if source['type'] == DataSourceType.FILE]
+        data_processor.preprocess_datasets(file_sources)
         print("Data preprocessing complete")
+        # Mapped here so that workers forked from a preloaded app share the pages
+        for source in file_sources:
+            try:
+                data_processor.load_dataset(source['id'])
+            except Exception as e:
+                print(f"Error loading dataset {source['id']}: {str(e)}")
     except Exception as e:
         print(f"Error during data initialization: {str(e)}")
 
+def refresh_jobs() -> List[Dict[str, Any]]:
+    """Scheduled refreshes of every data source with a refresh_interval"""
+    jobs = []
+    for source in config_loader.get_data_source_configs():
+        if not source.get('refresh_interval'):
+            continue
+        if source['type'] == DataSourceType.FILE:
+            # Reprocessed only when the source file changed
+            jobs.append({
+                'id': source['id'],
+                'interval': source['refresh_interval'],
+                'refresh': lambda source=source: data_processor.preprocess_dataset(
+                    source['path'], source['id'], source.get('h3_pyramid')
+                )
+            })
+        elif source['type'] == DataSourceType.ATHENA and source.get('cache_enabled', True):
+            args = athena_source_args(source)
+            key = query_cache_key(args['query'], args['database'], args['workgroup'])
+            jobs.append({
+                'id': source['id'],
+                'interval': source['refresh_interval'],
+                'last_refreshed': lambda key=key: query_result_cache.fetched_at(key),
+                'refresh': lambda key=key, args=args: query_result_cache.refresh(key, lambda: athena.query_data(**args))
+            })
+    return jobs
+
+refresh_scheduler = RefreshScheduler(
+    lock_path=data_processor.processed_dir / 'refresh.lock',
+    jobs=refresh_jobs,
+    max_workers=int(os.getenv('REFRESH_WORKERS', '2'))
+)
+
+def start_refresh_scheduler():
+    """Start refreshing data sources in the background, unless disabled with REFRESH_SCHEDULER=false"""
+    if os.getenv('REFRESH_SCHEDULER', 'true').lower() == 'true':
+        refresh_scheduler.start()
+
 def convert_to_geojson(df: pd.DataFrame, layer_config: Dict = None) -> Dict[str, Any]:
     """Convert DataFrame with lat/lon to GeoJSON format with optional aggregation"""
     if layer_config and 'aggregation' in layer_config:
@@ -57,74 +122,71 @@ def convert_to_geojson(df: pd.DataFrame, layer_config: Dict = None) -> Dict[str,
             return create_heatmap_geojson(
                 df,
                 intensity_field=layer_config.get('properties', {}).get('intensity_field', 'Flight_Usage_Mbps'),
-                resolution=layer_config.get('properties', {}).get('resolution', 8)
+                resolution=layer_config.get('properties', {}).get('resolution', 8),
+                cell_size=layer_config.get('properties', {}).get('cell_size'),
+                weight=layer_config.get('properties', {}).get('weight', 'sum')
             )
         elif layer_config['aggregation'] == 'h3':
             return create_h3_grid_geojson(
                 df,
                 value_field=layer_config.get('properties', {}).get('value_field', 'Flight_Usage_Mbps'),
-                resolution=layer_config.get('properties', {}).get('resolution', 8)
+                resolution=layer_config.get('properties', {}).get('resolution', 8),
+                metrics=layer_config.get('properties', {}).get('metrics')
             )
     
     # Default point GeoJSON conversion
-    features = []
-    for _, row in df.iterrows():
-        feature = {
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [float(row['Longitude']), float(row['Latitude'])]
-            },
-            "properties": {
-                key: value for key, value in row.items() 
-                if key not in ['Latitude', 'Longitude']
-            }
-        }
-        features.append(feature)
-    
-    return {
-        "type": "FeatureCollection",
-        "features": features
-    }
+    return create_points_geojson(df)
 
-def fetch_from_local(file_path: str, file_format: str = 'csv') -> Dict[str, Any]:
-    """Fetch data from a local file"""
-    try:
-        # Get the absolute path to the datasets directory
-        base_dir = Path(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-        datasets_dir = base_dir / 'datasets'
-        full_path = datasets_dir / file_path
-
-        # Ensure the path is within the datasets directory (security check)
-        if not str(full_path.resolve()).startswith(str(datasets_dir.resolve())):
-            raise ValueError("Access to files outside datasets directory is not allowed")
-
-        if file_format.lower() == 'csv':
-            df = pd.read_csv(full_path)
-            return {'data': df.to_dict(orient='records')}
-        elif file_format.lower() in ['json', 'jsonl']:
-            with open(full_path, 'r') as f:
-                return json.load(f)
-        else:
-            raise ValueError(f"Unsupported file format: {file_format}")
-    except Exception as e:
-        print(f"Error reading local file: {str(e)}")
-        raise
+def read_s3_source(source_config: Dict[str, Any], columns: List[str] = None):
+    """
+    Read the object of an S3 source, parsing only columns (all when None). Within the source's
+    refresh_interval the parsed object is reused as is; after that it is downloaded again only
+    if its ETag changed. cache_enabled: false always downloads it.
+    """
+    if not source_config.get('bucket') or not source_config.get('key'):
+        raise ValueError(f"S3 data source {source_config['id']} needs a bucket and a key")
+    return s3.read_object(
+        bucket=source_config['bucket'],
+        key=source_config['key'],
+        region=source_config.get('region', 'us-east-1'),
+        file_format=source_config.get('format'),
+        compression=source_config.get('compression'),
+        columns=columns,
+        endpoint_url=source_config.get('endpoint_url'),
+        max_age=source_config.get('refresh_interval'),
+        use_cache=source_config.get('cache_enabled', True)
+    )
 
-def fetch_from_s3(bucket: str, key: str, region: str = 'us-east-1') -> Dict[str, Any]:
-    """Fetch data from S3 bucket"""
-    try:
-        s3_client = boto3.client('s3', region_name=region)
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        data = response['Body'].read().decode('utf-8')
-        return json.loads(data)
-    except ClientError as e:
-        print(f"Error fetching from S3: {str(e)}")
-        raise
+def layer_columns(layer_config: Dict[str, Any] = None) -> List[str]:
+    """
+    Columns a layer reads: its coordinates and every field named in its properties, including
+    {field} placeholders of tooltips. None (all columns) without a layer.
+    """
+    if not layer_config:
+        return None
+    properties = layer_config.get('properties', {})
+    columns = {'Latitude', 'Longitude'}
+    if layer_config.get('aggregation') in ('heatmap', 'h3'):
+        # Fields convert_to_geojson falls back to
+        columns.add(properties.get('intensity_field' if layer_config['aggregation'] == 'heatmap' else 'value_field',
+                                   'Flight_Usage_Mbps'))
+    pending = [properties]
+    while pending:
+        value = pending.pop()
+        if isinstance(value, dict):
+            pending.extend(value.values())
+        elif isinstance(value, list):
+            pending.extend(value)
+        elif isinstance(value, str):
+            columns.add(value)
+            columns.update(re.findall(r'\{(\w+)\}', value))
+    return sorted(columns)
 
 def fetch_from_athena(query: str, database: str = None, workgroup: str = None, 
                      region: str = None, environment: str = None, 
-                     output_location: str = None) -> Dict[str, Any]:
+                     output_location: str = None, endpoint_url: str = None,
+                     refresh_interval: int = None, cache_enabled: bool = True,
+                     time_range: TimeRange = None) -> Dict[str, Any]:
     """
     Fetch data from AWS Athena.
     
@@ -135,6 +197,10 @@ def fetch_from_athena(query: str, database: str = None, workgroup: str = None,
         region: AWS region
         environment: Environment (prod, preprod, dev)
         output_location: S3 location for query results
+        endpoint_url: Endpoint of a local Athena/S3 stand-in
+        refresh_interval: Seconds after which a cached result is refreshed
+        cache_enabled: Whether the result may be served from the query result cache
+        time_range: Optional [start, end) epoch seconds the rows are restricted to
         
     Returns:
         Dictionary with the query results
@@ -143,16 +209,20 @@ def fetch_from_athena(query: str, database: str = None, workgroup: str = None,
         print(f"Fetching data from Athena with query: {query[:100]}...")
         
         # Use the Athena connector to execute the query
-        df = athena.query_data(
+        df = run_athena_query(
             query=query,
             database=database,
             workgroup=workgroup,
             region=region,
             environment=environment,
-            output_location=output_location
+            output_location=output_location,
+            endpoint_url=endpoint_url,
+            refresh_interval=refresh_interval,
+            cache_enabled=cache_enabled
         )
         
         print(f"Received data from Athena with {len(df)} rows and columns: {df.columns.tolist()}")
+        df = select_time_range(df, time_range, query_cache_key(query, database, workgroup))
         
         # Ensure we have the required columns for visualization
         if 'Latitude' not in df.columns or 'Longitude' not in df.columns:
@@ -167,6 +237,9 @@ def fetch_from_athena(query: str, database: str = None, workgroup: str = None,
         
         print(f"Returning Athena data with {len(result['data'])} records")
         return result
+    except ValueError:
+        # Invalid requests (such as a time range on a result without timestamps) are reported by the caller
+        raise
     except Exception as e:
         print(f"Error fetching data from Athena: {str(e)}")
         # Return a minimal valid response instead of raising an exception
@@ -176,6 +249,229 @@ def fetch_from_athena(query: str, database: str = None, workgroup: str = None,
             'row_count': 0
         }
 
+def run_athena_query(query: str, database: str = None, workgroup: str = None,
+                     refresh_interval: int = None, cache_enabled: bool = True, **kwargs) -> pd.DataFrame:
+    """
+    Run an Athena query through the query result cache. Results are shared by every
+    query with the same normalized SQL, database and workgroup; once older than
+    refresh_interval they are still served while a background query refreshes them.
+    The returned DataFrame is shared and must not be modified in place.
+    """
+    fetch = lambda: athena.query_data(query=query, database=database, workgroup=workgroup, **kwargs)
+    if not cache_enabled:
+        return fetch()
+    return query_result_cache.get_or_fetch(query_cache_key(query, database, workgroup), fetch, ttl=refresh_interval)
+
+def athena_source_args(source_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Connector arguments of an Athena data source's query"""
+    return {
+        'query': source_config['query'],
+        'database': source_config.get('database'),
+        'workgroup': source_config.get('workgroup'),
+        'region': source_config.get('region'),
+        'environment': source_config.get('environment', 'dev'),
+        'output_location': source_config.get('output_location'),
+        'endpoint_url': source_config.get('endpoint_url')
+    }
+
+def query_athena_source(source_config: Dict[str, Any], time_range: TimeRange = None) -> pd.DataFrame:
+    """Run an Athena data source's query and return the result as a DataFrame, optionally restricted to a time range"""
+    df = run_athena_query(
+        **athena_source_args(source_config),
+        refresh_interval=source_config.get('refresh_interval'),
+        cache_enabled=source_config.get('cache_enabled', True)
+    )
+    return select_time_range(df, time_range, query_cache_key(source_config['query'], source_config.get('database'),
+                                                             source_config.get('workgroup')))
+
+def query_time_index(df: pd.DataFrame, result_key: str) -> TimeIndex:
+    """Epoch-sorted index of a query result, built once per fetched result"""
+    if EPOCH_FIELD not in df.columns:
+        raise ValueError(f"Query result has no {EPOCH_FIELD} column to select a time range")
+    # Results are identified by their fetch time (Athena) or ETag (S3 objects)
+    fetched_at = df.attrs.get('query_cache', {}).get('fetched_at', df.attrs.get('s3', {}).get('etag'))
+    if fetched_at is None:
+        # Uncached results are fetched again for every request
+        return TimeIndex.from_frame(df)
+    cache_key = make_cache_key(result_key, fetched_at)
+    index = time_index_cache.get(cache_key)
+    if index is None:
+        index = TimeIndex.from_frame(df)
+        time_index_cache.put(cache_key, index)
+    return index
+
+def select_time_range(df: pd.DataFrame, time_range: TimeRange, result_key: str) -> pd.DataFrame:
+    """Rows of a query result inside a [start, end) time range, found by binary search in its time index"""
+    if time_range is None:
+        return df
+    return df.iloc[query_time_index(df, result_key).query(time_range)]
+
+def stream_response(batches, stream_format: str, fields: Dict[str, Any], list_key: str) -> Response:
+    """Wrap batches of items in a streamed NDJSON or chunked JSON response"""
+    if stream_format == 'ndjson':
+        body = stream_ndjson(batches)
+    else:
+        body = stream_json_document(batches, fields, list_key)
+    return Response(stream_with_context(body), mimetype=STREAM_MIMETYPES[stream_format])
+
+def parse_viewport(values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Read the optional viewport (bbox=minLon,minLat,maxLon,maxLat and zoom) of a request,
+    and its time window (start / end in epoch seconds or ISO 8601, end exclusive)
+    """
+    zoom = values.get('zoom')
+    return {
+        'bbox': parse_bbox(values.get('bbox')),
+        'zoom': float(zoom) if zoom not in (None, '') else None,
+        'time_range': parse_time_range(values)
+    }
+
+def parse_point_budget(values: Dict[str, Any], properties: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Read the point budget (max_points) and level-of-detail mode (lod) of a request or layer"""
+    properties = properties or {}
+    max_points = values.get('max_points', properties.get('max_points'))
+    lod = values.get('lod', properties.get('lod', 'cluster'))
+    if lod not in LOD_MODES:
+        raise ValueError(f"Unsupported level of detail: {lod}. Expected one of {LOD_MODES}")
+    return {
+        'max_points': int(max_points) if max_points not in (None, '') else None,
+        'lod': lod
+    }
+
+def parse_downsample(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Read the point budget (max_points) and downsampling method (downsample) of a series request"""
+    max_points = values.get('max_points')
+    max_points = int(max_points) if max_points not in (None, '') else None
+    if max_points is not None and max_points < MIN_DOWNSAMPLE_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_DOWNSAMPLE_POINTS}")
+    downsample = values.get('downsample') or 'lttb'
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unsupported downsampling method: {downsample}. Expected one of {DOWNSAMPLE_METHODS}")
+    return {'max_points': max_points, 'downsample': downsample}
+
+def load_file_layer(source_id: str, data_type: str, bbox=None, zoom=None, max_points=None, lod='cluster',
+                    time_range=None, properties: Dict = None):
+    """
+    Load a FILE source layer restricted to a viewport: a DataFrame of the points
+    inside the bbox (found through the spatial index), or an aggregated collection
+    clipped to the bbox. For H3 grids the zoom level picks the pyramid resolution.
+    Points over max_points come back sampled, or as a collection of clusters.
+    Heatmaps and grids use the layer's properties (intensity_field, weight, value_field,
+    metrics, ...); with a time range, or properties the preprocessed artifacts do not cover,
+    the rows are aggregated on the fly instead.
+    """
+    if data_type == 'points':
+        return data_processor.get_points(source_id, bbox, zoom, max_points, lod, time_range=time_range)
+    properties = properties or {}
+    if data_type == 'heatmap':
+        params = {key: properties.get(key, default) for key, default in DEFAULT_HEATMAP_PARAMS.items()}
+        if time_range is not None or params != DEFAULT_HEATMAP_PARAMS:
+            result = data_processor.get_aggregate(source_id, 'heatmap', params, time_range=time_range)
+            if not bbox:
+                return result
+            return clip_collection(result, bbox, params['cell_size'] or heatmap_cell_size(params['resolution']))
+    if data_type == 'h3_grid':
+        resolution = properties.get('resolution', DEFAULT_H3_RESOLUTION) if zoom is None else zoom_to_h3_resolution(zoom)
+        value_field, metrics = properties.get('value_field'), properties.get('metrics')
+        if time_range is None:
+            # Grids of all time come from the preprocessed pyramid when it covers the layer
+            result = data_processor.get_h3_grid(source_id, resolution, value_field, metrics, bbox=bbox)
+            if result is not None:
+                return result
+        params = {'value_field': value_field or 'Flight_Usage_Mbps', 'resolution': resolution, 'metrics': metrics}
+        result = data_processor.get_aggregate(source_id, 'h3', params, time_range=time_range)
+        return clip_collection(result, bbox) if bbox else result
+    result = data_processor.get_processed_data(source_id, data_type)
+    if not bbox:
+        return result
+    margin = heatmap_cell_size(DEFAULT_HEATMAP_PARAMS['resolution']) if data_type == 'heatmap' else 0.0
+    return clip_collection(result, bbox, margin)
+
+def stream_data(source_id: str, source_config: Dict[str, Any], layer_config: Dict = None,
+                stream_format: str = 'ndjson', viewport: Dict[str, Any] = None) -> Response:
+    """Stream a data source's features or records in batches instead of serializing them at once"""
+    viewport = viewport or {}
+    if source_config['type'] == DataSourceType.FILE:
+        data_type = request.args.get('type', 'points')
+        result = load_file_layer(source_id, data_type, **viewport, properties=(layer_config or {}).get('properties'))
+        if isinstance(result, pd.DataFrame):
+            # Points are built batch by batch from the memory-mapped column store
+            batches = iter_point_feature_batches(result)
+            collection_type = 'FeatureCollection'
+        else:
+            batches = iter_list_batches(result['features'])
+            collection_type = result['type']
+        return stream_response(batches, stream_format, {'type': collection_type}, 'features')
+        
+    elif source_config['type'] == DataSourceType.ATHENA:
+        df = query_athena_source(source_config, viewport.get('time_range'))
+        if viewport.get('bbox') and {'Latitude', 'Longitude'} <= set(df.columns):
+            df = clip_frame(df, viewport['bbox'])
+        if layer_config and 'geospatial' in layer_config.get('type', '') and len(df) > 0:
+            if 'aggregation' in layer_config:
+                result = convert_to_geojson(df, layer_config)
+                batches = iter_list_batches(result['features'])
+                collection_type = result['type']
+            else:
+                batches = iter_point_feature_batches(df)
+                collection_type = 'FeatureCollection'
+            return stream_response(batches, stream_format, {'type': collection_type}, 'features')
+        
+        fields = {'columns': df.columns.tolist(), 'row_count': len(df)}
+        return stream_response(iter_record_batches(df), stream_format, fields, 'data')
+    
+    return jsonify({'error': f'Streaming not supported for source type: {source_config["type"]}'}), 400
+
+def artifact_response(source_id: str, data_type: str) -> Response:
+    """
+    Serve a preprocessed artifact as raw bytes: the precompressed variant matching
+    Accept-Encoding, with the content hash as ETag so unchanged data answers 304
+    """
+    artifact = data_processor.get_processed_artifact(source_id, data_type)
+    accepted = [encoding for encoding in ('br', 'gzip') if request.accept_encodings[encoding]]
+    path, encoding = select_variant(artifact['path'], accepted)
+    
+    response = send_file(
+        path,
+        mimetype='application/json',
+        etag=f"{artifact['hash'][:32]}-{encoding or 'identity'}",
+        last_modified=artifact['last_modified'],
+        conditional=True
+    )
+    if encoding and response.status_code == 200:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Clients may keep the bytes but must revalidate them (a cheap 304) on every refresh
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = None
+    return response
+
+def binary_response(payload: bytes) -> Response:
+    """Wrap a binary columnar payload in a response"""
+    return Response(payload, mimetype=BINARY_MIMETYPE)
+
+def binary_data(source_id: str, source_config: Dict[str, Any], layer_config: Dict = None,
+                viewport: Dict[str, Any] = None) -> Response:
+    """Return a data source's map features as typed columns instead of GeoJSON"""
+    viewport = viewport or {}
+    if source_config['type'] == DataSourceType.FILE:
+        data_type = request.args.get('type', 'points')
+        result = load_file_layer(source_id, data_type, **viewport, properties=(layer_config or {}).get('properties'))
+        if isinstance(result, pd.DataFrame):
+            # Encoded straight from the memory-mapped column store
+            return binary_response(encode_points(result))
+        return binary_response(encode_collection(result))
+        
+    elif source_config['type'] == DataSourceType.ATHENA:
+        df = query_athena_source(source_config, viewport.get('time_range'))
+        if viewport.get('bbox') and {'Latitude', 'Longitude'} <= set(df.columns):
+            df = clip_frame(df, viewport['bbox'])
+        if layer_config and 'aggregation' in layer_config:
+            return binary_response(encode_collection(convert_to_geojson(df, layer_config)))
+        return binary_response(encode_points(df))
+    
+    return jsonify({'error': f'Binary format not supported for source type: {source_config["type"]}'}), 400
+
 @data_routes.route('/data/<source_id>', methods=['GET'])
 def get_data(source_id: str):
     """Get data from a specific source"""
@@ -194,21 +490,63 @@ def get_data(source_id: str):
         layer_id = request.args.get('layer')
         layer_config = config_loader.get_layer_config(layer_id) if layer_id else None
         
+        # Optional viewport: only features inside ?bbox= are selected, ?zoom= picks H3 resolutions
+        # and ?max_points= / ?lod= (or the layer's properties) bound the number of points
+        try:
+            viewport = {**parse_viewport(request.args),
+                        **parse_point_budget(request.args, (layer_config or {}).get('properties'))}
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Opt-in streaming of large payloads (?format=ndjson or ?format=chunked)
+        # or binary typed columns for map layers (?format=binary)
+        stream_format = request.args.get('format')
+        if stream_format == BINARY_FORMAT:
+            print(f"Encoding {source_id} as binary columns")
+            return binary_data(source_id, source_config, layer_config, viewport)
+        if stream_format:
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({'error': f'Unsupported format: {stream_format}. Expected one of {STREAM_FORMATS + (BINARY_FORMAT,)}'}), 400
+            print(f"Streaming {source_id} as {stream_format}")
+            return stream_data(source_id, source_config, layer_config, stream_format, viewport)
+        
         # Process data based on source type
         if source_config['type'] == DataSourceType.FILE:
             # For file sources, use the data processor
             data_type = request.args.get('type', 'points')
             print(f"Fetching file data for {source_id}, type: {data_type}")
-            return jsonify(data_processor.get_processed_data(source_id, data_type))
+            if (viewport['bbox'] is None and viewport['zoom'] is None and viewport['max_points'] is None and
+                    viewport['time_range'] is None):
+                return artifact_response(source_id, data_type)
+            
+            result = load_file_layer(source_id, data_type, **viewport, properties=(layer_config or {}).get('properties'))
+            if isinstance(result, pd.DataFrame):
+                result = create_points_geojson(result)
+            print(f"Returning {len(result['features'])} features in viewport {viewport['bbox']}")
+            return jsonify(result)
             
         elif source_config['type'] == DataSourceType.S3:
-            # For S3 sources, fetch from S3
+            # Only the columns the layer uses (or those listed in ?columns=) are parsed
+            columns = request.args.get('columns')
+            columns = [name for name in columns.split(',') if name] if columns else layer_columns(layer_config)
+            if columns is not None and viewport['time_range'] is not None:
+                columns.append(EPOCH_FIELD)
             print(f"Fetching S3 data for {source_id}")
-            data = fetch_from_s3(
-                bucket=source_config['bucket'],
-                key=source_config['key'],
-                region=source_config.get('region', 'us-east-1')
-            )
+            data = read_s3_source(source_config, columns)
+            if not isinstance(data, pd.DataFrame):
+                # JSON documents other than record lists (e.g. GeoJSON) are served as stored
+                return jsonify(data)
+            
+            df = select_time_range(data, viewport['time_range'], make_cache_key(source_config['bucket'], source_config['key']))
+            if layer_config and 'Latitude' in df.columns and 'Longitude' in df.columns:
+                if viewport['bbox'] and len(df) > 0:
+                    df = clip_frame(df, viewport['bbox'])
+                result = convert_to_geojson(df, layer_config)
+                print(f"Returning {len(result['features'])} features from S3 source {source_id}")
+                return jsonify(result)
+            
+            print(f"Returning S3 data with {len(df)} records")
+            return jsonify({'data': dataframe_to_records(df), 'columns': df.columns.tolist(), 'row_count': len(df)})
             
         elif source_config['type'] == DataSourceType.API:
             # For API sources, fetch from API
@@ -231,13 +569,19 @@ def get_data(source_id: str):
                 workgroup=source_config.get('workgroup'),
                 region=source_config.get('region'),
                 environment=source_config.get('environment', 'dev'),
-                output_location=source_config.get('output_location')
+                output_location=source_config.get('output_location'),
+                endpoint_url=source_config.get('endpoint_url'),
+                refresh_interval=source_config.get('refresh_interval'),
+                cache_enabled=source_config.get('cache_enabled', True),
+                time_range=viewport['time_range']
             )
             
             # Convert to GeoJSON if needed
             if layer_config and 'geospatial' in layer_config.get('type', ''):
                 print(f"Converting Athena data to GeoJSON for layer: {layer_id}")
                 df = pd.DataFrame(data['data'])
+                if viewport['bbox'] and len(df) > 0:
+                    df = clip_frame(df, viewport['bbox'])
                 if len(df) > 0:
                     geojson_data = convert_to_geojson(df, layer_config)
                     print(f"Converted to GeoJSON with {len(geojson_data.get('features', []))} features")
@@ -256,6 +600,8 @@ def get_data(source_id: str):
         print(f"Returning data with {len(data.get('data', []))} records")
         return jsonify(data)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_data: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -288,14 +634,34 @@ def get_visualizations():
 def get_columns(source_id: str):
     """Get column metadata for a specific data source"""
     try:
-        if source_id == 'local_dataset':
-            # Load the NDR dataset
-            source_config = config_loader.load_data_source_config(source_id)
-            if not source_config:
-                return jsonify({'error': 'Data source not found'}), 404
-                
-            data = fetch_from_local(source_config['path'])
-            df = pd.DataFrame(data['data'])
+        source_config = config_loader.get_data_source_config(source_id)
+        if not source_config:
+            return jsonify({'error': 'Data source not found'}), 404
+        
+        if source_config['type'] == DataSourceType.FILE:
+            # Catalog computed at ingest time
+            return jsonify(data_processor.get_column_stats(source_id))
+        elif source_config['type'] == DataSourceType.ATHENA:
+            # Catalog computed once per query result (a refreshed result has a new fetch time)
+            df = query_athena_source(source_config)
+            cache_key = make_cache_key(source_id, source_config.get('query'), source_config.get('database'),
+                                       df.attrs.get('query_cache', {}).get('fetched_at'))
+            columns = column_stats_cache.get(cache_key)
+            if columns is None:
+                columns = compute_column_stats(df)
+                column_stats_cache.put(cache_key, columns)
+            return jsonify(columns)
+        elif source_config['type'] == DataSourceType.S3 and source_config.get('bucket'):
+            # Catalog computed once per object version
+            df = read_s3_source(source_config)
+            if not isinstance(df, pd.DataFrame):
+                return jsonify({'error': f'S3 source {source_id} is not a table of records'}), 400
+            cache_key = make_cache_key(source_id, source_config['bucket'], source_config['key'], df.attrs['s3']['etag'])
+            columns = column_stats_cache.get(cache_key)
+            if columns is None:
+                columns = compute_column_stats(df)
+                column_stats_cache.put(cache_key, columns)
+            return jsonify(columns)
         elif source_id == 'traffic_api':
             data = generate_traffic_data()['metadata']
             df = pd.DataFrame(data)
@@ -303,27 +669,138 @@ def get_columns(source_id: str):
             data = generate_historical_data()['data']
             df = pd.DataFrame(data)
         else:
-            return jsonify({'error': 'Data source not found'}), 404
+            return jsonify({'error': f'Column metadata not supported for source type: {source_config["type"]}'}), 400
             
-        columns = []
-        for col in df.columns:
-            dtype = str(df[col].dtype)
-            column_type = 'categorical' if dtype == 'object' or df[col].nunique() < 10 else 'numerical'
-            unique_values = df[col].unique().tolist() if column_type == 'categorical' else None
-            columns.append({
-                'name': col,
-                'type': column_type,
-                'unique_values': unique_values,
-                'min': float(df[col].min()) if column_type == 'numerical' else None,
-                'max': float(df[col].max()) if column_type == 'numerical' else None
-            })
-        
-        return jsonify(columns)
+        return jsonify(compute_column_stats(df))
         
     except Exception as e:
         print(f"Error in get_columns: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def parse_group_aggregate(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Read the grouping (group_by, comma-separated in query strings), value_field, agg and quantile of a request"""
+    group_by = values.get('group_by') or []
+    if isinstance(group_by, str):
+        group_by = [col for col in group_by.split(',') if col]
+    quantile = values.get('quantile')
+    return {
+        'group_by': list(group_by),
+        'value_field': values.get('value_field') or None,
+        'agg': values.get('agg', 'count'),
+        'quantile': float(quantile) if quantile not in (None, '') else 0.5
+    }
+
+@data_routes.route('/data/<source_id>/aggregate', methods=['GET', 'POST'])
+def get_group_aggregate(source_id: str):
+    """
+    Aggregate a value field by group-by fields (sum, mean, count, min, max or quantile),
+    optionally over filtered rows, so charts receive one row per group instead of the dataset
+    """
+    try:
+        source_config = config_loader.get_data_source_config(source_id)
+        if not source_config:
+            return jsonify({'error': f'Data source not found: {source_id}'}), 404
+        
+        body = request.get_json(silent=True) or {}
+        request_values = {**request.args.to_dict(), **body}
+        params = parse_group_aggregate(request_values)
+        time_range = parse_time_range(request_values)
+        filters = body.get('filters', [])
+        filter_logic = body.get('filter_logic', 'and')
+        # Compile filters up front so invalid definitions are rejected before any data is loaded
+        compile_filters(filters, filter_logic)
+        
+        if source_config['type'] == DataSourceType.FILE:
+            rows = data_processor.get_group_aggregate(source_id, **params, filters=filters, filter_logic=filter_logic,
+                                                      time_range=time_range)
+        elif source_config['type'] == DataSourceType.ATHENA:
+            # Computed once per query result (a refreshed result has a new fetch time)
+            df = query_athena_source(source_config)
+            cache_key = make_cache_key(source_id, source_config.get('query'), source_config.get('database'),
+                                       df.attrs.get('query_cache', {}).get('fetched_at'), params, filters, filter_logic,
+                                       time_range)
+            rows = group_aggregate_cache.get(cache_key)
+            if rows is None:
+                df = select_time_range(df, time_range, query_cache_key(source_config['query'], source_config.get('database'),
+                                                                       source_config.get('workgroup')))
+                if has_active_filters(filters):
+                    df = df[compile_filters(filters, filter_logic)(df)]
+                rows = dataframe_to_records(group_aggregate(df, **params))
+                group_aggregate_cache.put(cache_key, rows)
+        else:
+            return jsonify({'error': f'Aggregation not supported for source type: {source_config["type"]}'}), 400
+        
+        return jsonify({**params, 'rows': rows})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in get_group_aggregate: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@data_routes.route('/data/<source_id>/timeseries', methods=['GET', 'POST'])
+def get_time_series(source_id: str):
+    """
+    Reduce a value field (or count rows) per minute, hour or day between start and end, read
+    from precomputed rollups for file sources, so long ranges never scan the raw rows.
+    ?max_points= downsamples longer series (?downsample=lttb, minmax or avg).
+    """
+    try:
+        source_config = config_loader.get_data_source_config(source_id)
+        if not source_config:
+            return jsonify({'error': f'Data source not found: {source_id}'}), 404
+        
+        body = request.get_json(silent=True) or {}
+        request_values = {**request.args.to_dict(), **body}
+        time_range = parse_time_range(request_values)
+        value_field = request_values.get('value_field') or None
+        agg = request_values.get('agg', 'count' if value_field is None else 'sum')
+        interval = request_values.get('interval') or None
+        budget = parse_downsample(request_values)
+        filters = body.get('filters', [])
+        filter_logic = body.get('filter_logic', 'and')
+        compile_filters(filters, filter_logic)
+        
+        if source_config['type'] == DataSourceType.FILE:
+            result = data_processor.get_time_series(source_id, value_field, agg, interval, time_range,
+                                                    filters, filter_logic, **budget)
+        elif source_config['type'] == DataSourceType.ATHENA:
+            # Bucketed from the rows the result's time index selects
+            df = query_athena_source(source_config)
+            index = query_time_index(df, query_cache_key(source_config['query'], source_config.get('database'),
+                                                         source_config.get('workgroup')))
+            start, end = index.bounds(time_range)
+            interval = pick_interval(start, end, interval)
+            cache_key = make_cache_key(source_id, source_config.get('query'), source_config.get('database'),
+                                       df.attrs.get('query_cache', {}).get('fetched_at'), value_field, agg, interval,
+                                       start, end, filters, filter_logic, budget)
+            result = time_series_cache.get(cache_key)
+            if result is None:
+                if value_field is not None and value_field not in df.columns:
+                    raise ValueError(f"Unknown column: {value_field}")
+                positions = index.positions(time_range)
+                epochs, rows = index.epochs[positions], df.iloc[index.rows[positions]]
+                if has_active_filters(filters):
+                    mask = compile_filters(filters, filter_logic)(rows)
+                    epochs, rows = epochs[mask], rows[mask]
+                value_fields = [value_field] if value_field is not None else []
+                buckets = bucket_rows(epochs, rows[value_fields], ROLLUP_INTERVALS[interval])
+                result = {'interval': interval, 'start': start, 'end': end,
+                          'series': bucket_series(buckets, value_field, agg)}
+                if budget['max_points'] is not None:
+                    result = downsample_series(result, budget['max_points'], budget['downsample'])
+                time_series_cache.put(cache_key, result)
+        else:
+            return jsonify({'error': f'Time series not supported for source type: {source_config["type"]}'}), 400
+        
+        return jsonify({'value_field': value_field, 'agg': agg, **result})
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in get_time_series: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @data_routes.route('/data/<source_id>/filtered', methods=['POST'])
 def get_filtered_data(source_id: str):
     """Get filtered data based on provided criteria"""
@@ -333,6 +810,22 @@ def get_filtered_data(source_id: str):
         layer_type = layer_config.get('type', '')
         print(f"Processing filtered data request for source: {source_id}, layer type: {layer_type}")
         
+        # Compile filters up front so invalid definitions are rejected before any data is loaded
+        compile_filters(filters, request.json.get('filter_logic', 'and'))
+        apply_filters = has_active_filters(filters)
+        
+        # Map layers can ask for typed columns instead of GeoJSON
+        response_format = request.json.get('format', request.args.get('format'))
+        if response_format not in (None, 'geojson', BINARY_FORMAT):
+            return jsonify({'error': f'Unsupported format: {response_format}. Expected geojson or {BINARY_FORMAT}'}), 400
+        binary = response_format == BINARY_FORMAT
+        
+        # Optional viewport, from the body or the query string
+        request_values = {**request.args.to_dict(), **request.json}
+        viewport = parse_viewport(request_values)
+        bbox = viewport['bbox']
+        time_range = viewport['time_range']
+        
         if source_id == 'local_dataset':
             # Map layer types to data types
             data_type_map = {
@@ -344,63 +837,59 @@ def get_filtered_data(source_id: str):
             data_type = data_type_map.get(layer_type, 'points')
             print(f"Selected data type: {data_type} for layer type: {layer_type}")
             
-            # Get resolution from layer config for H3 grid
-            resolution = layer_config.get('properties', {}).get('resolution', 4)
-            print(f"Using resolution: {resolution} for H3 grid")
+            # Get resolution from layer config for H3 grid, or from the map zoom if the layer leaves it open
+            properties = layer_config.get('properties', {})
+            default_resolution = 4 if viewport['zoom'] is None else zoom_to_h3_resolution(viewport['zoom'])
+            resolution = properties.get('resolution', default_resolution)
+            filter_logic = request.json.get('filter_logic', 'and')
+            budget = parse_point_budget(request_values, properties)
             
             # Load preprocessed data
             if data_type == 'h3_grid':
-                # For H3 grid, create data with specified resolution
-                source_config = config_loader.load_data_source_config(source_id)
-                if not source_config:
-                    return jsonify({'error': 'Data source not found'}), 404
-                    
-                df = pd.read_csv(os.path.join('datasets', source_config['path']))
-                result = create_h3_grid_geojson(
-                    df,
-                    value_field=layer_config.get('properties', {}).get('value_field', 'Flight_Usage_Mbps'),
-                    resolution=resolution
-                )
+                print(f"Using resolution: {resolution} for H3 grid")
+                params = {
+                    'value_field': properties.get('value_field', 'Flight_Usage_Mbps'),
+                    'resolution': resolution,
+                    'metrics': properties.get('metrics')
+                }
+                # Unfiltered grids of all time are looked up in the preprocessed pyramid
+                result = None if apply_filters or time_range else data_processor.get_h3_grid(source_id, **params, bbox=bbox)
+                if result is None:
+                    # Filtered, time-windowed or outside the pyramid: filter raw rows, then aggregate
+                    result = data_processor.get_aggregate(source_id, 'h3', params, filters, filter_logic, time_range)
+                    if bbox:
+                        result = clip_collection(result, bbox)
+            elif data_type == 'heatmap':
+                params = {key: properties.get(key, default) for key, default in DEFAULT_HEATMAP_PARAMS.items()}
+                if apply_filters or time_range or params != DEFAULT_HEATMAP_PARAMS:
+                    # Filter raw rows, then aggregate with the layer's parameters
+                    result = data_processor.get_aggregate(source_id, 'heatmap', params, filters, filter_logic, time_range)
+                elif binary or bbox:
+                    result = data_processor.get_processed_data(source_id, data_type)
+                else:
+                    # Unchanged static artifact, served as stored bytes
+                    return artifact_response(source_id, data_type)
+                if bbox:
+                    # Aggregates are cached for the whole dataset and clipped per viewport
+                    result = clip_collection(result, bbox, params['cell_size'] or heatmap_cell_size(params['resolution']))
+            elif apply_filters or binary or bbox or time_range or budget['max_points'] is not None:
+                # Select viewport rows through the spatial index, filter only those,
+                # then sample or cluster them if they exceed the point budget
+                result = data_processor.get_points(source_id, bbox, viewport['zoom'], filters=filters,
+                                                   filter_logic=filter_logic, time_range=time_range, **budget)
+                if isinstance(result, pd.DataFrame):
+                    if binary:
+                        # Encode matching rows straight from the column store, no features are built
+                        print(f"Returning {len(result)} points as binary columns")
+                        return binary_response(encode_points(result))
+                    result = create_points_geojson(result)
             else:
-                # For other types, use preprocessed data
-                result = data_processor.get_processed_data(source_id, data_type)
-            
-            # Apply filters if needed
-            if filters:
-                filtered_features = []
-                for feature in result['features']:
-                    include_feature = True
-                    for filter_def in filters:
-                        column = filter_def.get('column')
-                        operator = filter_def.get('operator')
-                        value = filter_def.get('value')
-                        
-                        if not all([column, operator, value]):
-                            continue
-                        
-                        # Handle both GeoJSON properties and H3 direct properties
-                        feature_value = (
-                            feature.get('properties', {}).get(column) if 'properties' in feature 
-                            else feature.get(column)
-                        )
-                        
-                        if operator == 'equals' and feature_value != value:
-                            include_feature = False
-                        elif operator == 'contains' and not str(feature_value).find(value) >= 0:
-                            include_feature = False
-                        elif operator == 'greater_than' and not feature_value > value:
-                            include_feature = False
-                        elif operator == 'less_than' and not feature_value < value:
-                            include_feature = False
-                        elif operator == 'in' and feature_value not in value:
-                            include_feature = False
-                    
-                    if include_feature:
-                        filtered_features.append(feature)
-                
-                result['features'] = filtered_features
+                # For other types, serve the preprocessed artifact without parsing it
+                return artifact_response(source_id, data_type)
             
             print(f"Returning {result['type']} with {len(result['features'])} features")
+            if binary:
+                return binary_response(encode_collection(result))
             return jsonify(result)
             
         elif source_id == 'traffic_api':
@@ -408,11 +897,19 @@ def get_filtered_data(source_id: str):
             return jsonify(data['data'])
         elif source_id == 'historical_data':
             data = generate_historical_data()['data']
-            df = pd.DataFrame(data)
-            return jsonify(df.to_dict(orient='records'))
+            df = pd.DataFrame({'timestamps': data['timestamps'], 'volume': data['volume']})
+            records = dataframe_to_records(df)
+            # Long series are reduced to the chart's point budget (mock data differs per call, nothing to cache)
+            budget = parse_downsample(request_values)
+            if budget['max_points'] is not None:
+                records = downsample_records(records, 'timestamps', 'volume', budget['max_points'], budget['downsample'])
+            return jsonify(records)
         else:
             return jsonify({'error': 'Data source not found'}), 404
             
+    except ValueError as e:
+        print(f"Invalid filtered data request: {str(e)}")
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_filtered_data: {str(e)}")
         return jsonify({'error': str(e)}), 500 
\ No newline at end of file
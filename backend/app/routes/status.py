@@ -2,6 +2,7 @@ from flask import Blueprint, jsonify, current_app, url_for, render_template
 import psutil
 import datetime
 from typing import Dict, List, Any
+from .data import data_processor, refresh_scheduler
 
 status_routes = Blueprint('status', __name__)
 
@@ -55,6 +56,10 @@ def get_status():
                 'memory_usage_percent': memory.percent,
                 'memory_available_mb': memory.available // (1024 * 1024)
             },
+            # Scheduled data source refreshes, as seen by the worker answering the request
+            'refresh_scheduler': refresh_scheduler.status(),
+            # Datasets are mapped shared across workers, so uss (private memory) should stay flat
+            'worker_memory': data_processor.memory_report(),
             'api_endpoints': api_endpoints
         })
         
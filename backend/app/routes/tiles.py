@@ -0,0 +1,43 @@
+from flask import Blueprint, Response, jsonify, request
+import hashlib
+from ..config.data_sources import DataSourceType
+from ..utils.binary_transport import BINARY_FORMAT, BINARY_MIMETYPE
+from .data import config_loader, data_processor
+
+tiles_routes = Blueprint('tiles', __name__)
+
+@tiles_routes.route('/tiles/<source_id>/<int:z>/<int:x>/<int:y>', methods=['GET'])
+def get_tile(source_id: str, z: int, x: int, y: int):
+    """Get the points, heatmap or H3 aggregate of one web mercator tile of a data source"""
+    try:
+        source_config = config_loader.get_data_source_config(source_id)
+        if not source_config:
+            return jsonify({'error': f'Data source not found: {source_id}'}), 404
+        if source_config['type'] != DataSourceType.FILE:
+            return jsonify({'error': f'Tiles not supported for source type: {source_config["type"]}'}), 400
+
+        data_type = request.args.get('type', 'points')
+        tile_format = 'binary' if request.args.get('format') == BINARY_FORMAT else 'json'
+        # Layer parameters that change the tile content (the aggregation level follows z),
+        # validated and defaulted by the data processor
+        params = {key: request.args[key] for key in ('intensity_field', 'weight', 'value_field') if key in request.args}
+        if 'metrics' in request.args:
+            params['metrics'] = request.args['metrics'].split(',')
+        if 'max_points' in request.args:
+            params['max_points'] = int(request.args['max_points'])
+        if 'lod' in request.args:
+            params['lod'] = request.args['lod']
+
+        tile = data_processor.get_tile(source_id, data_type, z, x, y, params, tile_format)
+
+        response = Response(tile, mimetype=BINARY_MIMETYPE if tile_format == 'binary' else 'application/json')
+        # Tile bytes only change with the dataset version, so clients revalidate with a cheap 304
+        response.set_etag(hashlib.sha1(tile).hexdigest())
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in get_tile: {str(e)}")
+        return jsonify({'error': str(e)}), 500
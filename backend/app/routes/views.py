@@ -5,8 +5,9 @@ import os
 views_routes = Blueprint('views', __name__)
 view_manager = ViewManager(os.getenv('CONFIG_DIR', 'app/config'))
 
-# Start watching for config changes
-view_manager.start_watching()
+# Views are loaded now; the file watcher thread is started by create_app (development server)
+# or in each gunicorn worker after the fork, never in the preloading master
+view_manager.load_all_views()
 
 @views_routes.route('/views', methods=['GET'])
 def get_views():
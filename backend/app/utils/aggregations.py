@@ -1,93 +1,289 @@
 import h3
+import h3.api.basic_int as h3_int
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import pandas as pd
 
-def create_heatmap_geojson(df: pd.DataFrame, intensity_field: str = 'Flight_Usage_Mbps', resolution: int = 8) -> Dict[str, Any]:
+def _column_to_list(series: pd.Series) -> List[Any]:
     """
-    Create a heatmap GeoJSON by aggregating points into a regular grid.
+    Convert a column to a list of JSON-serializable Python values.
+    NaN/NaT become None, numpy scalars become native ints/floats/bools.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = series.dt.strftime('%Y-%m-%dT%H:%M:%S').astype(object)
+        return values.where(series.notna(), None).tolist()
+    
+    values = series.to_numpy()
+    if values.dtype.kind in 'iub':
+        # Integer and boolean arrays never hold NaN, tolist() yields native types
+        return values.tolist()
+    if values.dtype.kind == 'f':
+        result = values.tolist()
+        for i in np.flatnonzero(np.isnan(values)):
+            result[i] = None
+        return result
+    
+    # Object / string / categorical columns may mix Python and numpy scalars
+    values = series.astype(object).where(series.notna(), None).tolist()
+    return [v.item() if isinstance(v, np.generic) else v for v in values]
+
+def dataframe_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a DataFrame to JSON-serializable records, working on whole columns at once"""
+    names = list(df.columns)
+    columns = [_column_to_list(df[col]) for col in names]
+    if not columns:
+        return [{} for _ in range(len(df))]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+def create_points_geojson(df: pd.DataFrame, lat_field: str = 'Latitude', lon_field: str = 'Longitude') -> Dict[str, Any]:
+    """
+    Create a points GeoJSON from a DataFrame, working on whole columns at once.
+    Rows without valid coordinates are dropped, NaN properties are emitted as null.
+    """
+    lat = pd.to_numeric(df[lat_field], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(df[lon_field], errors='coerce').to_numpy(dtype=float)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    if not valid.all():
+        print(f"Skipping {int((~valid).sum())} rows without valid coordinates")
+        df = df[valid]
+        lat, lon = lat[valid], lon[valid]
+    
+    coordinates = np.column_stack((lon, lat)).tolist()
+    property_names = [col for col in df.columns if col not in (lat_field, lon_field)]
+    property_columns = [_column_to_list(df[col]) for col in property_names]
+    
+    property_rows = zip(*property_columns) if property_columns else [()] * len(coordinates)
+    
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": coords},
+            "properties": dict(zip(property_names, values))
+        }
+        for coords, values in zip(coordinates, property_rows)
+    ]
+    
+    return {
+        "type": "FeatureCollection",
+        "features": features
+    }
+
+# Approximate length of one degree of latitude
+KM_PER_DEGREE = 111.32
+
+# Supported reductions of intensity_field per heatmap cell
+HEATMAP_WEIGHTS = ('sum', 'mean', 'count')
+
+# Cell keys pack (x, y) grid indices into one int64 for a single-key groupby
+_CELL_KEY_OFFSET = 1 << 30
+_CELL_KEY_STRIDE = 1 << 31
+
+def heatmap_cell_size(resolution: int) -> float:
+    """Heatmap cell size in degrees, matching the width of an H3 cell at the same resolution"""
+    return 2 * h3.average_hexagon_edge_length(resolution, unit='km') / KM_PER_DEGREE
+
+def bin_heatmap_cells(df: pd.DataFrame, intensity_field: str, cell_size: float) -> pd.DataFrame:
     """
-    features = []
-    
-    # Create a grid of points and aggregate values
-    lat_min, lat_max = df['Latitude'].min(), df['Latitude'].max()
-    lon_min, lon_max = df['Longitude'].min(), df['Longitude'].max()
-    
-    # Create grid cells
-    lat_steps = np.linspace(lat_min, lat_max, num=50)
-    lon_steps = np.linspace(lon_min, lon_max, num=50)
-    
-    for lat in lat_steps:
-        for lon in lon_steps:
-            # Find points within the cell
-            mask = (
-                (df['Latitude'] >= lat - 0.01) & 
-                (df['Latitude'] < lat + 0.01) &
-                (df['Longitude'] >= lon - 0.01) & 
-                (df['Longitude'] < lon + 0.01)
-            )
-            if mask.any():
-                intensity = df.loc[mask, intensity_field].sum()
-                feature = {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [float(lon), float(lat)]
-                    },
-                    "properties": {
-                        "intensity": float(intensity)
-                    }
-                }
-                features.append(feature)
+    Assign every point to a grid cell in one vectorized pass and reduce per cell.
+    Cells are anchored at (0, 0), so bins computed over different row subsets line up
+    and can be merged by adding their columns.
+    Returns a DataFrame with cell_x, cell_y, count, sum and value_count columns.
+    """
+    lat = pd.to_numeric(df['Latitude'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(df['Longitude'], errors='coerce').to_numpy(dtype=float)
+    if intensity_field in df.columns:
+        values = pd.to_numeric(df[intensity_field], errors='coerce').to_numpy(dtype=float)
+    else:
+        values = np.full(len(df), np.nan)
+    
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    lat, lon, values = lat[valid], lon[valid], values[valid]
+    
+    cell_x = np.floor(lon / cell_size).astype(np.int64)
+    cell_y = np.floor(lat / cell_size).astype(np.int64)
+    keys = (cell_y + _CELL_KEY_OFFSET) * _CELL_KEY_STRIDE + (cell_x + _CELL_KEY_OFFSET)
+    
+    cells = pd.DataFrame({'key': keys, 'value': values}).groupby('key', sort=False)['value'].agg(
+        count='size', sum='sum', value_count='count'
+    )
+    keys = cells.index.to_numpy()
+    cells.insert(0, 'cell_x', keys % _CELL_KEY_STRIDE - _CELL_KEY_OFFSET)
+    cells.insert(1, 'cell_y', keys // _CELL_KEY_STRIDE - _CELL_KEY_OFFSET)
+    return cells.reset_index(drop=True)
+
+def merge_heatmap_cells(cells: pd.DataFrame) -> pd.DataFrame:
+    """Merge rows that share a grid cell (e.g. bins of appended rows) by adding their columns"""
+    return cells.groupby(['cell_x', 'cell_y'], sort=False)[['count', 'sum', 'value_count']].sum().reset_index()
+
+def heatmap_cells_to_geojson(cells: pd.DataFrame, cell_size: float, weight: str = 'sum') -> Dict[str, Any]:
+    """Convert binned heatmap cells to a GeoJSON of cell centers with an intensity property"""
+    if weight not in HEATMAP_WEIGHTS:
+        raise ValueError(f"Unsupported heatmap weight: {weight}. Expected one of {HEATMAP_WEIGHTS}")
+    
+    if weight == 'count':
+        intensity = cells['count'].to_numpy(dtype=float)
+    elif weight == 'mean':
+        value_count = cells['value_count'].to_numpy(dtype=float)
+        intensity = np.divide(cells['sum'].to_numpy(dtype=float), value_count,
+                              out=np.zeros(len(cells)), where=value_count > 0)
+    else:
+        intensity = cells['sum'].to_numpy(dtype=float)
+    
+    lon = ((cells['cell_x'].to_numpy() + 0.5) * cell_size).tolist()
+    lat = ((cells['cell_y'].to_numpy() + 0.5) * cell_size).tolist()
+    
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [x, y]},
+            "properties": {"intensity": value, "point_count": count}
+        }
+        for x, y, value, count in zip(lon, lat, intensity.tolist(), cells['count'].tolist())
+    ]
     
     return {
         "type": "FeatureCollection",
         "features": features
     }
 
-def create_h3_grid_geojson(df: pd.DataFrame, value_field: str = 'Flight_Usage_Mbps', resolution: int = 8) -> Dict[str, Any]:
+def create_heatmap_geojson(df: pd.DataFrame, intensity_field: str = 'Flight_Usage_Mbps', resolution: int = 8,
+                           cell_size: float = None, weight: str = 'sum') -> Dict[str, Any]:
+    """
+    Create a heatmap GeoJSON by aggregating points into a regular grid.
+    The cell size is taken from cell_size (degrees) when given, otherwise derived from resolution.
+    weight selects how intensity_field is reduced per cell: sum, mean or count.
+    """
+    cell_size = float(cell_size) if cell_size else heatmap_cell_size(resolution)
+    cells = bin_heatmap_cells(df, intensity_field, cell_size)
+    return heatmap_cells_to_geojson(cells, cell_size, weight)
+
+# Supported reductions of value_field per H3 cell
+H3_METRICS = ('sum', 'mean', 'count', 'min', 'max')
+
+def assign_h3_cells(lat: np.ndarray, lon: np.ndarray, resolution: int) -> np.ndarray:
+    """
+    Compute H3 cell ids (as uint64) for whole coordinate arrays.
+    Each distinct coordinate pair is indexed once, then broadcast back to its rows.
+    """
+    codes, unique_coords = pd.factorize(lon + 1j * lat)
+    unique_cells = np.fromiter(
+        (h3_int.latlng_to_cell(c.imag, c.real, resolution) for c in unique_coords),
+        dtype=np.uint64, count=len(unique_coords)
+    )
+    return unique_cells[codes]
+
+def aggregate_h3_cells(df: pd.DataFrame, value_field: str, resolution: int) -> Tuple[pd.DataFrame, int]:
+    """
+    Aggregate points into H3 cells with one grouped reduction.
+    Returns a DataFrame indexed by the uint64 cell id with count, sum, min and max columns
+    (all mergeable, mean is derived), and the number of rows that were skipped because of
+    invalid coordinates or a non-numeric value.
+    """
+    lat = pd.to_numeric(df['Latitude'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(df['Longitude'], errors='coerce').to_numpy(dtype=float)
+    values = pd.to_numeric(df[value_field], errors='coerce').to_numpy(dtype=float)
+    
+    valid = (
+        np.isfinite(lat) & np.isfinite(lon) & np.isfinite(values) &
+        (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    )
+    invalid_rows = int(len(valid) - valid.sum())
+    lat, lon, values = lat[valid], lon[valid], values[valid]
+    
+    cells = pd.DataFrame({
+        'cell': assign_h3_cells(lat, lon, resolution),
+        'value': values
+    }).groupby('cell', sort=False)['value'].agg(['count', 'sum', 'min', 'max'])
+    return cells, invalid_rows
+
+def merge_h3_cells(cells: pd.DataFrame) -> pd.DataFrame:
+    """Merge rows that share a cell id by combining their count/sum/min/max statistics"""
+    return cells.groupby(level=0, sort=False).agg({'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+
+def roll_up_h3_cells(cells: pd.DataFrame, resolution: int) -> pd.DataFrame:
+    """Aggregate H3 cell statistics to their parent cells at a coarser resolution"""
+    parents = np.fromiter(
+        (h3_int.cell_to_parent(int(cell), resolution) for cell in cells.index),
+        dtype=np.uint64, count=len(cells)
+    )
+    return merge_h3_cells(cells.set_axis(parents))
+
+def h3_cells_to_collection(cells: pd.DataFrame, metrics: List[str] = None) -> List[Dict[str, Any]]:
+    """
+    Convert aggregated H3 cells to H3HexagonLayer objects.
+    Every requested metric is emitted under its own name, the first one is also emitted as value.
+    """
+    metrics = metrics or ['sum']
+    unsupported = [m for m in metrics if m not in H3_METRICS]
+    if unsupported:
+        raise ValueError(f"Unsupported H3 metrics: {unsupported}. Expected any of {H3_METRICS}")
+    
+    columns = {
+        'hex': [h3.int_to_str(int(cell)) for cell in cells.index],
+        'point_count': cells['count'].astype(int).tolist()
+    }
+    for metric in metrics:
+        if metric == 'mean':
+            columns[metric] = (cells['sum'] / cells['count']).tolist()
+        elif metric == 'count':
+            columns[metric] = columns['point_count']
+        else:
+            columns[metric] = cells[metric].astype(float).tolist()
+    columns['value'] = columns[metrics[0]]
+    
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+def create_h3_grid_geojson(df: pd.DataFrame, value_field: str = 'Flight_Usage_Mbps', resolution: int = 8,
+                           metrics: List[str] = None) -> Dict[str, Any]:
     """
     Create H3 hexagon data by aggregating point data into hexagons.
     Returns a list of objects with hex indices and values, ready for H3HexagonLayer.
+    metrics selects the reductions of value_field per hexagon (sum, mean, count, min, max).
     """
-    print(f"Creating H3 grid with resolution {resolution}")
-    print(f"Input DataFrame columns: {df.columns.tolist()}")
-    print(f"First row: {df.iloc[0].to_dict()}")
-    
-    # Create a dictionary to store aggregated values for each hexagon
-    hex_data = {}
-    
-    # Convert points to H3 indexes and aggregate values
-    for _, row in df.iterrows():
-        try:
-            lat, lon = float(row['Latitude']), float(row['Longitude'])
-            h3_index = h3.latlng_to_cell(lat, lon, resolution)
-            value = float(row[value_field])
-            
-            if h3_index in hex_data:
-                hex_data[h3_index]['value'] += value
-                hex_data[h3_index]['point_count'] += 1
-            else:
-                hex_data[h3_index] = {
-                    'hex': h3_index,
-                    'value': value,
-                    'point_count': 1
-                }
-        except Exception as e:
-            print(f"Error processing row: {row}, Error: {str(e)}")
-            continue
-    
-    print(f"Created {len(hex_data)} unique H3 hexagons")
-    
-    # Convert dictionary to list of objects
-    features = list(hex_data.values())
-    
-    if features:
-        print("First hexagon example:", features[0])
-    
-    result = {
+    cells, invalid_rows = aggregate_h3_cells(df, value_field, resolution)
+    if invalid_rows:
+        print(f"Skipped {invalid_rows} rows with invalid coordinates or {value_field} values")
+    
+    features = h3_cells_to_collection(cells, metrics)
+    print(f"Generated H3 data at resolution {resolution} with {len(features)} hexagons from {len(df)} rows")
+    
+    return {
         "type": "H3Collection",
-        "features": features
+        "features": features,
+        "invalid_rows": invalid_rows
     }
-    print(f"Generated H3 data with {len(features)} hexagons")
-    return result 
\ No newline at end of file
+
+# Reductions of a value field per group, for charts aggregated on the server
+GROUP_AGGREGATIONS = ('sum', 'mean', 'count', 'min', 'max', 'quantile')
+
+def group_aggregate(df: pd.DataFrame, group_by: List[str], value_field: Optional[str] = None, agg: str = 'count',
+                    quantile: float = 0.5) -> pd.DataFrame:
+    """
+    Reduce value_field over the groups of the group_by columns in one grouped pass.
+    Returns the group columns (sorted, missing keys as their own group) and a value column.
+    Non-numeric values are ignored; count without a value_field counts rows.
+    """
+    if agg not in GROUP_AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation: {agg}. Expected one of {GROUP_AGGREGATIONS}")
+    if not group_by:
+        raise ValueError("At least one group_by column is required")
+    if value_field is None and agg != 'count':
+        raise ValueError(f"Aggregation {agg} requires a value_field")
+    if not 0 <= quantile <= 1:
+        raise ValueError(f"Quantile must be between 0 and 1, got {quantile}")
+    unknown = [col for col in group_by + [value_field] if col is not None and col not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    
+    keys = {col: df[col] for col in group_by}
+    if value_field is None:
+        grouped = pd.DataFrame(keys, copy=False).groupby(group_by, sort=True, observed=True, dropna=False)
+        result = grouped.size()
+    else:
+        values = pd.to_numeric(df[value_field], errors='coerce')
+        grouped = pd.DataFrame({**keys, 'value': values}, copy=False).groupby(
+            group_by, sort=True, observed=True, dropna=False
+        )['value']
+        result = grouped.quantile(quantile) if agg == 'quantile' else grouped.agg(agg)
+    return result.rename('value').reset_index()
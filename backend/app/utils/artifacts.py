@@ -0,0 +1,119 @@
+import fcntl
+import gzip
+import hashlib
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip variants are always written
+    brotli = None
+
+# Suffix of the file holding an artifact's content hash
+HASH_SUFFIX = '.sha256'
+
+# Pointer file naming the published version directory of a versioned artifact set
+CURRENT_FILE = 'CURRENT'
+
+# Published versions kept on disk, so readers of the previous version can finish
+KEEP_VERSIONS = 2
+
+# Content-Encoding -> file suffix of the precompressed variants, in order of preference
+ENCODING_SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz'
+}
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write to a temporary file first so concurrent readers never see a partial file"""
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive lock on a file, waiting for other processes (and threads) holding it"""
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def available_encodings() -> List[str]:
+    """Content encodings for which variants are written"""
+    return [encoding for encoding in ENCODING_SUFFIXES if encoding != 'br' or brotli is not None]
+
+def write_artifact_variants(path: Path) -> str:
+    """
+    Write the precompressed variants and the content hash of an artifact next to it.
+    Returns the hash, which is used as the artifact's ETag.
+    """
+    path = Path(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    write_atomic(path.with_name(path.name + ENCODING_SUFFIXES['gzip']), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write_atomic(path.with_name(path.name + ENCODING_SUFFIXES['br']), brotli.compress(data, quality=11))
+
+    digest = hashlib.sha256(data).hexdigest()
+    # The hash is written last: its presence marks the variants as complete
+    write_atomic(path.with_name(path.name + HASH_SUFFIX), digest.encode('ascii'))
+    return digest
+
+def artifact_hash(path: Path) -> str:
+    """Content hash of an artifact, writing its variants first if they are missing or stale"""
+    path = Path(path)
+    hash_path = path.with_name(path.name + HASH_SUFFIX)
+    if not hash_path.exists() or hash_path.stat().st_mtime_ns < path.stat().st_mtime_ns:
+        return write_artifact_variants(path)
+    return hash_path.read_text().strip()
+
+def select_variant(path: Path, accepted: List[str]) -> Tuple[Path, Optional[str]]:
+    """
+    Pick the preferred precompressed variant of an artifact among the accepted encodings.
+    Returns the file to send and its Content-Encoding (None for the uncompressed file).
+    """
+    path = Path(path)
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        variant = path.with_name(path.name + suffix)
+        if encoding in accepted and variant.exists():
+            return variant, encoding
+    return path, None
+
+def new_version_dir(root: Path) -> Path:
+    """Create an unpublished version directory under root for building a new artifact set"""
+    version_dir = Path(root) / f'v{time.time_ns()}.{os.getpid()}'
+    version_dir.mkdir(parents=True)
+    return version_dir
+
+def current_version_dir(root: Path) -> Optional[Path]:
+    """Published version directory under root, or None if no version was published yet"""
+    try:
+        name = (Path(root) / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return Path(root) / name
+
+def publish_version(version_dir: Path, keep: int = KEEP_VERSIONS) -> None:
+    """
+    Make a fully written version directory the current one by swapping the pointer file,
+    so readers see either the old or the new set, never a mix. Older versions are removed
+    (versions still being built by another process are newer and left alone).
+    """
+    version_dir = Path(version_dir)
+    root = version_dir.parent
+    write_atomic(root / CURRENT_FILE, version_dir.name.encode('utf-8'))
+
+    created = lambda path: int(path.name[1:].split('.')[0])
+    older = sorted((path for path in root.glob('v*.*') if path.is_dir() and created(path) < created(version_dir)),
+                   key=created)
+    for stale_dir in older[:max(len(older) - (keep - 1), 0)]:
+        shutil.rmtree(stale_dir, ignore_errors=True)
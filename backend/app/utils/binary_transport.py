@@ -0,0 +1,143 @@
+import json
+import struct
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+
+# Leading bytes of every payload
+MAGIC = b'VBC1'
+
+# Value of the ?format= option selecting the binary transport
+BINARY_FORMAT = 'binary'
+
+BINARY_MIMETYPE = 'application/vnd.visbuilder.columnar'
+
+_ALIGNMENT = 8
+
+_INT32_MIN, _INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+def _pad(length: int) -> int:
+    return (-length) % _ALIGNMENT
+
+def _encode_numeric(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind == 'b':
+        return values.astype(np.uint8)
+    if values.dtype.kind in 'iu':
+        if len(values) == 0 or (values.min() >= _INT32_MIN and values.max() <= _INT32_MAX):
+            return values.astype(np.int32)
+        return values.astype(np.float64)
+    return values.astype(np.float32)
+
+def _encode_series(series: pd.Series) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """Encode one property column as a typed buffer plus its header entry"""
+    dtype = series.dtype
+    if (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)) and \
+            not isinstance(dtype, pd.CategoricalDtype):
+        values = series.to_numpy()
+        if values.dtype == object:
+            # Nullable extension dtypes, missing values become NaN
+            values = series.to_numpy(dtype=float, na_value=np.nan)
+        return _encode_numeric(values), {}
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        # Milliseconds since the epoch, the unit of JavaScript dates
+        values = series.to_numpy(dtype='datetime64[ms]').astype(np.int64).astype(np.float64)
+        values[series.isna().to_numpy()] = np.nan
+        return values, {'encoding': 'timestamp_ms'}
+
+    categorical = series if isinstance(dtype, pd.CategoricalDtype) else series.astype('category')
+    codes = categorical.cat.codes.to_numpy()
+    dictionary = [value.item() if isinstance(value, np.generic) else value for value in categorical.cat.categories]
+    return codes, {'encoding': 'dictionary', 'dictionary': dictionary}
+
+def encode_columns(length: int, columns: List[Tuple[str, np.ndarray, Dict[str, Any]]]) -> bytes:
+    """
+    Pack (name, array, extra header fields) columns into a binary columnar payload:
+
+        bytes 0-3   magic b'VBC1'
+        bytes 4-7   uint32 header length (the header is padded so buffers start 8-byte aligned)
+        header      JSON {"length": n, "columns": [{name, type, size, offset, byteLength, ...}]}
+        buffers     one 8-byte aligned little-endian buffer per column, offsets relative to the header end
+
+    The browser wraps each buffer in a typed array without parsing. Positions are float32
+    [lon, lat] pairs, numeric properties float32/int32 (float64 for wide integers),
+    categoricals integer codes plus a "dictionary" (-1 for null), and H3 cells
+    uint32 [high, low] word pairs.
+    """
+    entries = []
+    buffers = []
+    offset = 0
+    for name, values, extra in columns:
+        values = np.ascontiguousarray(values)
+        if values.dtype.byteorder == '>':
+            values = values.byteswap().view(values.dtype.newbyteorder('<'))
+        data = values.tobytes()
+        entries.append({
+            'name': name,
+            'type': values.dtype.name,
+            'size': int(values.shape[1]) if values.ndim == 2 else 1,
+            'offset': offset,
+            'byteLength': len(data),
+            **extra
+        })
+        buffers.append(data + b'\0' * _pad(len(data)))
+        offset += len(data) + _pad(len(data))
+
+    header = json.dumps({'length': int(length), 'columns': entries}, separators=(',', ':')).encode('utf-8')
+    header += b' ' * _pad(len(MAGIC) + 4 + len(header))
+    return b''.join([MAGIC, struct.pack('<I', len(header)), header] + buffers)
+
+def encode_points(df: pd.DataFrame, lat_field: str = 'Latitude', lon_field: str = 'Longitude',
+                  properties: Optional[List[str]] = None) -> bytes:
+    """Encode point rows as packed float32 positions plus typed property columns"""
+    lat = pd.to_numeric(df[lat_field], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(df[lon_field], errors='coerce').to_numpy(dtype=float)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    if not valid.all():
+        df, lat, lon = df[valid], lat[valid], lon[valid]
+
+    columns = [('positions', np.column_stack((lon, lat)).astype(np.float32), {})]
+    names = properties if properties is not None else [col for col in df.columns if col not in (lat_field, lon_field)]
+    for name in names:
+        values, extra = _encode_series(df[name])
+        columns.append((str(name), values, extra))
+    return encode_columns(len(df), columns)
+
+def encode_collection(result: Dict[str, Any]) -> bytes:
+    """
+    Encode an aggregated layer (GeoJSON FeatureCollection of points, or H3Collection)
+    in the binary columnar layout.
+    """
+    features = result.get('features', [])
+    if result.get('type') == 'H3Collection':
+        properties = pd.DataFrame([{k: v for k, v in feature.items() if k != 'hex'} for feature in features])
+        cells = np.array([int(feature['hex'], 16) for feature in features], dtype=np.uint64)
+        words = np.column_stack(((cells >> np.uint64(32)).astype(np.uint32), (cells & np.uint64(0xFFFFFFFF)).astype(np.uint32)))
+        columns = [('hex', words, {'encoding': 'h3'})]
+    else:
+        properties = pd.DataFrame([feature.get('properties', {}) for feature in features])
+        positions = np.array([feature['geometry']['coordinates'][:2] for feature in features], dtype=np.float32).reshape(-1, 2)
+        columns = [('positions', positions, {})]
+
+    for name in properties.columns:
+        values, extra = _encode_series(properties[name])
+        columns.append((str(name), values, extra))
+    return encode_columns(len(features), columns)
+
+def decode_columns(payload: bytes) -> Dict[str, Any]:
+    """Decode the binary columnar layout back into NumPy arrays (used for checks and tooling)"""
+    if payload[:4] != MAGIC:
+        raise ValueError('Not a binary columnar payload')
+    header_length = struct.unpack('<I', payload[4:8])[0]
+    header = json.loads(payload[8:8 + header_length])
+    data_start = 8 + header_length
+
+    columns = {}
+    for entry in header['columns']:
+        start = data_start + entry['offset']
+        values = np.frombuffer(payload, dtype=np.dtype(entry['type']).newbyteorder('<'),
+                               count=entry['byteLength'] // np.dtype(entry['type']).itemsize, offset=start)
+        if entry['size'] > 1:
+            values = values.reshape(-1, entry['size'])
+        columns[entry['name']] = values
+    return {'length': header['length'], 'header': header, 'columns': columns}
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional
+from .artifacts import write_atomic
+
+# Share of its byte budget a disk cache is pruned down to, so pruning is not repeated on every write
+DISK_CACHE_PRUNE_RATIO = 0.8
+
+class LRUCache:
+    """Thread-safe in-memory cache that evicts the least recently used entry past max_entries"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a canonical cache key from JSON-like parts (dict key order does not matter)"""
+    return json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+
+class DiskLRUCache:
+    """
+    Files under a directory, kept within max_bytes. Reads refresh a file's modification
+    time; once writes take the directory past its budget, the least recently used files
+    are deleted. Several processes may share the directory: each counts its own writes and
+    prunes from a scan of the directory, so the budget holds across them.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._bytes: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        """(mtime, size, path) of every cached file"""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def get(self, name: str) -> Optional[bytes]:
+        path = self.root / name
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, name: str, data: bytes) -> None:
+        path = self.root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(path, data)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._prune()
+
+    def _prune(self) -> None:
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * DISK_CACHE_PRUNE_RATIO
+        for _, size, path in entries:
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._bytes = total
+        # Drop directories left empty (such as those of superseded versions)
+        for dirpath, dirnames, filenames in os.walk(self.root, topdown=False):
+            if Path(dirpath) != self.root and not dirnames and not filenames:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any
+
+# Number of most frequent values kept per column
+TOP_K = 10
+
+# Number of equal-width histogram bins for numerical columns
+HISTOGRAM_BINS = 20
+
+# Sketch size of the K-minimum-values distinct count estimator
+KMV_SIZE = 1024
+
+# Categorical columns with at most this many distinct values list all of them
+MAX_UNIQUE_VALUES = 1000
+
+# Numerical columns with fewer distinct values are treated as categorical
+CATEGORICAL_THRESHOLD = 10
+
+def _to_native(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+def _hashable(series: pd.Series) -> pd.Series:
+    """Represent unhashable cell values (lists, dicts) by their string form"""
+    if series.dtype == object and series.map(lambda v: isinstance(v, (list, dict, set))).any():
+        return series.astype(str)
+    return series
+
+def approx_distinct_count(series: pd.Series) -> int:
+    """
+    Estimate the number of distinct non-null values with a K-minimum-values sketch:
+    hash every value to a uniform 64-bit integer and derive the count from the
+    KMV_SIZE-th smallest distinct hash. Small or highly repetitive columns are counted exactly.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        return int(np.count_nonzero(np.bincount(codes[codes >= 0], minlength=1)))
+
+    hashes = pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy()
+    if len(hashes) <= KMV_SIZE * 4:
+        return len(np.unique(hashes))
+
+    smallest = np.unique(np.partition(hashes, KMV_SIZE * 4)[:KMV_SIZE * 4])
+    if len(smallest) < KMV_SIZE:
+        # Too few distinct values among the smallest hashes for the estimate, count exactly
+        return len(np.unique(hashes))
+    kth_smallest = float(smallest[KMV_SIZE - 1]) / float(np.iinfo(np.uint64).max)
+    return int(round((KMV_SIZE - 1) / kth_smallest))
+
+def _top_values(series: pd.Series) -> List[Dict[str, Any]]:
+    counts = series.value_counts(dropna=True, sort=True).head(TOP_K)
+    return [{'value': _to_native(value), 'count': int(count)} for value, count in counts.items()]
+
+def _histogram(values: np.ndarray) -> Dict[str, List[float]]:
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return {'bin_edges': [], 'counts': []}
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    return {'bin_edges': edges.tolist(), 'counts': counts.tolist()}
+
+def compute_column_stats(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Compute a statistics catalog for every column of a DataFrame: dtype, null count,
+    min/max, approximate distinct count, top-k values and, for numerical columns, a histogram.
+    The type / unique_values / min / max fields keep the shape of the /columns endpoint.
+    """
+    catalog = []
+    for name in df.columns:
+        series = _hashable(df[name])
+        null_count = int(series.isna().sum())
+        distinct = approx_distinct_count(series)
+        is_numeric = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+        column_type = 'numerical' if is_numeric and distinct >= CATEGORICAL_THRESHOLD else 'categorical'
+
+        entry = {
+            'name': str(name),
+            'dtype': str(series.dtype),
+            'type': column_type,
+            'count': int(len(series) - null_count),
+            'null_count': null_count,
+            'approx_distinct': distinct,
+            'top_values': _top_values(series),
+            'min': None,
+            'max': None,
+            'unique_values': None,
+            'histogram': None
+        }
+
+        if is_numeric:
+            values = series.to_numpy(dtype=float, na_value=np.nan)
+            if np.isfinite(values).any():
+                entry['min'] = float(np.nanmin(values))
+                entry['max'] = float(np.nanmax(values))
+            entry['histogram'] = _histogram(values)
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype) and entry['count']:
+            entry['min'] = _to_native(series.min())
+            entry['max'] = _to_native(series.max())
+
+        if column_type == 'categorical':
+            if distinct <= MAX_UNIQUE_VALUES:
+                entry['unique_values'] = [_to_native(value) for value in series.dropna().unique()]
+            else:
+                entry['unique_values'] = [item['value'] for item in entry['top_values']]
+
+        catalog.append(entry)
+    return catalog
@@ -0,0 +1,135 @@
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+class ColumnStore:
+    """
+    Typed columnar copy of a dataset on disk, opened memory-mapped.
+
+    Every column is stored as its own .npy file next to a schema.json:
+    - numeric and boolean columns keep their NumPy dtype
+    - datetime columns are stored as int64 nanoseconds
+    - everything else (strings, mixed objects) is dictionary-encoded as integer codes
+      plus a JSON list of categories, with -1 marking missing values
+    Opening a store maps the files instead of reading them, so workers on the same host
+    share the pages through the OS page cache and nothing is parsed again.
+    """
+
+    SCHEMA_FILE = 'schema.json'
+
+    def __init__(self, store_dir: Path, schema: Dict[str, Any], arrays: Dict[str, np.ndarray],
+                 categories: Dict[str, List[Any]]):
+        self.store_dir = store_dir
+        self.schema = schema
+        self._arrays = arrays
+        self._categories = categories
+
+    @classmethod
+    def exists(cls, store_dir: Path) -> bool:
+        """A store is complete once its schema has been written"""
+        return (Path(store_dir) / cls.SCHEMA_FILE).exists()
+
+    @classmethod
+    def write(cls, df: pd.DataFrame, store_dir: Path) -> None:
+        """Write a DataFrame as one typed file per column"""
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        # Remove the schema first so a partially rewritten store is never opened
+        (store_dir / cls.SCHEMA_FILE).unlink(missing_ok=True)
+
+        columns = []
+        for i, name in enumerate(df.columns):
+            series = df[name]
+            entry = {'name': str(name), 'file': f'c{i}.npy'}
+
+            if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_numeric_dtype(series.dtype):
+                values = series.to_numpy()
+                entry['kind'] = 'numeric'
+            elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+                values = series.to_numpy(dtype='datetime64[ns]').view(np.int64)
+                entry['kind'] = 'datetime'
+            else:
+                categorical = pd.Categorical(series)
+                values = categorical.codes
+                entry['kind'] = 'category'
+                entry['categories_file'] = f'c{i}.categories.json'
+                with open(store_dir / entry['categories_file'], 'w') as f:
+                    json.dump([_to_native(value) for value in categorical.categories], f)
+
+            entry['dtype'] = str(values.dtype)
+            np.save(store_dir / entry['file'], np.ascontiguousarray(values))
+            columns.append(entry)
+
+        schema = {'num_rows': len(df), 'columns': columns}
+        with open(store_dir / cls.SCHEMA_FILE, 'w') as f:
+            json.dump(schema, f)
+
+    @classmethod
+    def open(cls, store_dir: Path) -> 'ColumnStore':
+        """Open a store with every column memory-mapped read-only"""
+        store_dir = Path(store_dir)
+        with open(store_dir / cls.SCHEMA_FILE, 'r') as f:
+            schema = json.load(f)
+
+        arrays = {}
+        categories = {}
+        for entry in schema['columns']:
+            arrays[entry['name']] = np.load(store_dir / entry['file'], mmap_mode='r')
+            if entry['kind'] == 'category':
+                with open(store_dir / entry['categories_file'], 'r') as f:
+                    categories[entry['name']] = json.load(f)
+        return cls(store_dir, schema, arrays, categories)
+
+    def __len__(self) -> int:
+        return self.schema['num_rows']
+
+    @property
+    def columns(self) -> List[str]:
+        return [entry['name'] for entry in self.schema['columns']]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the mapped column data"""
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def column(self, name: str) -> pd.api.extensions.ExtensionArray:
+        """Return a column without copying the mapped data (categoricals keep their codes mapped)"""
+        entry = next(entry for entry in self.schema['columns'] if entry['name'] == name)
+        values = self._arrays[name]
+        if entry['kind'] == 'category':
+            return pd.Categorical.from_codes(values, self._categories[name])
+        if entry['kind'] == 'datetime':
+            return values.view('datetime64[ns]')
+        return values
+
+    def to_frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Build a DataFrame over the mapped columns, optionally restricted to some columns"""
+        names = columns if columns is not None else self.columns
+        return pd.DataFrame({name: self.column(name) for name in names}, copy=False)
+
+def _to_native(value: Any) -> Any:
+    """Convert numpy scalars to JSON-serializable Python values"""
+    return value.item() if isinstance(value, np.generic) else value
+
+# Marks a complete array directory written by save_arrays
+ARRAYS_META_FILE = 'meta.json'
+
+def save_arrays(array_dir: Path, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+    """Save named arrays as .npy files that load_arrays maps, with meta.json written last"""
+    array_dir = Path(array_dir)
+    array_dir.mkdir(parents=True, exist_ok=True)
+    (array_dir / ARRAYS_META_FILE).unlink(missing_ok=True)
+    for name, values in arrays.items():
+        np.save(array_dir / f'{name}.npy', np.ascontiguousarray(values))
+    with open(array_dir / ARRAYS_META_FILE, 'w') as f:
+        json.dump({'meta': meta, 'arrays': sorted(arrays)}, f)
+
+def load_arrays(array_dir: Path) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Open the arrays of a directory written by save_arrays memory-mapped read-only"""
+    array_dir = Path(array_dir)
+    with open(array_dir / ARRAYS_META_FILE, 'r') as f:
+        contents = json.load(f)
+    arrays = {name: np.load(array_dir / f'{name}.npy', mmap_mode='r') for name in contents['arrays']}
+    return contents['meta'], arrays
@@ -1,4 +1,5 @@
 # Data connectors package
 from .athena_connector import AthenaConnector
+from .s3_connector import S3Connector
 
-__all__ = ['AthenaConnector'] 
\ No newline at end of file
+__all__ = ['AthenaConnector', 'S3Connector']
@@ -2,26 +2,105 @@
 Athena Connector Module
 
 This module provides a wrapper around AWS Athena queries.
-It's designed to be a placeholder that can be easily replaced with a real implementation.
+In test mode it returns generated test data; otherwise queries run on Athena
+and their results are downloaded into typed DataFrames.
 """
 
 import pandas as pd
 import os
+import io
+import time
 import logging
-from typing import Dict, Any, Optional, List, Union
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Union, Tuple
 import json
 from pathlib import Path
+from urllib.parse import urlparse
+
+import boto3
+from botocore.config import Config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds to wait for a query before cancelling it
+QUERY_TIMEOUT = float(os.getenv('ATHENA_QUERY_TIMEOUT', '300'))
+
+# Polling interval bounds (seconds) of GetQueryExecution, growing by POLL_BACKOFF
+POLL_INITIAL_INTERVAL = 0.2
+POLL_MAX_INTERVAL = 5.0
+POLL_BACKOFF = 1.5
+
+# Results up to this size are read through paginated GetQueryResults, larger ones from S3
+SMALL_RESULT_BYTES = 2 * 1024 * 1024
+
+# Byte-range size and parallelism of large result downloads from S3
+DOWNLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+DOWNLOAD_WORKERS = 8
+
+# Athena column types -> how the string values are converted
+ATHENA_INTEGER_TYPES = ('tinyint', 'smallint', 'integer', 'int', 'bigint')
+ATHENA_FLOAT_TYPES = ('float', 'real', 'double', 'decimal')
+ATHENA_TIME_TYPES = ('date', 'timestamp', 'timestamp with time zone')
+
+class _ChunkStream(io.RawIOBase):
+    """
+    Read-only stream over ranges fetched in parallel: up to window fetches run ahead of the
+    reader and every chunk is released once it has been read
+    """
+    
+    def __init__(self, executor, fetch, starts, window: int):
+        self._executor = executor
+        self._fetch = fetch
+        self._starts = iter(starts)
+        self._pending: deque = deque()
+        self._chunk = memoryview(b'')
+        for _ in range(window):
+            self._submit_next()
+    
+    def _submit_next(self):
+        start = next(self._starts, None)
+        if start is not None:
+            self._pending.append(self._executor.submit(self._fetch, start))
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not self._chunk:
+            if not self._pending:
+                return 0
+            self._chunk = memoryview(self._pending.popleft().result())
+            self._submit_next()
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+    
+    def close(self):
+        # Fetches not started yet are dropped when parsing stops early
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        super().close()
+
 class AthenaConnector:
     """
-    A wrapper class for AWS Athena operations.
+    Runs SQL queries on AWS Athena and returns their results as typed DataFrames.
     
-    This is a placeholder implementation that returns test data when the real
-    Athena service is not available or configured.
+    Queries run in the source's database and workgroup, writing their CSV output to
+    output_location (the workgroup's default location when not set). They are polled with
+    exponential backoff and cancelled after ATHENA_QUERY_TIMEOUT seconds. Results up to
+    SMALL_RESULT_BYTES are paginated through GetQueryResults, larger ones are streamed from
+    the S3 output in parallel byte ranges. Clients are created once per service and region
+    and shared across threads; endpoint_url points them at a stand-in such as moto.
+    
+    The connector does not cache results itself: the /data routes run queries through the
+    query result cache (ATHENA_CACHE_MAX_MB in memory, ATHENA_CACHE_DISK_MAX_MB on disk).
+    With ATHENA_TEST_MODE=true (the default) generated test data is returned instead.
     """
     
     def __init__(self):
@@ -29,6 +108,10 @@ class AthenaConnector:
         self.is_test_mode = os.getenv('ATHENA_TEST_MODE', 'true').lower() == 'true'
         logger.info(f"Athena connector initialized in {'test' if self.is_test_mode else 'production'} mode")
         
+        # One long-lived client per (service, region, endpoint), sharing its connection pool across threads
+        self._clients: Dict[Tuple[str, str, Optional[str]], Any] = {}
+        self._clients_lock = threading.Lock()
+        
         # Create test data directory if it doesn't exist
         # Use absolute path to ensure the directory is created in the right place
         base_dir = Path(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
@@ -72,19 +155,178 @@ class AthenaConnector:
             logger.info(f"Running Athena query in test mode: {query[:100]}...")
             return self._get_test_data(query, database)
         
-        # This is where the actual Athena query would be executed
-        # For now, we'll just log that this would happen in production
-        logger.info(f"Would execute Athena query in production mode: {query[:100]}...")
+        logger.info(f"Executing Athena query: {query[:100]}...")
         logger.info(f"Database: {database}, Workgroup: {workgroup}, Region: {region}, Environment: {environment}")
+        return self.execute_query(query, database, workgroup, region or 'us-east-1', output_location,
+                                  endpoint_url=kwargs.get('endpoint_url'))
+    
+    def get_client(self, service: str, region: str, endpoint_url: Optional[str] = None):
+        """
+        Return the shared boto3 client of a service and region. endpoint_url points it at
+        a local stand-in (moto server, LocalStack); boto3 also honors AWS_ENDPOINT_URL_<SERVICE>.
+        """
+        key = (service, region, endpoint_url)
+        with self._clients_lock:
+            if key not in self._clients:
+                config = Config(max_pool_connections=DOWNLOAD_WORKERS * 2, retries={'mode': 'adaptive', 'max_attempts': 5})
+                self._clients[key] = boto3.client(service, region_name=region, endpoint_url=endpoint_url, config=config)
+            return self._clients[key]
+    
+    def execute_query(self, query: str, database: Optional[str], workgroup: Optional[str], region: str,
+                      output_location: Optional[str] = None, endpoint_url: Optional[str] = None) -> pd.DataFrame:
+        """
+        Run a query on Athena and return its result as a typed DataFrame.
         
-        # In a real implementation, you would import the actual Athena library here
-        # and use it to execute the query
-        # Example:
-        # from athena_lib import execute_query
-        # return execute_query(query, database, workgroup, region, environment)
+        The query is started asynchronously and polled with exponential backoff until it
+        finishes or QUERY_TIMEOUT passes (it is then cancelled). Small results are read
+        through paginated GetQueryResults, larger ones are downloaded from the S3 CSV output
+        in parallel byte ranges. Queue, execution and download timings are logged and
+        attached to the DataFrame as df.attrs['athena'].
+        """
+        athena_client = self.get_client('athena', region, endpoint_url)
+        
+        params: Dict[str, Any] = {'QueryString': query}
+        if database:
+            params['QueryExecutionContext'] = {'Database': database}
+        if workgroup:
+            params['WorkGroup'] = workgroup
+        if output_location:
+            params['ResultConfiguration'] = {'OutputLocation': output_location}
+        
+        start = time.perf_counter()
+        query_id = athena_client.start_query_execution(**params)['QueryExecutionId']
+        execution = self._wait_for_query(athena_client, query_id)
+        wait_seconds = time.perf_counter() - start
+        
+        download_start = time.perf_counter()
+        result_location = execution.get('ResultConfiguration', {}).get('OutputLocation')
+        result_size = self._result_size(result_location, region, endpoint_url)
+        if result_size is not None and result_size > SMALL_RESULT_BYTES:
+            columns = self._result_columns(athena_client, query_id)
+            df = self._download_result(result_location, result_size, columns, region, endpoint_url)
+            method = 's3'
+        else:
+            df = self._paginate_results(athena_client, query_id)
+            method = 'get_query_results'
+        
+        statistics = execution.get('Statistics', {})
+        timings = {
+            'query_id': query_id,
+            'queue_ms': statistics.get('QueryQueueTimeInMillis'),
+            'execution_ms': statistics.get('EngineExecutionTimeInMillis'),
+            'wait_ms': round(wait_seconds * 1000, 1),
+            'download_ms': round((time.perf_counter() - download_start) * 1000, 1),
+            'download_method': method,
+            'scanned_bytes': statistics.get('DataScannedInBytes'),
+            'result_bytes': result_size,
+            'rows': len(df)
+        }
+        logger.info(f"Athena query {query_id}: queue {timings['queue_ms']} ms, execution {timings['execution_ms']} ms, "
+                    f"download {timings['download_ms']} ms via {method} ({len(df)} rows, "
+                    f"{timings['scanned_bytes']} bytes scanned)")
+        df.attrs['athena'] = timings
+        return df
+    
+    def _wait_for_query(self, athena_client, query_id: str) -> Dict[str, Any]:
+        """Poll a query with exponential backoff until it succeeds; raise if it fails or times out"""
+        deadline = time.monotonic() + QUERY_TIMEOUT
+        interval = POLL_INITIAL_INTERVAL
+        while True:
+            execution = athena_client.get_query_execution(QueryExecutionId=query_id)['QueryExecution']
+            state = execution['Status']['State']
+            if state == 'SUCCEEDED':
+                return execution
+            if state in ('FAILED', 'CANCELLED'):
+                reason = execution['Status'].get('StateChangeReason', 'no reason given')
+                raise RuntimeError(f"Athena query {query_id} {state.lower()}: {reason}")
+            if time.monotonic() + interval > deadline:
+                athena_client.stop_query_execution(QueryExecutionId=query_id)
+                raise TimeoutError(f"Athena query {query_id} did not finish within {QUERY_TIMEOUT:.0f}s and was cancelled")
+            time.sleep(interval)
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+    
+    def _result_size(self, result_location: Optional[str], region: str, endpoint_url: Optional[str]) -> Optional[int]:
+        """Size in bytes of the query's CSV output, None if it cannot be read from S3"""
+        if not result_location:
+            return None
+        bucket, key = self._split_s3_uri(result_location)
+        try:
+            return self.get_client('s3', region, endpoint_url).head_object(Bucket=bucket, Key=key)['ContentLength']
+        except Exception as e:
+            logger.warning(f"Could not read size of {result_location}, falling back to GetQueryResults: {str(e)}")
+            return None
+    
+    @staticmethod
+    def _split_s3_uri(uri: str) -> Tuple[str, str]:
+        parsed = urlparse(uri)
+        return parsed.netloc, parsed.path.lstrip('/')
+    
+    def _result_columns(self, athena_client, query_id: str) -> List[Dict[str, str]]:
+        """Column names and Athena types of a query result"""
+        response = athena_client.get_query_results(QueryExecutionId=query_id, MaxResults=1)
+        return [{'name': column['Name'], 'type': column['Type'].lower()}
+                for column in response['ResultSet']['ResultSetMetadata']['ColumnInfo']]
+    
+    def _paginate_results(self, athena_client, query_id: str) -> pd.DataFrame:
+        """Read a (small) query result page by page through GetQueryResults"""
+        columns = None
+        rows: List[List[Optional[str]]] = []
+        paginator = athena_client.get_paginator('get_query_results')
+        for page in paginator.paginate(QueryExecutionId=query_id, PaginationConfig={'PageSize': 1000}):
+            page_rows = page['ResultSet']['Rows']
+            if columns is None:
+                columns = [{'name': column['Name'], 'type': column['Type'].lower()}
+                           for column in page['ResultSet']['ResultSetMetadata']['ColumnInfo']]
+                # The first row of a SELECT result repeats the column names
+                header = [cell.get('VarCharValue') for cell in page_rows[0]['Data']] if page_rows else []
+                if header == [column['name'] for column in columns]:
+                    page_rows = page_rows[1:]
+            rows.extend([cell.get('VarCharValue') for cell in row['Data']] for row in page_rows)
+        
+        columns = columns or []
+        df = pd.DataFrame(rows, columns=[column['name'] for column in columns], dtype=object)
+        return self._apply_types(df, columns)
+    
+    def _download_result(self, result_location: str, size: int, columns: List[Dict[str, str]],
+                         region: str, endpoint_url: Optional[str]) -> pd.DataFrame:
+        """
+        Download a query's CSV output in parallel byte ranges, parsing it while it arrives, into
+        a typed DataFrame. At most DOWNLOAD_WORKERS * 2 ranges are held in memory at a time.
+        """
+        bucket, key = self._split_s3_uri(result_location)
+        s3_client = self.get_client('s3', region, endpoint_url)
+        
+        def fetch_range(start: int) -> bytes:
+            end = min(start + DOWNLOAD_CHUNK_BYTES, size) - 1
+            return s3_client.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')['Body'].read()
         
-        # For now, return test data even in production mode
-        return self._get_test_data(query, database)
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            stream = _ChunkStream(executor, fetch_range, range(0, size, DOWNLOAD_CHUNK_BYTES), DOWNLOAD_WORKERS * 2)
+            try:
+                # Athena writes every value quoted and nulls as empty fields; read everything as text first
+                df = pd.read_csv(io.BufferedReader(stream), dtype=str, keep_default_na=False, na_values=[''])
+            finally:
+                stream.close()
+        return self._apply_types(df, columns)
+    
+    @staticmethod
+    def _apply_types(df: pd.DataFrame, columns: List[Dict[str, str]]) -> pd.DataFrame:
+        """Convert the text columns of a result to the dtypes of their Athena types"""
+        for column in columns:
+            name, athena_type = column['name'], column['type']
+            if name not in df.columns:
+                continue
+            values = df[name]
+            if athena_type in ATHENA_INTEGER_TYPES or athena_type.startswith(ATHENA_FLOAT_TYPES):
+                # Integers without nulls stay int64, with nulls they become float64
+                df[name] = pd.to_numeric(values, errors='coerce')
+            elif athena_type == 'boolean':
+                df[name] = values.map({'true': True, 'false': False})
+            elif athena_type in ATHENA_TIME_TYPES:
+                df[name] = pd.to_datetime(values, errors='coerce')
+            else:
+                df[name] = values.astype(object).where(values.notna(), None)
+        return df
     
     def _generate_test_data(self):
         """Generate test data for different query types."""
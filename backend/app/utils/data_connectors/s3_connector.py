@@ -0,0 +1,267 @@
+"""
+S3 Connector Module
+
+This module reads data objects from S3 into DataFrames.
+Bodies are parsed while they stream in (csv, jsonl, json, optionally gzipped) or read
+through byte ranges (parquet), keeping only the requested columns. Parsed objects are
+cached with their ETag and only downloaded again once the object has changed.
+"""
+
+import gzip
+import io
+import json
+import os
+import time
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import boto3
+import pandas as pd
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from ..cache import LRUCache, make_cache_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Object formats that can be read, by file extension
+S3_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'json', '.parquet': 'parquet'}
+
+# Connections kept open per client (threads of a worker share them)
+S3_POOL_CONNECTIONS = 16
+
+# Read size of streamed (and decompressed) bodies
+S3_STREAM_CHUNK_BYTES = 1024 * 1024
+
+# JSON lines parsed per batch, so only the kept columns of a batch stay in memory
+JSONL_BATCH_LINES = 100_000
+
+# Parsed objects (per column selection) kept in memory with their ETag
+S3_CACHE_ENTRIES = int(os.getenv('S3_CACHE_ENTRIES', '16'))
+
+# Decompressed objects up to this size are buffered in memory, larger ones in a temporary file
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+
+def object_format(key: str, file_format: Optional[str] = None,
+                  compression: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """Format and compression of an object, from the config or else from the key's extensions"""
+    name = key.lower()
+    if name.endswith('.gz'):
+        compression = compression or 'gzip'
+        name = name[:-3]
+    if file_format is None:
+        file_format = next((fmt for ext, fmt in S3_FORMATS.items() if name.endswith(ext)), 'json')
+    file_format = file_format.lower()
+    if file_format not in S3_FORMATS.values():
+        raise ValueError(f"Unsupported S3 object format: {file_format}. Expected one of {sorted(set(S3_FORMATS.values()))}")
+    if compression not in (None, 'gzip'):
+        raise ValueError(f"Unsupported S3 object compression: {compression}. Expected gzip")
+    return file_format, compression
+
+class _RangeFile(io.RawIOBase):
+    """Seekable read-only file over an S3 object, read in byte ranges pinned to one ETag"""
+
+    def __init__(self, client, bucket: str, key: str, size: int, etag: str):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.position = 0
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+        # IfMatch fails the read if the object is replaced while its ranges are being read
+        data = self.client.get_object(Bucket=self.bucket, Key=self.key, IfMatch=self.etag,
+                                      Range=f'bytes={self.position}-{end - 1}')['Body'].read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        self.bytes_read += len(data)
+        return len(data)
+
+class _CountingStream:
+    """File-like wrapper of a response body counting the bytes read from the network"""
+
+    def __init__(self, body):
+        self.body = body
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.body.read(size if size is not None and size >= 0 else None)
+        self.bytes_read += len(data)
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+def _lines(stream) -> Iterator[bytes]:
+    """Lines of a byte stream, read in S3_STREAM_CHUNK_BYTES chunks"""
+    pending = b''
+    for chunk in iter(lambda: stream.read(S3_STREAM_CHUNK_BYTES), b''):
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+def _line_batches(stream, size: int) -> Iterable[List[bytes]]:
+    batch = []
+    for line in _lines(stream):
+        if line.strip():
+            batch.append(line)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class S3Connector:
+    """
+    Reads S3 objects into DataFrames through pooled, long-lived clients.
+
+    Every read sends the cached object's ETag (If-None-Match), so an unchanged object costs
+    one request and no download. Within max_age seconds of the last check the cached object
+    is returned without any request.
+    """
+
+    def __init__(self, max_cached_objects: int = S3_CACHE_ENTRIES):
+        # One client per (region, endpoint), sharing its connection pool across threads
+        self._clients: Dict[Tuple[str, Optional[str]], Any] = {}
+        self._clients_lock = threading.Lock()
+        self._objects = LRUCache(max_entries=max_cached_objects)
+
+    def get_client(self, region: str, endpoint_url: Optional[str] = None):
+        """
+        Return the shared S3 client of a region. endpoint_url points it at a local stand-in
+        (moto server, LocalStack, MinIO); boto3 also honors AWS_ENDPOINT_URL_S3.
+        """
+        key = (region, endpoint_url)
+        with self._clients_lock:
+            if key not in self._clients:
+                config = Config(max_pool_connections=S3_POOL_CONNECTIONS, retries={'mode': 'adaptive', 'max_attempts': 5})
+                self._clients[key] = boto3.client('s3', region_name=region, endpoint_url=endpoint_url, config=config)
+            return self._clients[key]
+
+    def read_object(self, bucket: str, key: str, region: Optional[str] = None, file_format: Optional[str] = None,
+                    compression: Optional[str] = None, columns: Optional[Sequence[str]] = None,
+                    endpoint_url: Optional[str] = None, max_age: Optional[float] = None,
+                    use_cache: bool = True) -> Union[pd.DataFrame, Any]:
+        """
+        Read an object as a DataFrame keeping only columns (all when None). csv, jsonl and
+        parquet objects always give a DataFrame; a json document gives one when it is a list
+        of records and is returned as parsed otherwise (e.g. GeoJSON). Download details are
+        attached to DataFrames as df.attrs['s3'].
+        """
+        file_format, compression = object_format(key, file_format, compression)
+        client = self.get_client(region or 'us-east-1', endpoint_url)
+        cache_key = make_cache_key(bucket, key, region, endpoint_url, file_format, compression,
+                                   sorted(columns) if columns is not None else None)
+        cached = self._objects.get(cache_key) if use_cache else None
+        if cached is not None and max_age is not None and time.time() - cached['checked_at'] < max_age:
+            return cached['data']
+
+        start = time.perf_counter()
+        try:
+            data, details = self._download(client, bucket, key, file_format, compression, columns,
+                                           cached['etag'] if cached is not None else None)
+        except ClientError as e:
+            if cached is None or e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') != 304:
+                raise
+            logger.info(f"s3://{bucket}/{key} not modified (ETag {cached['etag']}), using cached copy")
+            cached['checked_at'] = time.time()
+            return cached['data']
+
+        details['download_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        if isinstance(data, pd.DataFrame):
+            details['rows'] = len(data)
+            data.attrs['s3'] = details
+        logger.info(f"Read s3://{bucket}/{key} ({file_format}{', ' + compression if compression else ''}): "
+                    f"{details['bytes']} bytes in {details['download_ms']} ms"
+                    f"{', columns ' + str(list(columns)) if columns is not None else ''}")
+        if use_cache:
+            self._objects.put(cache_key, {'etag': details['etag'], 'checked_at': time.time(), 'data': data})
+        return data
+
+    def _download(self, client, bucket: str, key: str, file_format: str, compression: Optional[str],
+                  columns: Optional[Sequence[str]], etag: Optional[str]) -> Tuple[Any, Dict[str, Any]]:
+        conditional = {'IfNoneMatch': etag} if etag else {}
+        if file_format == 'parquet' and compression is None:
+            # Parquet is read from its footer: only the row groups' chunks of the kept columns are fetched
+            head = client.head_object(Bucket=bucket, Key=key, **conditional)
+            source = _RangeFile(client, bucket, key, head['ContentLength'], head['ETag'])
+            data = self._read_parquet(source, columns)
+            return data, {'etag': head['ETag'], 'size': head['ContentLength'], 'bytes': source.bytes_read}
+
+        response = client.get_object(Bucket=bucket, Key=key, **conditional)
+        body = _CountingStream(response['Body'])
+        stream = body
+        if compression == 'gzip' or response.get('ContentEncoding') == 'gzip':
+            stream = gzip.GzipFile(fileobj=body, mode='rb')
+
+        if file_format == 'csv':
+            wanted = set(columns) if columns is not None else None
+            data = pd.read_csv(stream, usecols=(lambda name: name in wanted) if wanted is not None else None)
+        elif file_format == 'jsonl':
+            data = self._read_jsonl(stream, columns)
+        elif file_format == 'parquet':
+            # Compressed parquet has to be decompressed in full before its footer can be read
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spooled:
+                for chunk in iter(lambda: stream.read(S3_STREAM_CHUNK_BYTES), b''):
+                    spooled.write(chunk)
+                spooled.seek(0)
+                data = self._read_parquet(spooled, columns)
+        else:
+            data = json.load(stream)
+            if isinstance(data, list) and all(isinstance(record, dict) for record in data):
+                data = pd.DataFrame.from_records(data)
+                if columns is not None:
+                    data = data[[name for name in data.columns if name in set(columns)]]
+        return data, {'etag': response['ETag'], 'size': response['ContentLength'], 'bytes': body.bytes_read}
+
+    @staticmethod
+    def _read_jsonl(stream, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+        """Parse JSON lines in batches, dropping unwanted columns batch by batch"""
+        wanted = set(columns) if columns is not None else None
+        frames = []
+        for batch in _line_batches(stream, JSONL_BATCH_LINES):
+            frame = pd.read_json(io.BytesIO(b''.join(batch)), lines=True)
+            if wanted is not None:
+                frame = frame[[name for name in frame.columns if name in wanted]]
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(columns or []))
+
+    @staticmethod
+    def _read_parquet(source, columns: Optional[Sequence[str]]) -> pd.DataFrame:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Reading parquet objects requires pyarrow (pip install pyarrow)")
+        parquet_file = pq.ParquetFile(source)
+        if columns is not None:
+            columns = [name for name in parquet_file.schema_arrow.names if name in set(columns)]
+        return parquet_file.read(columns=columns).to_pandas()
+
+# Singleton instance for easy import
+s3 = S3Connector()
@@ -0,0 +1,121 @@
+import math
+import numpy as np
+import pandas as pd
+from typing import Any, Dict
+
+# Level-of-detail modes applied when a request exceeds its point budget
+LOD_MODES = ('cluster', 'sample')
+
+# Cluster grid cells along one side of a 256px tile (cells are about 4px wide)
+CLUSTER_BINS_PER_TILE = 64
+
+# Finest zoom level of the precomputed cluster grid
+MAX_CLUSTER_ZOOM = 16
+
+# Cluster levels reducing the rows by less than this ratio are not stored (full detail is as cheap)
+CLUSTER_LEVEL_MAX_RATIO = 0.5
+
+def cluster_cell_size(zoom: int) -> float:
+    """Edge length in degrees of the cluster grid cells at a zoom level"""
+    return 360.0 / (2 ** zoom) / CLUSTER_BINS_PER_TILE
+
+# Tiles across a typical map viewport, used to guess the zoom level of a bbox
+VIEWPORT_TILES = 4
+
+def zoom_for_width(width: float) -> int:
+    """Zoom level at which a longitude span of width degrees fills a map viewport"""
+    if width <= 0:
+        return MAX_CLUSTER_ZOOM
+    return int(min(max(math.floor(math.log2(360.0 * VIEWPORT_TILES / width)), 0), MAX_CLUSTER_ZOOM))
+
+def _grid_cells(lat: np.ndarray, lon: np.ndarray, cell_size: float):
+    # Anchored at (-180, -90) so the four children of a cell at zoom z+1 are exactly its area
+    return np.floor((lon + 180) / cell_size).astype(np.int64), np.floor((lat + 90) / cell_size).astype(np.int64)
+
+def grid_clusters(lat: np.ndarray, lon: np.ndarray, zoom: int) -> pd.DataFrame:
+    """
+    Cluster points into the grid of a zoom level.
+    Returns a DataFrame with cell_x, cell_y, count, sum_lat and sum_lon (mergeable, so levels roll up).
+    """
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    lat, lon = lat[valid], lon[valid]
+    cell_x, cell_y = _grid_cells(lat, lon, cluster_cell_size(zoom))
+    cells = pd.DataFrame({'cell_x': cell_x, 'cell_y': cell_y, 'lat': lat, 'lon': lon}).groupby(
+        ['cell_x', 'cell_y'], sort=False
+    ).agg(count=('lat', 'size'), sum_lat=('lat', 'sum'), sum_lon=('lon', 'sum'))
+    return cells.reset_index()
+
+def roll_up_clusters(cells: pd.DataFrame) -> pd.DataFrame:
+    """Merge the clusters of one zoom level into the next coarser level"""
+    parents = cells.assign(cell_x=cells['cell_x'] // 2, cell_y=cells['cell_y'] // 2)
+    return parents.groupby(['cell_x', 'cell_y'], sort=False)[['count', 'sum_lat', 'sum_lon']].sum().reset_index()
+
+def build_cluster_levels(lat: np.ndarray, lon: np.ndarray) -> Dict[int, pd.DataFrame]:
+    """
+    Precompute the hierarchical grid clusters: cluster once at MAX_CLUSTER_ZOOM and roll
+    the cells up zoom by zoom. Only levels that reduce the points enough are kept.
+    """
+    max_cells = CLUSTER_LEVEL_MAX_RATIO * np.count_nonzero(np.isfinite(lat) & np.isfinite(lon))
+    levels = {}
+    cells = grid_clusters(lat, lon, MAX_CLUSTER_ZOOM)
+    for zoom in range(MAX_CLUSTER_ZOOM, -1, -1):
+        if zoom < MAX_CLUSTER_ZOOM:
+            cells = roll_up_clusters(cells)
+        if len(cells) <= max_cells:
+            levels[zoom] = cells
+    return levels
+
+def clusters_to_geojson(cells: pd.DataFrame) -> Dict[str, Any]:
+    """Convert clusters to point features at their centroid with a point_count property"""
+    counts = cells['count'].to_numpy()
+    lat = cells['sum_lat'].to_numpy() / counts
+    lon = cells['sum_lon'].to_numpy() / counts
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [x, y]},
+            "properties": {"cluster": True, "point_count": n}
+        }
+        for x, y, n in zip(lon.tolist(), lat.tolist(), counts.tolist())
+    ]
+    return {"type": "FeatureCollection", "features": features, "clustered": True}
+
+def stratified_sample(lat: np.ndarray, lon: np.ndarray, row_ids: np.ndarray, max_points: int,
+                      zoom: int) -> np.ndarray:
+    """
+    Pick at most max_points positions, spread evenly over space: points are grouped into
+    the cluster grid of the zoom level (coarsened until there are fewer cells than the budget)
+    and every cell keeps up to the same quota of points, so sparse areas keep all of theirs.
+    Within a cell, points are ranked by a hash of their row id, so a row stays selected
+    across requests and viewports. Rows without coordinates are dropped.
+    Returns the selected positions in ascending order.
+    """
+    positions = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    if len(positions) <= max_points:
+        return positions
+    if max_points <= 0:
+        return np.empty(0, dtype=np.int64)
+    lat, lon, row_ids = lat[positions], lon[positions], row_ids[positions]
+
+    cell_size = cluster_cell_size(zoom)
+    while True:
+        cell_x, cell_y = _grid_cells(lat, lon, cell_size)
+        _, cell_ids, counts = np.unique(cell_y * (1 << 32) + cell_x, return_inverse=True, return_counts=True)
+        if len(counts) <= max_points:
+            break
+        cell_size *= 2
+
+    # Largest per-cell quota that fits the budget
+    low, high = 1, int(counts.max())
+    while low < high:
+        quota = (low + high + 1) // 2
+        if np.minimum(counts, quota).sum() <= max_points:
+            low = quota
+        else:
+            high = quota - 1
+
+    priority = (row_ids.astype(np.uint64) * np.uint64(2654435761)) % np.uint64(1 << 32)
+    order = np.lexsort((priority, cell_ids))
+    cell_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = np.arange(len(order)) - cell_starts[cell_ids[order]]
+    return positions[np.sort(order[rank < low])]
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Sequence, Tuple
+from .time_index import epoch_seconds
+
+# Series reductions keeping the visual shape of a line chart
+DOWNSAMPLE_METHODS = ('lttb', 'minmax', 'avg')
+
+# Fewest points a series can be reduced to (LTTB always keeps the first and last point)
+MIN_DOWNSAMPLE_POINTS = 3
+
+def _bucket_edges(n: int, buckets: int) -> np.ndarray:
+    """Edges of buckets splitting n positions into runs of (almost) equal length"""
+    return np.linspace(0, n, buckets + 1).astype(np.int64)
+
+def _bucket_means(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    return np.add.reduceat(values, edges[:-1]) / np.diff(edges)
+
+def lttb(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: keep the first and last point and, from each of
+    max_points - 2 buckets, the point forming the largest triangle with the point kept
+    in the previous bucket and the average of the next bucket. x must be ascending.
+    Each bucket depends on the previous pick, so buckets are visited in order but every
+    bucket is scored in one array operation (O(n) work overall).
+    Returns the kept positions in ascending order.
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+    edges = _bucket_edges(n - 2, max_points - 2) + 1
+    # Average of every bucket, followed by the last point as the "next bucket" of the final one
+    next_x = np.append(_bucket_means(x, edges)[1:], x[-1])
+    next_y = np.append(_bucket_means(y, edges)[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - next_x[i]) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y[i] - ay))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+def minmax(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Keep the lowest and highest point of each of max_points // 2 buckets, so every spike
+    of the series survives. Returns the kept positions in ascending order.
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    width = -(-n // (max_points // 2))
+    buckets = -(-n // width)
+    # Equal-width buckets as the rows of a matrix, the tail of the last one padded
+    padded = np.full(buckets * width, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    lowest = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highest = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    return np.unique(np.concatenate((lowest, highest)))
+
+def bucket_average(x: np.ndarray, y: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mean x and y of max_points buckets of consecutive points, with the bucket edges"""
+    edges = _bucket_edges(len(x), min(max_points, len(x)))
+    return _bucket_means(x, edges), _bucket_means(y, edges), edges
+
+def downsample_records(records: List[Dict[str, Any]], x_field: str, y_field: str, max_points: int,
+                       method: str = 'lttb', sum_fields: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """
+    Reduce a series of records sorted by x_field to at most max_points. lttb and minmax keep
+    a subset of the records; avg returns one record per bucket with the mean x and y and the
+    sum of sum_fields. x may be numbers or ISO 8601 times. Records without a numeric x and y
+    are dropped.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unsupported downsampling method: {method}. Expected one of {DOWNSAMPLE_METHODS}")
+    if len(records) <= max_points:
+        return records
+
+    x_values = pd.Series([record.get(x_field) for record in records])
+    x = pd.to_numeric(x_values, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    times = None
+    if np.isnan(x).all():
+        times = pd.to_datetime(x_values, errors='coerce')
+        x = epoch_seconds(times)
+    y = pd.to_numeric(pd.Series([record.get(y_field) for record in records]), errors='coerce').to_numpy(
+        dtype=float, na_value=np.nan)
+    positions = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    x, y = x[positions], y[positions]
+    if not len(positions):
+        return []
+
+    if method == 'lttb':
+        return [records[i] for i in positions[lttb(x, y, max_points)].tolist()]
+    if method == 'minmax':
+        return [records[i] for i in positions[minmax(y, max_points)].tolist()]
+
+    mean_x, mean_y, edges = bucket_average(x, y, max_points)
+    if times is not None:
+        mean_times = pd.to_datetime(mean_x, unit='s').round('us')
+        if times.dt.tz is not None:
+            mean_times = mean_times.tz_localize('UTC').tz_convert(times.dt.tz)
+        mean_x = [time.isoformat() for time in mean_times]
+    else:
+        mean_x = mean_x.tolist()
+    columns = {x_field: mean_x, y_field: mean_y.tolist()}
+    for field in sum_fields:
+        values = pd.to_numeric(pd.Series([records[i].get(field) for i in positions.tolist()]), errors='coerce')
+        columns[field] = np.add.reduceat(values.fillna(0).to_numpy(), edges[:-1]).tolist()
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+def downsample_series(result: Dict[str, Any], max_points: int, method: str = 'lttb') -> Dict[str, Any]:
+    """Reduce the {time, value, rows} series of a time series result to at most max_points"""
+    series = downsample_records(result['series'], 'time', 'value', max_points, method, sum_fields=('rows',))
+    return {**result, 'series': series,
+            'downsample': {'method': method, 'max_points': max_points, 'source_points': len(result['series'])}}
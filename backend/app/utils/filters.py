@@ -0,0 +1,162 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Callable
+
+# Operators that compare a column against filter_def['value']
+VALUE_OPERATORS = ('equals', 'contains', 'greater_than', 'less_than', 'in', 'between', 'not_in', 'regex')
+
+# Operators that only look at the column
+NULL_OPERATORS = ('is_null', 'not_null')
+
+FILTER_OPERATORS = VALUE_OPERATORS + NULL_OPERATORS
+
+# Logic keywords for filter groups, e.g. {"logic": "or", "filters": [...]}
+FILTER_LOGIC = ('and', 'or')
+
+# Longest accepted regex filter pattern; patterns come from requests and run against every row
+MAX_REGEX_LENGTH = 200
+
+FilterMask = Callable[[pd.DataFrame], np.ndarray]
+
+def _categorical_mask(series: pd.Series, predicate: Callable[[pd.Series], Any]) -> np.ndarray:
+    """
+    Evaluate a predicate once per category instead of once per row and broadcast
+    the result through the codes. Missing values never match.
+    """
+    categories = series.cat.categories
+    category_mask = np.append(np.asarray(predicate(pd.Series(categories)), dtype=bool), False)
+    codes = series.cat.codes.to_numpy()
+    # Code -1 (missing) picks the trailing False
+    return category_mask[codes]
+
+def _value_mask(series: pd.Series, predicate: Callable[[pd.Series], Any]) -> np.ndarray:
+    """Evaluate a predicate over a column, going through the categories for categoricals"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return _categorical_mask(series, predicate)
+    return np.asarray(predicate(series), dtype=bool)
+
+def _numeric(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+        return series
+    return pd.to_numeric(series.astype(object), errors='coerce')
+
+def _compile_condition(filter_def: Dict[str, Any]) -> FilterMask:
+    """Compile one {column, operator, value} filter into a function returning a boolean mask"""
+    column = filter_def['column']
+    operator = filter_def['operator']
+    value = filter_def.get('value')
+
+    if operator == 'equals' and isinstance(value, list):
+        # Multi-select inputs send a list of accepted values
+        operator = 'in'
+
+    if operator == 'equals':
+        predicate = lambda s: (s == value).fillna(False)
+    elif operator == 'contains':
+        needle = str(value)
+        # Missing values never match (as text they would read 'nan' or 'None')
+        predicate = lambda s: s.astype(str).str.contains(needle, regex=False) & s.notna()
+    elif operator == 'regex':
+        if len(str(value)) > MAX_REGEX_LENGTH:
+            raise ValueError(f"Regex filter on {column} is longer than {MAX_REGEX_LENGTH} characters")
+        try:
+            pattern = re.compile(str(value))
+        except re.error as e:
+            raise ValueError(f"Invalid regex filter on {column}: {e}")
+        predicate = lambda s: s.astype(str).str.contains(pattern) & s.notna()
+    elif operator in ('in', 'not_in'):
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        predicate = lambda s: s.isin(values)
+    elif operator in ('greater_than', 'less_than', 'between'):
+        if operator == 'between':
+            if not isinstance(value, (list, tuple)) or len(value) != 2:
+                raise ValueError(f"Filter 'between' on {column} expects [low, high], got {value!r}")
+            low, high = float(value[0]), float(value[1])
+        else:
+            threshold = float(value)
+        def predicate(s: pd.Series) -> np.ndarray:
+            numbers = _numeric(s).to_numpy(dtype=float, na_value=np.nan)
+            with np.errstate(invalid='ignore'):
+                if operator == 'greater_than':
+                    return numbers > threshold
+                if operator == 'less_than':
+                    return numbers < threshold
+                return (numbers >= low) & (numbers <= high)
+    elif operator in NULL_OPERATORS:
+        # is_null with value: false selects non-null rows, like not_null
+        want_null = (True if value is None else bool(value)) if operator == 'is_null' else False
+        def compiled(df: pd.DataFrame) -> np.ndarray:
+            if column not in df.columns:
+                raise ValueError(f"Unknown filter column: {column}")
+            nulls = df[column].isna().to_numpy()
+            return nulls if want_null else ~nulls
+        return compiled
+    else:
+        raise ValueError(f"Unsupported filter operator: {operator}. Expected one of {FILTER_OPERATORS}")
+
+    def compiled(df: pd.DataFrame) -> np.ndarray:
+        if column not in df.columns:
+            raise ValueError(f"Unknown filter column: {column}")
+        mask = _value_mask(df[column], predicate)
+        if operator == 'not_in':
+            return ~mask
+        return mask
+    return compiled
+
+def _is_group(filter_def: Dict[str, Any]) -> bool:
+    return 'filters' in filter_def
+
+def _is_complete(filter_def: Dict[str, Any]) -> bool:
+    """A condition needs a column and an operator, and a value unless the operator takes none"""
+    if not filter_def.get('column') or not filter_def.get('operator'):
+        return False
+    return filter_def['operator'] in NULL_OPERATORS or filter_def.get('value') is not None
+
+def compile_filters(filters: List[Dict[str, Any]], logic: str = 'and') -> FilterMask:
+    """
+    Compile filter definitions once into a function mapping a DataFrame to a boolean row mask.
+
+    Each entry is either a condition {column, operator, value} or a group
+    {logic: 'and'|'or', filters: [...]} that can nest further groups. Top-level entries
+    are combined with `logic`. Incomplete conditions (no column, operator or value) and
+    groups without any complete condition are skipped; falsy values such as 0 and False
+    are applied.
+    """
+    if logic not in FILTER_LOGIC:
+        raise ValueError(f"Unsupported filter logic: {logic}. Expected one of {FILTER_LOGIC}")
+
+    parts = []
+    for filter_def in filters or []:
+        if not isinstance(filter_def, dict):
+            raise ValueError(f"Invalid filter definition: {filter_def!r}")
+        if _is_group(filter_def):
+            group = compile_filters(filter_def['filters'], filter_def.get('logic', 'and'))
+            # A group without conditions is neutral: it neither selects nor excludes rows
+            if has_active_filters(filter_def['filters']):
+                parts.append(group)
+        elif _is_complete(filter_def):
+            parts.append(_compile_condition(filter_def))
+
+    combine = np.logical_and if logic == 'and' else np.logical_or
+
+    def compiled(df: pd.DataFrame) -> np.ndarray:
+        if not parts:
+            return np.ones(len(df), dtype=bool)
+        mask = parts[0](df)
+        for part in parts[1:]:
+            mask = combine(mask, part(df))
+        return mask
+    return compiled
+
+def has_active_filters(filters: List[Dict[str, Any]]) -> bool:
+    """Whether any condition in the (possibly nested) filter definitions would be applied"""
+    for filter_def in filters or []:
+        if not isinstance(filter_def, dict):
+            continue
+        if _is_group(filter_def):
+            if has_active_filters(filter_def['filters']):
+                return True
+        elif _is_complete(filter_def):
+            return True
+    return False
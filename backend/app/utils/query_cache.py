@@ -0,0 +1,282 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from .artifacts import CURRENT_FILE, current_version_dir, new_version_dir, publish_version
+from .cache import DISK_CACHE_PRUNE_RATIO, make_cache_key
+from .column_store import ColumnStore
+
+# String literals, comments and whitespace runs, in the order they are matched by normalize_sql
+_SQL_TOKENS = re.compile(r"('(?:[^']|'')*')|(--[^\n]*)|(/\*.*?\*/)|(\s+)", re.DOTALL)
+
+def normalize_sql(query: str) -> str:
+    """
+    Canonical form of a SQL query for cache keys: comments removed, whitespace collapsed,
+    trailing semicolons dropped and everything outside string literals lowercased
+    (Athena identifiers and keywords are case-insensitive).
+    """
+    parts = ['']
+    position = 0
+    for match in _SQL_TOKENS.finditer(query):
+        if match.start() > position:
+            parts.append(query[position:match.start()].lower())
+        literal = match.group(1)
+        if literal is not None:
+            parts.append(literal)
+        elif not parts[-1].endswith(' '):
+            parts.append(' ')
+        position = match.end()
+    parts.append(query[position:].lower())
+    return ''.join(parts).strip().rstrip(';').strip()
+
+def _is_mapped(values: np.ndarray) -> bool:
+    """Whether an array's data lives in a memory-mapped file rather than on the heap"""
+    while values is not None:
+        if isinstance(values, (np.memmap, mmap.mmap)):
+            return True
+        values = getattr(values, 'base', None)
+    return False
+
+def heap_nbytes(df: pd.DataFrame) -> int:
+    """Bytes a DataFrame holds on the heap, leaving out columns backed by memory-mapped files"""
+    total = int(df.index.memory_usage(deep=True))
+    for name in df.columns:
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # Codes may be mapped, the categories are always parsed onto the heap
+            codes = series.array.codes
+            total += int(series.cat.categories.memory_usage(deep=True))
+            total += 0 if _is_mapped(codes) else codes.nbytes
+        elif series.dtype.kind in 'biufcmM':
+            values = series.to_numpy(copy=False)
+            total += 0 if _is_mapped(values) else values.nbytes
+        else:
+            total += int(series.memory_usage(index=False, deep=True))
+    return total
+
+def query_cache_key(query: str, database: Optional[str] = None, workgroup: Optional[str] = None) -> str:
+    return make_cache_key(normalize_sql(query), database, workgroup)
+
+class QueryResultCache:
+    """
+    Cache of query result DataFrames with a memory byte budget and a disk tier.
+
+    Results are written through to a column store under spill_dir, so entries evicted from
+    memory (least recently used first, past max_bytes) and results fetched by other workers
+    are served memory-mapped instead of re-running the query. The disk tier is kept within
+    max_disk_bytes by deleting the least recently used results. Entries older than their ttl
+    are stale: the stale result is returned at once and refreshed in the background.
+    Concurrent requests for the same missing key wait for a single fetch.
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, spill_dir: Path, max_bytes: int = 256 * 1024 * 1024,
+                 max_disk_bytes: int = 1024 * 1024 * 1024, refresh_workers: int = 2):
+        self.spill_dir = Path(spill_dir)
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='query-refresh')
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.spill_dir / hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _load_spilled(self, key: str) -> Optional[Dict[str, Any]]:
+        """Open the published result of a key from the disk tier, memory-mapped"""
+        version_dir = current_version_dir(self._entry_dir(key))
+        if version_dir is None:
+            return None
+        try:
+            with open(version_dir / self.META_FILE, 'r') as f:
+                meta = json.load(f)
+            df = ColumnStore.open(version_dir / 'columns').to_frame()
+            # The pointer's modification time marks the entry as recently used on disk
+            os.utime(version_dir.parent / CURRENT_FILE)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        df.attrs['query_cache'] = {'fetched_at': meta['fetched_at']}
+        # Mapped columns are paged in and out by the OS and shared between workers, the rest is heap
+        return {'df': df, 'fetched_at': meta['fetched_at'], 'nbytes': heap_nbytes(df)}
+
+    def _spill(self, key: str, df: pd.DataFrame, fetched_at: float) -> None:
+        """Write a result to the disk tier as a new version and publish it (superseded versions are removed)"""
+        version_dir = new_version_dir(self._entry_dir(key))
+        try:
+            ColumnStore.write(df, version_dir / 'columns')
+            with open(version_dir / self.META_FILE, 'w') as f:
+                json.dump({'key': key, 'fetched_at': fetched_at}, f)
+        except Exception:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        publish_version(version_dir)
+        self._prune_disk(key)
+
+    def _prune_disk(self, keep_key: str) -> None:
+        """
+        Delete the least recently used results on disk once they take more than max_disk_bytes,
+        those not held in memory first. Deleted results are dropped from memory as well, so
+        their mapped files are released.
+        """
+        entries = []
+        for entry_dir in self.spill_dir.iterdir():
+            try:
+                used_at = (entry_dir / CURRENT_FILE).stat().st_mtime
+                size = sum(path.stat().st_size for path in entry_dir.rglob('*') if path.is_file())
+            except FileNotFoundError:
+                # Not published yet (or being deleted by another worker)
+                continue
+            entries.append((used_at, size, entry_dir))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_disk_bytes:
+            return
+        with self._lock:
+            in_memory = {self._entry_dir(key): (position, key) for position, key in enumerate(self._entries)}
+        keep_dir = self._entry_dir(keep_key)
+        target = self.max_disk_bytes * DISK_CACHE_PRUNE_RATIO
+        # Results not held in memory by last use on disk, then those in memory by last use in memory
+        order = lambda entry: (entry[2] in in_memory, in_memory.get(entry[2], (0, None))[0], entry[0])
+        for _, size, entry_dir in sorted(entries, key=order):
+            if total <= target:
+                break
+            if entry_dir == keep_dir:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            if entry_dir in in_memory:
+                with self._lock:
+                    evicted = self._entries.pop(in_memory[entry_dir][1], None)
+                    if evicted is not None:
+                        self._bytes -= evicted['nbytes']
+
+    def _remember(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous['nbytes']
+            self._entries[key] = entry
+            self._bytes += entry['nbytes']
+            # Evicted results stay available from the disk tier
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted['nbytes']
+
+    def _fetch(self, key: str, fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        df = fetch()
+        fetched_at = time.time()
+        df.attrs['query_cache'] = {'fetched_at': fetched_at}
+        try:
+            self._spill(key, df, fetched_at)
+            # Keep the mapped copy, whose pages are shared with other workers, instead of the heap copy
+            spilled = self._load_spilled(key)
+            if spilled is not None and spilled['fetched_at'] == fetched_at:
+                self._remember(key, spilled)
+                return spilled['df']
+        except Exception as e:
+            print(f"Could not write query result to disk cache: {str(e)}")
+        self._remember(key, {'df': df, 'fetched_at': fetched_at, 'nbytes': heap_nbytes(df)})
+        return df
+
+    def _single_flight(self, key: str, fetch: Callable[[], pd.DataFrame], background: bool = False) -> Optional[Future]:
+        """Start a fetch unless one is running for the key; returns the running fetch"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self._inflight[key] = future
+
+        def run() -> None:
+            try:
+                future.set_result(self._fetch(key, fetch))
+            except Exception as e:
+                future.set_exception(e)
+                if background:
+                    print(f"Background refresh of cached query failed, keeping stale result: {str(e)}")
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        if background:
+            self._refresher.submit(run)
+        else:
+            run()
+        return future
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], pd.DataFrame], ttl: Optional[float] = None) -> pd.DataFrame:
+        """
+        Return the cached result of a key, calling fetch on a miss. With a ttl (seconds),
+        older results are returned as they are while a background refresh replaces them.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load_spilled(key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return self._single_flight(key, fetch).result()
+
+        if ttl is not None and time.time() - entry['fetched_at'] > ttl:
+            # Another worker (or the refresh scheduler) may have published a newer result
+            spilled = self._load_spilled(key)
+            if spilled is not None and spilled['fetched_at'] > entry['fetched_at']:
+                self._remember(key, spilled)
+                entry = spilled
+        if ttl is not None and time.time() - entry['fetched_at'] > ttl:
+            with self._lock:
+                self.stale_hits += 1
+            self._single_flight(key, fetch, background=True)
+        else:
+            with self._lock:
+                self.hits += 1
+        return entry['df']
+
+    def refresh(self, key: str, fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        """Fetch and publish a new result for a key now, joining a refresh already running"""
+        return self._single_flight(key, fetch).result()
+
+    def fetched_at(self, key: str) -> Optional[float]:
+        """Time the newest result of a key was fetched, as published on disk or held in memory"""
+        version_dir = current_version_dir(self._entry_dir(key))
+        if version_dir is not None:
+            try:
+                with open(version_dir / self.META_FILE, 'r') as f:
+                    return json.load(f)['fetched_at']
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry['fetched_at'] if entry is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,120 @@
+import fcntl
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Fraction of a source's refresh_interval after which it is refreshed, ahead of its expiry
+REFRESH_AHEAD_RATIO = 0.8
+
+# Seconds between checks for due refreshes (and attempts to take over the scheduler lock)
+SCHEDULER_POLL_INTERVAL = 5.0
+
+class RefreshScheduler:
+    """
+    Background thread refreshing data sources ahead of their refresh_interval.
+
+    jobs is called on every check so config changes are picked up; it returns dicts with
+    an 'id', an 'interval' in seconds, a 'refresh' callable and optionally a 'last_refreshed'
+    callable giving the time the published data was produced. Due jobs run on a bounded
+    pool, one run per job at a time. Only the process holding the lock file runs refreshes,
+    so with several gunicorn workers exactly one of them refreshes; the others take over
+    if it exits.
+    """
+
+    def __init__(self, lock_path: Path, jobs: Callable[[], List[Dict[str, Any]]], max_workers: int = 2,
+                 poll_interval: float = SCHEDULER_POLL_INTERVAL):
+        self.lock_path = Path(lock_path)
+        self.jobs = jobs
+        self.poll_interval = poll_interval
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='source-refresh')
+        self._lock_file = None
+        self._running = set()
+        self._history: Dict[str, Dict[str, Any]] = {}
+        self._state_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def _acquire_lock(self) -> bool:
+        """Try to become the scheduling process; the lock is released when the process exits"""
+        if self._lock_file is None:
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = open(self.lock_path, 'a+')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(str(os.getpid()))
+            lock_file.flush()
+            self._lock_file = lock_file
+            print(f"Refresh scheduler running in worker {os.getpid()}")
+        return True
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='refresh-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._pool.shutdown(wait=False)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._acquire_lock():
+                    self.run_due()
+            except Exception as e:
+                print(f"Error in refresh scheduler: {str(e)}")
+            self._stop.wait(self.poll_interval)
+
+    def _is_due(self, job: Dict[str, Any], now: float) -> bool:
+        with self._state_lock:
+            if job['id'] in self._running:
+                return False
+            last_attempt = self._history.get(job['id'], {}).get('started_at')
+        last_refreshed = job['last_refreshed']() if 'last_refreshed' in job else None
+        times = [t for t in (last_attempt, last_refreshed) if t is not None]
+        return not times or now - max(times) >= job['interval'] * REFRESH_AHEAD_RATIO
+
+    def run_due(self) -> None:
+        """Submit every job whose data is due for a refresh"""
+        now = time.time()
+        for job in self.jobs():
+            if self._is_due(job, now):
+                with self._state_lock:
+                    self._running.add(job['id'])
+                self._pool.submit(self._refresh, job)
+
+    def _refresh(self, job: Dict[str, Any]) -> None:
+        started_at = time.time()
+        with self._state_lock:
+            self._history[job['id']] = {'started_at': started_at}
+        try:
+            job['refresh']()
+            entry = {'started_at': started_at, 'duration': time.time() - started_at, 'error': None}
+            print(f"Refreshed data source {job['id']} in {entry['duration']:.2f}s")
+        except Exception as e:
+            entry = {'started_at': started_at, 'duration': time.time() - started_at, 'error': str(e)}
+            print(f"Error refreshing data source {job['id']}: {str(e)}")
+        with self._state_lock:
+            self._history[job['id']] = entry
+            self._running.discard(job['id'])
+
+    def status(self) -> Dict[str, Any]:
+        with self._state_lock:
+            return {
+                'leader': self.is_leader,
+                'worker_pid': os.getpid(),
+                'running': sorted(self._running),
+                'sources': {job_id: dict(entry) for job_id, entry in self._history.items()}
+            }
@@ -0,0 +1,187 @@
+import json
+import math
+import h3
+import h3.api.basic_int as h3_int
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .aggregations import KM_PER_DEGREE
+
+# Edge length in degrees of the grid cells the index sorts rows by
+GRID_CELL_DEGREES = 0.1
+
+# (min_lon, min_lat, max_lon, max_lat)
+BBox = Tuple[float, float, float, float]
+
+def parse_bbox(value: Any) -> Optional[BBox]:
+    """Parse a 'minLon,minLat,maxLon,maxLat' string or a 4-item list into a bounding box"""
+    if value is None or value == '':
+        return None
+    parts = value.split(',') if isinstance(value, str) else list(value)
+    if len(parts) != 4:
+        raise ValueError(f"bbox expects minLon,minLat,maxLon,maxLat, got {value!r}")
+    min_lon, min_lat, max_lon, max_lat = (float(part) for part in parts)
+    if min_lat > max_lat:
+        raise ValueError(f"bbox minLat {min_lat} is greater than maxLat {max_lat}")
+    return min_lon, min_lat, max_lon, max_lat
+
+def zoom_to_h3_resolution(zoom: float) -> int:
+    """Pick the H3 resolution whose hexagons stay a few pixels wide at a web map zoom level"""
+    return int(min(max((float(zoom) - 1) * 0.8, 0), 15))
+
+def tile_bbox(z: int, x: int, y: int) -> BBox:
+    """Bounding box of a web mercator (slippy map) tile"""
+    n = 2 ** z
+    if not (0 <= x < n and 0 <= y < n):
+        raise ValueError(f"Tile {z}/{x}/{y} is outside the zoom {z} grid")
+    tile_lat = lambda row: math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+    return x / n * 360 - 180, tile_lat(y + 1), (x + 1) / n * 360 - 180, tile_lat(y)
+
+def pad_bbox(bbox: BBox, margin: float) -> BBox:
+    """Grow a bounding box by a margin in degrees of latitude (widened in longitude towards the poles)"""
+    if margin <= 0:
+        return bbox
+    min_lon, min_lat, max_lon, max_lat = bbox
+    cos_lat = max(math.cos(math.radians(min(max(abs(min_lat), abs(max_lat)), 89.0))), 0.01)
+    lon_margin = margin / cos_lat
+    return (min_lon - lon_margin, max(min_lat - margin, -90.0), max_lon + lon_margin, min(max_lat + margin, 90.0))
+
+def h3_margin(resolution: int) -> float:
+    """Margin in degrees that keeps hexagons overlapping a bbox edge when clipping by centroid"""
+    return h3.average_hexagon_edge_length(resolution, unit='km') / KM_PER_DEGREE
+
+def _lon_ranges(bbox: BBox) -> List[Tuple[float, float]]:
+    """Split a bbox crossing the antimeridian (min_lon > max_lon) into two longitude ranges"""
+    min_lon, _, max_lon, _ = bbox
+    if max_lon - min_lon >= 360:
+        return [(-180.0, 180.0)]
+    if min_lon > max_lon:
+        return [(min_lon, 180.0), (-180.0, max_lon)]
+    return [(min_lon, max_lon)]
+
+def bbox_mask(lat: np.ndarray, lon: np.ndarray, bbox: BBox) -> np.ndarray:
+    """Boolean mask of the coordinates inside a bounding box"""
+    _, min_lat, _, max_lat = bbox
+    with np.errstate(invalid='ignore'):
+        mask = np.zeros(len(lat), dtype=bool)
+        for low, high in _lon_ranges(bbox):
+            mask |= (lon >= low) & (lon <= high)
+        return mask & (lat >= min_lat) & (lat <= max_lat)
+
+class SpatialIndex:
+    """
+    Row index sorted by grid cell, stored next to the column store.
+
+    Every row with valid coordinates gets the key row * n_cols + col of the
+    GRID_CELL_DEGREES grid cell it falls in, and the row ids are stored sorted by
+    that key. A bounding box then covers one contiguous key range per grid row,
+    each found with two binary searches; only rows in the border cells need
+    an exact coordinate check.
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, meta: Dict[str, Any], keys: np.ndarray, rows: np.ndarray):
+        self.meta = meta
+        self.keys = keys
+        self.rows = rows
+        self.cell_size = meta['cell_size']
+        self.n_cols = int(round(360 / self.cell_size))
+        self.n_rows = int(round(180 / self.cell_size))
+
+    @classmethod
+    def exists(cls, index_dir: Path) -> bool:
+        return (Path(index_dir) / cls.META_FILE).exists()
+
+    @staticmethod
+    def _grid(lat: np.ndarray, lon: np.ndarray, cell_size: float) -> Tuple[np.ndarray, np.ndarray]:
+        n_cols, n_rows = int(round(360 / cell_size)), int(round(180 / cell_size))
+        col = np.clip(((lon + 180) / cell_size).astype(np.int64), 0, n_cols - 1)
+        row = np.clip(((lat + 90) / cell_size).astype(np.int64), 0, n_rows - 1)
+        return row, col
+
+    @classmethod
+    def write(cls, df: pd.DataFrame, index_dir: Path, lat_field: str = 'Latitude',
+              lon_field: str = 'Longitude', cell_size: float = GRID_CELL_DEGREES) -> None:
+        """Sort the rows with valid coordinates by grid cell and save keys and row ids"""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        (index_dir / cls.META_FILE).unlink(missing_ok=True)
+
+        lat = pd.to_numeric(df[lat_field], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(df[lon_field], errors='coerce').to_numpy(dtype=float)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon) &
+                               (np.abs(lat) <= 90) & (np.abs(lon) <= 180))
+        row, col = cls._grid(lat[valid], lon[valid], cell_size)
+        keys = row * int(round(360 / cell_size)) + col
+
+        order = np.argsort(keys, kind='stable')
+        np.save(index_dir / 'keys.npy', keys[order])
+        np.save(index_dir / 'rows.npy', valid[order].astype(np.int64))
+
+        meta = {'cell_size': cell_size, 'lat_field': lat_field, 'lon_field': lon_field,
+                'num_rows': len(df), 'indexed_rows': int(len(valid))}
+        with open(index_dir / cls.META_FILE, 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, index_dir: Path) -> 'SpatialIndex':
+        """Open an index with its arrays memory-mapped read-only"""
+        index_dir = Path(index_dir)
+        with open(index_dir / cls.META_FILE, 'r') as f:
+            meta = json.load(f)
+        return cls(meta, np.load(index_dir / 'keys.npy', mmap_mode='r'),
+                   np.load(index_dir / 'rows.npy', mmap_mode='r'))
+
+    def candidates(self, bbox: BBox) -> np.ndarray:
+        """Row ids of every grid cell touching the bounding box (a superset of the rows inside it)"""
+        _, min_lat, _, max_lat = bbox
+        lats = np.array([max(min_lat, -90.0), min(max_lat, 90.0)])
+        slices = []
+        for low, high in _lon_ranges(bbox):
+            grid_rows, grid_cols = self._grid(lats, np.array([max(low, -180.0), min(high, 180.0)]), self.cell_size)
+            row_keys = np.arange(grid_rows[0], grid_rows[1] + 1, dtype=np.int64) * self.n_cols
+            starts = np.searchsorted(self.keys, row_keys + grid_cols[0], side='left')
+            ends = np.searchsorted(self.keys, row_keys + grid_cols[1], side='right')
+            slices.extend(self.rows[start:end] for start, end in zip(starts, ends) if end > start)
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def query(self, bbox: BBox, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """
+        Sorted row ids of the points inside a bounding box. lat / lon are the full
+        coordinate columns; only the candidate rows are read from them.
+        """
+        rows = np.sort(self.candidates(bbox))
+        return rows[bbox_mask(np.asarray(lat[rows], dtype=float), np.asarray(lon[rows], dtype=float), bbox)]
+
+def clip_frame(df: pd.DataFrame, bbox: BBox, lat_field: str = 'Latitude', lon_field: str = 'Longitude') -> pd.DataFrame:
+    """Rows of an unindexed DataFrame (e.g. a query result) inside a bounding box"""
+    lat = pd.to_numeric(df[lat_field], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(df[lon_field], errors='coerce').to_numpy(dtype=float)
+    return df[bbox_mask(lat, lon, bbox)]
+
+def h3_cell_centroids(cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Centroid latitudes and longitudes of integer H3 cells"""
+    centroids = np.array([h3_int.cell_to_latlng(int(cell)) for cell in cells], dtype=float).reshape(-1, 2)
+    return centroids[:, 0], centroids[:, 1]
+
+def clip_collection(result: Dict[str, Any], bbox: BBox, margin: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Keep the features of an aggregated layer whose point or hexagon centroid is inside
+    the bbox grown by margin degrees. Without a margin, hexagons get their edge length
+    as margin so the ones overlapping the bbox edge are kept.
+    """
+    features = result.get('features', [])
+    if result.get('type') == 'H3Collection':
+        cells = np.array([int(feature['hex'], 16) for feature in features], dtype=np.uint64)
+        lat, lon = h3_cell_centroids(cells)
+        if margin is None and len(cells):
+            margin = h3_margin(h3_int.get_resolution(int(cells[0])))
+    else:
+        coordinates = np.array([feature['geometry']['coordinates'][:2] for feature in features], dtype=float).reshape(-1, 2)
+        lon, lat = coordinates[:, 0], coordinates[:, 1]
+    mask = bbox_mask(lat, lon, pad_bbox(bbox, margin or 0.0))
+    return {**result, 'features': [feature for feature, keep in zip(features, mask) if keep]}
@@ -0,0 +1,55 @@
+import json
+import pandas as pd
+from typing import Any, Dict, Iterable, Iterator, List
+from .aggregations import create_points_geojson, dataframe_to_records
+
+# Rows serialized per chunk of a streamed response
+STREAM_BATCH_SIZE = 5000
+
+# Supported values of the ?format= streaming option
+STREAM_FORMATS = ('ndjson', 'chunked')
+
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'chunked': 'application/json'
+}
+
+def _dumps(item: Any) -> str:
+    return json.dumps(item, separators=(',', ':'))
+
+def iter_point_feature_batches(df: pd.DataFrame, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yield point features batch by batch, so only one batch is materialized at a time"""
+    for start in range(0, len(df), batch_size):
+        yield create_points_geojson(df.iloc[start:start + batch_size])['features']
+
+def iter_record_batches(df: pd.DataFrame, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Yield row records batch by batch"""
+    for start in range(0, len(df), batch_size):
+        yield dataframe_to_records(df.iloc[start:start + batch_size])
+
+def iter_list_batches(items: List[Any], batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[Any]]:
+    """Yield an already built list (e.g. aggregated features) in batches"""
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def stream_ndjson(batches: Iterable[List[Any]]) -> Iterator[str]:
+    """Serialize batches as newline-delimited JSON, one item per line and one chunk per batch"""
+    for batch in batches:
+        if batch:
+            yield ''.join(_dumps(item) + '\n' for item in batch)
+
+def stream_json_document(batches: Iterable[List[Any]], fields: Dict[str, Any], list_key: str) -> Iterator[str]:
+    """
+    Serialize a JSON object whose list_key array is produced by batches, e.g. a
+    FeatureCollection, in chunks. The scalar fields are written first.
+    """
+    head = _dumps(fields)[:-1]
+    yield f'{head}{"," if fields else ""}"{list_key}":['
+    first = True
+    for batch in batches:
+        if not batch:
+            continue
+        chunk = ','.join(_dumps(item) for item in batch)
+        yield chunk if first else ',' + chunk
+        first = False
+    yield ']}'
@@ -0,0 +1,213 @@
+import json
+import math
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from .column_store import load_arrays, save_arrays
+
+# Column holding the row timestamps (unix epoch seconds, or datetimes)
+EPOCH_FIELD = 'Epoch'
+
+# Widths in seconds of the precomputed rollup buckets, finest first
+ROLLUP_INTERVALS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Bucket count a time series stays under when its interval is picked automatically
+MAX_SERIES_BUCKETS = 1000
+
+# Reductions of a value field per time bucket (all derived from mergeable rollup statistics)
+SERIES_AGGREGATIONS = ('sum', 'mean', 'count', 'min', 'max')
+
+# Rollup statistics kept per value field
+ROLLUP_STATS = ('count', 'sum', 'min', 'max')
+
+# [start, end) in epoch seconds, either side open when None
+TimeRange = Tuple[Optional[float], Optional[float]]
+
+def _parse_time(value: Any) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Expected epoch seconds or an ISO 8601 time, got {value!r}")
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize('UTC')
+    return timestamp.timestamp()
+
+def parse_time_range(values: Dict[str, Any]) -> Optional[TimeRange]:
+    """Read the optional start / end (epoch seconds or ISO 8601, end exclusive) of a request"""
+    start, end = _parse_time(values.get('start')), _parse_time(values.get('end'))
+    if start is None and end is None:
+        return None
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"start {start} is after end {end}")
+    return start, end
+
+def epoch_seconds(series: pd.Series) -> np.ndarray:
+    """Timestamps of a column as float epoch seconds, NaN where missing or invalid"""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        values = series.to_numpy(dtype='datetime64[ns]')
+        seconds = values.view(np.int64) / 1e9
+        seconds[np.isnat(values)] = np.nan
+        return seconds
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+class TimeIndex:
+    """
+    Row ids sorted by timestamp, stored next to the column store.
+
+    A [start, end) time range is one contiguous slice of the sorted timestamps,
+    found with two binary searches. Rows without a valid timestamp are not indexed.
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, meta: Dict[str, Any], epochs: np.ndarray, rows: np.ndarray):
+        self.meta = meta
+        self.epochs = epochs
+        self.rows = rows
+
+    @classmethod
+    def exists(cls, index_dir: Path) -> bool:
+        return (Path(index_dir) / cls.META_FILE).exists()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, field: str = EPOCH_FIELD) -> 'TimeIndex':
+        """Sort the rows of a DataFrame by timestamp, in memory"""
+        epochs = epoch_seconds(df[field])
+        valid = np.flatnonzero(np.isfinite(epochs))
+        order = np.argsort(epochs[valid], kind='stable')
+        meta = {'field': field, 'num_rows': len(df), 'indexed_rows': int(len(valid)),
+                'min': float(epochs[valid[order[0]]]) if len(valid) else None,
+                'max': float(epochs[valid[order[-1]]]) if len(valid) else None}
+        return cls(meta, epochs[valid][order], valid[order].astype(np.int64))
+
+    @classmethod
+    def write(cls, df: pd.DataFrame, index_dir: Path, field: str = EPOCH_FIELD) -> 'TimeIndex':
+        """Sort the rows by timestamp and save timestamps and row ids"""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        (index_dir / cls.META_FILE).unlink(missing_ok=True)
+
+        index = cls.from_frame(df, field)
+        np.save(index_dir / 'epochs.npy', index.epochs)
+        np.save(index_dir / 'rows.npy', index.rows)
+        with open(index_dir / cls.META_FILE, 'w') as f:
+            json.dump(index.meta, f)
+        return index
+
+    @classmethod
+    def open(cls, index_dir: Path) -> 'TimeIndex':
+        """Open an index with its arrays memory-mapped read-only"""
+        index_dir = Path(index_dir)
+        with open(index_dir / cls.META_FILE, 'r') as f:
+            meta = json.load(f)
+        return cls(meta, np.load(index_dir / 'epochs.npy', mmap_mode='r'),
+                   np.load(index_dir / 'rows.npy', mmap_mode='r'))
+
+    def bounds(self, time_range: Optional[TimeRange]) -> Tuple[float, float]:
+        """[start, end) of a time range, with open sides closed at the first / past the last timestamp"""
+        start, end = time_range or (None, None)
+        if start is None:
+            start = self.meta['min'] if self.meta['min'] is not None else 0.0
+        if end is None:
+            end = math.floor(self.meta['max']) + 1 if self.meta['max'] is not None else start
+        return start, end
+
+    def positions(self, time_range: Optional[TimeRange]) -> slice:
+        """Slice of the sorted timestamps (and their row ids) inside a time range"""
+        start, end = self.bounds(time_range)
+        return slice(int(np.searchsorted(self.epochs, start, side='left')),
+                     int(np.searchsorted(self.epochs, end, side='left')))
+
+    def query(self, time_range: Optional[TimeRange]) -> np.ndarray:
+        """Sorted row ids with a timestamp inside a time range"""
+        return np.sort(self.rows[self.positions(time_range)])
+
+def rollup_value_fields(df: pd.DataFrame, field: str = EPOCH_FIELD) -> List[str]:
+    """Numeric columns that get rollup statistics"""
+    return [col for col in df.columns if col != field and pd.api.types.is_numeric_dtype(df[col].dtype)
+            and not pd.api.types.is_bool_dtype(df[col].dtype)]
+
+def bucket_rows(epochs: np.ndarray, values: pd.DataFrame, width: int) -> pd.DataFrame:
+    """
+    Statistics of rows per time bucket of width seconds, in one grouped pass: the bucket
+    start, the row count and count / sum / min / max of every value column (all mergeable).
+    """
+    valid = np.isfinite(epochs)
+    columns = {'bucket': (np.floor(epochs[valid] / width) * width).astype(np.int64)}
+    for col in values.columns:
+        columns[col] = pd.to_numeric(values[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)[valid]
+    grouped = pd.DataFrame(columns).groupby('bucket', sort=True)
+    stats = grouped.size().rename('rows').to_frame()
+    if len(values.columns):
+        stats = stats.join(grouped.agg(**{f'{col}_{stat}': (col, stat) for col in values.columns for stat in ROLLUP_STATS}))
+    return stats.reset_index()
+
+def merge_buckets(buckets: pd.DataFrame, width: int) -> pd.DataFrame:
+    """Merge bucket statistics into buckets of width seconds (a coarser interval, or overlapping appends)"""
+    merged = buckets.assign(bucket=buckets['bucket'] // width * width)
+    how = {col: 'min' if col.endswith('_min') else 'max' if col.endswith('_max') else 'sum'
+           for col in merged.columns if col != 'bucket'}
+    return merged.groupby('bucket', sort=True).agg(how).reset_index()
+
+def build_rollups(minute_buckets: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Roll per-minute bucket statistics up into every rollup interval"""
+    rollups = {'minute': minute_buckets}
+    previous = 'minute'
+    for interval, width in ROLLUP_INTERVALS.items():
+        if interval != 'minute':
+            rollups[interval] = merge_buckets(rollups[previous], width)
+            previous = interval
+    return rollups
+
+def save_rollups(rollups: Dict[str, pd.DataFrame], rollup_dir: Path, field: str, value_fields: List[str]) -> None:
+    arrays = {f'{interval}_{col}': buckets[col].to_numpy() for interval, buckets in rollups.items()
+              for col in buckets.columns}
+    save_arrays(rollup_dir, arrays, {'field': field, 'value_fields': value_fields,
+                                     'columns': list(rollups['minute'].columns)})
+
+def load_rollups(rollup_dir: Path) -> Tuple[Dict[str, Any], Dict[str, pd.DataFrame]]:
+    """Open rollups as DataFrames over memory-mapped arrays"""
+    meta, arrays = load_arrays(rollup_dir)
+    rollups = {
+        interval: pd.DataFrame({col: arrays[f'{interval}_{col}'] for col in meta['columns']}, copy=False)
+        for interval in ROLLUP_INTERVALS
+    }
+    return meta, rollups
+
+def pick_interval(start: float, end: float, interval: Optional[str] = None) -> str:
+    """Validate a rollup interval, or pick the finest one giving at most MAX_SERIES_BUCKETS buckets"""
+    if interval is not None:
+        if interval not in ROLLUP_INTERVALS:
+            raise ValueError(f"Unsupported interval: {interval}. Expected one of {tuple(ROLLUP_INTERVALS)}")
+        return interval
+    for name, width in ROLLUP_INTERVALS.items():
+        if (end - start) / width <= MAX_SERIES_BUCKETS:
+            return name
+    return 'day'
+
+def bucket_series(buckets: pd.DataFrame, value_field: Optional[str], agg: str) -> List[Dict[str, Any]]:
+    """Series of {time, value, rows} points from bucket statistics; count without a value_field counts rows"""
+    if agg not in SERIES_AGGREGATIONS:
+        raise ValueError(f"Unsupported aggregation: {agg}. Expected one of {SERIES_AGGREGATIONS}")
+    if value_field is None:
+        if agg != 'count':
+            raise ValueError(f"Aggregation {agg} requires a value_field")
+        values = buckets['rows'].to_numpy(dtype=float)
+    elif agg == 'mean':
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = buckets[f'{value_field}_sum'].to_numpy(dtype=float) / buckets[f'{value_field}_count'].to_numpy()
+    else:
+        values = buckets[f'{value_field}_{agg}'].to_numpy(dtype=float)
+    if agg == 'count':
+        values = values.astype(np.int64).tolist()
+    else:
+        values = [None if math.isnan(value) else value for value in values.tolist()]
+    return [{'time': time, 'value': value, 'rows': rows}
+            for time, value, rows in zip(buckets['bucket'].tolist(), values, buckets['rows'].tolist())]
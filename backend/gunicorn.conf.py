@@ -0,0 +1,22 @@
+import os
+
+wsgi_app = 'app:create_app(start_scheduler=False)'
+bind = f"0.0.0.0:{os.getenv('PORT', '5003')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+worker_tmp_dir = '/dev/shm'
+accesslog = '-'
+errorlog = '-'
+
+# Build the app once in the master: datasets are preprocessed and memory-mapped there, and
+# the forked workers share those pages (copy-on-write, never written) instead of each
+# loading its own copy, so per-worker memory stays flat as workers are added
+preload_app = True
+
+def post_fork(server, worker):
+    """Threads do not survive the fork, start the background ones in every worker"""
+    from app.routes.data import start_refresh_scheduler
+    from app.routes.views import view_manager
+    view_manager.start_watching()
+    start_refresh_scheduler()
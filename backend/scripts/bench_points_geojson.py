@@ -0,0 +1,63 @@
+"""
+Benchmark of points GeoJSON conversion: the previous row-by-row iterrows() conversion
+against create_points_geojson(), which works on whole columns.
+
+Run from backend/:  python -m scripts.bench_points_geojson --rows 10000 100000 1000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Dict
+from app.utils.aggregations import create_points_geojson
+
+def iterrows_points_geojson(df: pd.DataFrame) -> Dict[str, Any]:
+    """The conversion used before create_points_geojson"""
+    features = []
+    for _, row in df.iterrows():
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(row['Longitude']), float(row['Latitude'])]},
+            "properties": {key: value for key, value in row.items() if key not in ['Latitude', 'Longitude']}
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def synthetic_ndr_rows(rows: int, seed: int = 0) -> pd.DataFrame:
+    """NDR-like rows with the 7 columns of datasets/sample_ndrs.csv"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Latitude': rng.uniform(37.6, 37.9, rows),
+        'Longitude': rng.uniform(-122.6, -122.3, rows),
+        'Epoch': 1739326200 + rng.integers(0, 86400, rows),
+        'Flight_Usage_Mbps': rng.uniform(0, 20, rows).round(2),
+        'Airline': rng.choice(['United', 'Delta', 'American', 'Alaska'], rows),
+        'Terminal_Type': rng.choice(['A', 'B', 'C'], rows),
+        'Name': [f'NDR_{i}' for i in range(rows)]
+    })
+
+def best_of(function, df: pd.DataFrame, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'iterrows':>16}  {'columnar':>16}  speedup")
+    for rows in args.rows:
+        df = synthetic_ndr_rows(rows)
+        # Both conversions must produce the same features
+        sample = df.head(1000)
+        assert iterrows_points_geojson(sample)['features'] == create_points_geojson(sample)['features']
+        before = best_of(iterrows_points_geojson, df, args.repeat)
+        after = best_of(create_points_geojson, df, args.repeat)
+        print(f"{rows:>10,}  {rows / before:>11,.0f} rows/s  {rows / after:>11,.0f} rows/s  {before / after:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Connectors run against moto: no test data, no real credentials
+os.environ['ATHENA_TEST_MODE'] = 'false'
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from moto import mock_aws
+
+@pytest.fixture
+def aws():
+    """Mocked AWS services for the duration of a test"""
+    with mock_aws():
+        yield
@@ -0,0 +1,114 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import pandas as pd
+import pytest
+from moto.athena.models import QueryResults, athena_backends
+from moto.core import DEFAULT_ACCOUNT_ID
+from moto.moto_api import state_manager
+
+from app.utils.data_connectors import athena_connector
+from app.utils.data_connectors.athena_connector import AthenaConnector, _ChunkStream
+
+REGION = 'us-east-1'
+OUTPUT_BUCKET = 'athena-results'
+OUTPUT_LOCATION = f's3://{OUTPUT_BUCKET}/queries/'
+
+COLUMNS = [('id', 'integer'), ('carrier', 'varchar'), ('usage', 'double'), ('seen_at', 'timestamp')]
+
+def _backend():
+    return athena_backends[DEFAULT_ACCOUNT_ID][REGION]
+
+def _queue_result(rows):
+    """Queue the result of the next query (the header row first, as Athena returns it)"""
+    column_info = [{'Name': name, 'Type': athena_type} for name, athena_type in COLUMNS]
+    data = [[name for name, _ in COLUMNS]] + rows
+    _backend().query_results_queue.append(QueryResults(
+        rows=[{'Data': [{'VarCharValue': value} if value is not None else {} for value in row]} for row in data],
+        column_info=column_info))
+
+def _rows(count):
+    return [[str(i), f'carrier-{i % 7}', f'{i * 0.5}' if i % 10 else None, f'2024-01-01 00:{i % 60:02d}:00']
+            for i in range(count)]
+
+@pytest.fixture
+def connector(aws):
+    boto3.client('s3', region_name=REGION).create_bucket(Bucket=OUTPUT_BUCKET)
+    return AthenaConnector()
+
+def test_small_result_is_read_through_get_query_results(connector):
+    _queue_result(_rows(5))
+
+    df = connector.execute_query('SELECT * FROM flights', 'ndr', None, REGION, OUTPUT_LOCATION)
+
+    assert df.attrs['athena']['download_method'] == 'get_query_results'
+    assert df['id'].tolist() == [0, 1, 2, 3, 4]
+    assert df['carrier'].tolist() == ['carrier-0', 'carrier-1', 'carrier-2', 'carrier-3', 'carrier-4']
+    assert pd.isna(df['usage'][0]) and df['usage'][3] == 1.5
+    assert pd.api.types.is_datetime64_any_dtype(df['seen_at'])
+
+def test_large_result_is_streamed_from_s3_in_ranges(connector, monkeypatch):
+    monkeypatch.setattr(athena_connector, 'SMALL_RESULT_BYTES', 1024)
+    monkeypatch.setattr(athena_connector, 'DOWNLOAD_CHUNK_BYTES', 512)
+    monkeypatch.setattr(athena_connector, 'DOWNLOAD_WORKERS', 2)
+    _queue_result(_rows(2000))
+
+    df = connector.execute_query('SELECT * FROM flights', 'ndr', None, REGION, OUTPUT_LOCATION)
+
+    timings = df.attrs['athena']
+    assert timings['download_method'] == 's3'
+    assert timings['result_bytes'] > 100 * 512
+    assert len(df) == 2000
+    assert df['id'].tolist() == list(range(2000))
+    assert df['usage'].isna().sum() == 200
+    assert df['carrier'][1999] == 'carrier-4'
+
+def test_failed_query_raises(connector):
+    athena_client = connector.get_client('athena', REGION)
+    query_id = athena_client.start_query_execution(QueryString='SELECT broken')['QueryExecutionId']
+    execution = _backend().executions[query_id]
+    execution.status = 'FAILED'
+
+    with pytest.raises(RuntimeError, match=f'Athena query {query_id} failed'):
+        connector._wait_for_query(athena_client, query_id)
+
+def test_cancelled_query_raises(connector):
+    athena_client = connector.get_client('athena', REGION)
+    query_id = athena_client.start_query_execution(QueryString='SELECT 1')['QueryExecutionId']
+    athena_client.stop_query_execution(QueryExecutionId=query_id)
+
+    with pytest.raises(RuntimeError, match='cancelled'):
+        connector._wait_for_query(athena_client, query_id)
+
+def test_query_is_cancelled_after_the_timeout(connector, monkeypatch):
+    monkeypatch.setattr(athena_connector, 'QUERY_TIMEOUT', 0.3)
+    monkeypatch.setattr(athena_connector, 'POLL_INITIAL_INTERVAL', 0.05)
+    # Queries stay QUEUED for the whole test
+    state_manager.set_transition('athena::execution', {'progression': 'manual', 'times': 1000})
+    try:
+        with pytest.raises(TimeoutError, match='was cancelled'):
+            connector.execute_query('SELECT * FROM flights', 'ndr', None, REGION, OUTPUT_LOCATION)
+    finally:
+        state_manager.unset_transition('athena::execution')
+
+    (execution,) = _backend().executions.values()
+    assert execution.status == 'CANCELLED'
+
+def test_chunk_stream_fetches_a_bounded_window_ahead():
+    fetched = []
+    lock = threading.Lock()
+
+    def fetch(start):
+        with lock:
+            fetched.append(start)
+        return bytes([start % 256]) * 10
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stream = _ChunkStream(executor, fetch, range(100), window=3)
+        reader = io.BufferedReader(stream, buffer_size=10)
+        assert reader.read(10) == bytes([0]) * 10
+        executor.shutdown(wait=True)
+        assert sorted(fetched) == [0, 1, 2, 3]
+        stream.close()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.filters import MAX_REGEX_LENGTH, compile_filters
+
+FLIGHTS = pd.DataFrame({
+    'Airline': ['Delta', None, 'United', np.nan, 'Alaska'],
+    'Flight_Usage_Mbps': [1.0, 2.0, 3.0, 4.0, 5.0],
+})
+
+def _mask(filters, logic='and', df=FLIGHTS):
+    return compile_filters(filters, logic)(df).tolist()
+
+@pytest.mark.parametrize('df', [FLIGHTS, FLIGHTS.astype({'Airline': 'category'})])
+def test_contains_and_regex_never_match_missing_values(df):
+    assert _mask([{'column': 'Airline', 'operator': 'contains', 'value': 'n'}], df=df) == [False, False, True, False, False]
+    assert _mask([{'column': 'Airline', 'operator': 'contains', 'value': 'na'}], df=df) == [False] * 5
+    assert _mask([{'column': 'Airline', 'operator': 'regex', 'value': '^[ND]'}], df=df) == [True, False, False, False, False]
+
+def test_invalid_regex_is_a_value_error():
+    with pytest.raises(ValueError, match='Invalid regex filter on Airline'):
+        compile_filters([{'column': 'Airline', 'operator': 'regex', 'value': '(unclosed'}])
+
+def test_long_regex_is_rejected():
+    with pytest.raises(ValueError, match='longer than'):
+        compile_filters([{'column': 'Airline', 'operator': 'regex', 'value': 'a' * (MAX_REGEX_LENGTH + 1)}])
+
+def test_empty_group_is_neutral():
+    low = {'column': 'Flight_Usage_Mbps', 'operator': 'less_than', 'value': 2}
+    empty = {'logic': 'and', 'filters': [{'column': 'Airline', 'operator': 'equals'}]}
+
+    assert _mask([low, empty], 'or') == [True, False, False, False, False]
+    assert _mask([low, empty], 'and') == [True, False, False, False, False]
+    assert _mask([empty], 'or') == [True] * 5
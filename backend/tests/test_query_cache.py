@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.query_cache import QueryResultCache, heap_nbytes
+
+def _result():
+    return pd.DataFrame({'value': np.arange(10_000, dtype=float)})
+
+def _labelled_result():
+    return pd.DataFrame({'value': np.arange(20_000, dtype=float), 'label': [f'label-{i}' for i in range(20_000)]})
+
+def _disk_bytes(path):
+    return sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+
+def test_disk_tier_stays_within_its_budget(tmp_path):
+    cache = QueryResultCache(tmp_path, max_bytes=1, max_disk_bytes=300_000)
+
+    for i in range(10):
+        cache.get_or_fetch(f'query-{i}', _result)
+
+    assert _disk_bytes(tmp_path) <= 300_000
+    # The newest result is kept on disk and in memory
+    assert cache.fetched_at('query-9') is not None
+    assert cache.get_or_fetch('query-9', lambda: 1 / 0)['value'].sum() == _result()['value'].sum()
+
+def test_results_used_recently_are_kept(tmp_path):
+    cache = QueryResultCache(tmp_path, max_bytes=1, max_disk_bytes=300_000)
+
+    for i in range(6):
+        cache.get_or_fetch(f'query-{i}', _result)
+        cache.get_or_fetch('query-0', lambda: 1 / 0)
+
+    assert cache.fetched_at('query-0') is not None
+    assert cache.fetched_at('query-1') is None
+
+def test_refreshes_replace_superseded_versions(tmp_path):
+    cache = QueryResultCache(tmp_path, max_bytes=1)
+
+    for _ in range(5):
+        cache.refresh('query', _result)
+
+    (entry_dir,) = tmp_path.iterdir()
+    # The published version and the one before it, for readers still opening it
+    assert len([path for path in entry_dir.iterdir() if path.is_dir()]) == 2
+
+def test_memory_tier_evicts_past_its_budget(tmp_path):
+    # The labels' categories stay on the heap even when the columns are memory-mapped
+    entry_bytes = heap_nbytes(QueryResultCache(tmp_path / 'probe').get_or_fetch('probe', _labelled_result))
+    assert entry_bytes > 0
+    cache = QueryResultCache(tmp_path / 'cache', max_bytes=int(entry_bytes * 2.5))
+
+    for i in range(5):
+        cache.get_or_fetch(f'query-{i}', _labelled_result)
+
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert 0 < stats['memory_bytes'] <= stats['max_bytes']
+    # Evicted results are read back from the disk tier, not fetched again
+    assert cache.get_or_fetch('query-0', lambda: 1 / 0)['label'][5] == 'label-5'
@@ -0,0 +1,134 @@
+import gzip
+import io
+import json
+
+import boto3
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils.data_connectors import s3_connector
+from app.utils.data_connectors.s3_connector import S3Connector
+
+REGION = 'us-east-1'
+BUCKET = 'ndr-data'
+
+FLIGHTS = pd.DataFrame({
+    'Flight_ID': [f'F{i:04d}' for i in range(500)],
+    'Latitude': [40.0 + i / 100 for i in range(500)],
+    'Longitude': [-70.0 - i / 100 for i in range(500)],
+    'Flight_Usage_Mbps': [float(i % 50) for i in range(500)],
+})
+
+@pytest.fixture
+def client(aws):
+    s3 = boto3.client('s3', region_name=REGION)
+    s3.create_bucket(Bucket=BUCKET)
+    return s3
+
+@pytest.fixture
+def connector(client):
+    return S3Connector()
+
+def _put(client, key, body):
+    client.put_object(Bucket=BUCKET, Key=key, Body=body)
+
+def _jsonl(df):
+    return df.to_json(orient='records', lines=True).encode()
+
+def test_unchanged_object_is_reused_through_its_etag(client, connector, monkeypatch):
+    _put(client, 'flights.csv', FLIGHTS.to_csv(index=False).encode())
+    first = connector.read_object(BUCKET, 'flights.csv')
+
+    downloads = []
+    download = connector._download
+    monkeypatch.setattr(connector, '_download', lambda *args: downloads.append(args[-1]) or download(*args))
+    second = connector.read_object(BUCKET, 'flights.csv')
+
+    # The cached ETag was sent and the object was not modified
+    assert downloads == [first.attrs['s3']['etag']]
+    assert second is first
+
+def test_changed_object_is_downloaded_again(client, connector):
+    _put(client, 'flights.csv', FLIGHTS.to_csv(index=False).encode())
+    first = connector.read_object(BUCKET, 'flights.csv')
+    _put(client, 'flights.csv', FLIGHTS.head(10).to_csv(index=False).encode())
+
+    second = connector.read_object(BUCKET, 'flights.csv')
+
+    assert len(first) == 500 and len(second) == 10
+    assert second.attrs['s3']['etag'] != first.attrs['s3']['etag']
+
+def test_recently_checked_object_needs_no_request(client, connector):
+    _put(client, 'flights.csv', FLIGHTS.to_csv(index=False).encode())
+    first = connector.read_object(BUCKET, 'flights.csv', max_age=60)
+    client.delete_object(Bucket=BUCKET, Key='flights.csv')
+
+    assert connector.read_object(BUCKET, 'flights.csv', max_age=60) is first
+
+def test_parquet_reads_only_the_ranges_of_the_kept_columns(client, connector):
+    # Large enough that the speculative footer read (64 KiB) is small next to the skipped columns
+    rng = np.random.default_rng(0)
+    wide = pd.concat([FLIGHTS] * 40, ignore_index=True)
+    wide = wide.assign(**{f'payload_{i}': rng.random(len(wide)) for i in range(8)})
+    buffer = io.BytesIO()
+    wide.to_parquet(buffer, index=False, row_group_size=5000)
+    _put(client, 'flights.parquet', buffer.getvalue())
+
+    df = connector.read_object(BUCKET, 'flights.parquet', columns=['Latitude', 'Longitude', 'missing'])
+
+    assert list(df.columns) == ['Latitude', 'Longitude']
+    pd.testing.assert_frame_equal(df, wide[['Latitude', 'Longitude']])
+    details = df.attrs['s3']
+    assert details['bytes'] < details['size'] / 4
+
+def test_unchanged_parquet_is_reused_through_its_etag(client, connector):
+    buffer = io.BytesIO()
+    FLIGHTS.to_parquet(buffer, index=False)
+    _put(client, 'flights.parquet', buffer.getvalue())
+
+    first = connector.read_object(BUCKET, 'flights.parquet')
+
+    assert connector.read_object(BUCKET, 'flights.parquet') is first
+
+def test_csv_is_streamed_keeping_the_requested_columns(client, connector, monkeypatch):
+    monkeypatch.setattr(s3_connector, 'S3_STREAM_CHUNK_BYTES', 256)
+    _put(client, 'flights.csv', FLIGHTS.to_csv(index=False).encode())
+
+    df = connector.read_object(BUCKET, 'flights.csv', columns=['Flight_ID', 'Flight_Usage_Mbps'])
+
+    pd.testing.assert_frame_equal(df, FLIGHTS[['Flight_ID', 'Flight_Usage_Mbps']])
+    assert df.attrs['s3']['rows'] == 500
+
+def test_gzipped_jsonl_is_parsed_in_batches(client, connector, monkeypatch):
+    monkeypatch.setattr(s3_connector, 'S3_STREAM_CHUNK_BYTES', 256)
+    monkeypatch.setattr(s3_connector, 'JSONL_BATCH_LINES', 64)
+    body = gzip.compress(_jsonl(FLIGHTS))
+    _put(client, 'flights.jsonl.gz', body)
+
+    df = connector.read_object(BUCKET, 'flights.jsonl.gz', columns=['Flight_ID', 'Latitude'])
+
+    pd.testing.assert_frame_equal(df, FLIGHTS[['Flight_ID', 'Latitude']])
+    # Bytes counted are the compressed ones read from the network
+    assert df.attrs['s3']['bytes'] == len(body)
+
+def test_gzipped_csv_with_explicit_format(client, connector):
+    _put(client, 'exports/latest', gzip.compress(FLIGHTS.to_csv(index=False).encode()))
+
+    df = connector.read_object(BUCKET, 'exports/latest', file_format='csv', compression='gzip')
+
+    pd.testing.assert_frame_equal(df, FLIGHTS)
+
+def test_json_records_become_a_dataframe_and_other_documents_are_returned_parsed(client, connector):
+    _put(client, 'flights.json', json.dumps(FLIGHTS.head(3).to_dict(orient='records')).encode())
+    geojson = {'type': 'FeatureCollection', 'features': []}
+    _put(client, 'regions.geojson', json.dumps(geojson).encode())
+
+    df = connector.read_object(BUCKET, 'flights.json', columns=['Flight_ID'])
+
+    assert df['Flight_ID'].tolist() == ['F0000', 'F0001', 'F0002']
+    assert connector.read_object(BUCKET, 'regions.geojson') == geojson
+
+def test_unsupported_format_is_rejected(connector):
+    with pytest.raises(ValueError, match='Unsupported S3 object format'):
+        connector.read_object(BUCKET, 'flights.xlsx', file_format='xlsx')
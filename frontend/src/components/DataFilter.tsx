@@ -57,8 +57,9 @@ const DataFilter: React.FC<DataFilterProps> = ({ columns, onFiltersChange }) =>
 
   const handleValuesChange = () => {
     const values = form.getFieldsValue();
+    // 0 and false are valid filter values, only drop filters without a value
     const filters = values.filters?.filter((f: any) => 
-      f && f.column && f.operator && f.value
+      f && f.column && f.operator && f.value !== undefined && f.value !== null && f.value !== ''
     ) || [];
     onFiltersChange(filters);
   };
@@ -30,6 +30,9 @@ interface ViewConfig {
   last_updated: number;
 }
 
+// Source types bucketed by the /timeseries endpoint; line charts of other sources plot their records
+const TIME_SERIES_SOURCE_TYPES = ['file', 'athena'];
+
 interface DynamicViewProps {
   viewId: string;
   mapboxToken: string;
@@ -352,62 +355,68 @@ const DynamicView: React.FC<DynamicViewProps> = ({ viewId, mapboxToken }) => {
 
       for (const vis of visualizations) {
         try {
-          const response = await axios.get(`${config.API_BASE_URL}/data/${vis.data_source}`);
-          const sourceData = response.data;
-          const records = sourceData.data || []; // Use data field from response
-
+          const properties = vis.properties || {};
           if (vis.type === 'line') {
+            const maxPoints = properties.max_points || 500;
+            const downsample = properties.downsample || 'lttb';
+            const source = (viewConfig.config.data_sources || []).find((s: any) => s.id === vis.data_source);
+            if (!source || TIME_SERIES_SOURCE_TYPES.includes(source.type)) {
+              // Bucketed and downsampled on the server to about one point per pixel of the chart;
+              // without a y_field the chart counts rows per bucket
+              const response = await axios.get(`${config.API_BASE_URL}/data/${vis.data_source}/timeseries`, {
+                params: {
+                  value_field: properties.y_field,
+                  agg: properties.aggregation || (properties.y_field ? 'mean' : 'count'),
+                  max_points: maxPoints,
+                  downsample
+                }
+              });
+              const series = response.data.series || [];
+              setVisualizationData(prev => ({
+                ...prev,
+                [vis.id]: {
+                  x: series.map((point: any) => new Date(point.time * 1000)),
+                  y: series.map((point: any) => point.value),
+                  type: 'scatter',
+                  mode: properties.mode || 'lines'
+                }
+              }));
+            } else {
+              // Other sources return their records, downsampled to the same point budget
+              const response = await axios.post(`${config.API_BASE_URL}/data/${vis.data_source}/filtered`, {
+                filters: [],
+                max_points: maxPoints,
+                downsample
+              });
+              const records = Array.isArray(response.data) ? response.data : [];
+              const xField = properties.x_field || 'Epoch';
+              const yField = properties.y_field || 'Flight_Usage_Mbps';
+              setVisualizationData(prev => ({
+                ...prev,
+                [vis.id]: {
+                  x: records.map((record: any) => record[xField]),
+                  y: records.map((record: any) => record[yField]),
+                  type: 'scatter',
+                  mode: properties.mode || 'lines'
+                }
+              }));
+            }
+          } else if (vis.type === 'pie' || vis.type === 'bar') {
+            // Grouped on the server, one row per label / bar comes back
+            const groupField = vis.type === 'pie' ? properties.label_field : properties.x_field;
+            const valueField = vis.type === 'pie' ? properties.value_field : properties.y_field;
+            const response = await axios.get(`${config.API_BASE_URL}/data/${vis.data_source}/aggregate`, {
+              params: { group_by: groupField, value_field: valueField, agg: properties.aggregation || 'sum' }
+            });
+            const rows = response.data.rows || [];
+            const labels = rows.map((row: any) => row[groupField]);
+            const values = rows.map((row: any) => row.value);
+
             setVisualizationData(prev => ({
               ...prev,
-              [vis.id]: {
-                x: records.map((d: any) => d.Epoch),
-                y: records.map((d: any) => d.Flight_Usage_Mbps),
-                type: 'scatter',
-                mode: 'lines+markers'
-              }
-            }));
-          } else if (vis.type === 'pie') {
-            // Group by airline and sum up usage
-            const airlineData = records.reduce((acc: any, curr: any) => {
-              const airline = curr.Airline;
-              const usage = curr.Flight_Usage_Mbps;
-              acc[airline] = (acc[airline] || 0) + usage;
-              return acc;
-            }, {});
-            
-            setVisualizationData(prev => ({
-              ...prev,
-              [vis.id]: {
-                values: Object.values(airlineData),
-                labels: Object.keys(airlineData),
-                type: 'pie'
-              }
-            }));
-          } else if (vis.type === 'bar') {
-            // Group by Terminal_Type and calculate average usage
-            const terminalData = records.reduce((acc: any, curr: any) => {
-              const type = curr.Terminal_Type;
-              const usage = curr.Flight_Usage_Mbps;
-              if (!acc[type]) {
-                acc[type] = { total: 0, count: 0 };
-              }
-              acc[type].total += usage;
-              acc[type].count += 1;
-              return acc;
-            }, {});
-            
-            const averages = Object.entries(terminalData).map(([type, data]: [string, any]) => ({
-              type,
-              average: data.total / data.count
-            }));
-            
-            setVisualizationData(prev => ({
-              ...prev,
-              [vis.id]: {
-                x: averages.map(d => d.type),
-                y: averages.map(d => d.average),
-                type: 'bar'
-              }
+              [vis.id]: vis.type === 'pie'
+                ? { values, labels, type: 'pie' }
+                : { x: labels, y: values, type: 'bar' }
             }));
           }
         } catch (error) {
@@ -19,10 +19,91 @@ export interface ColumnMetadata {
   max?: number;
 }
 
-export interface FilterDefinition {
+export type FilterOperator =
+  | 'equals'
+  | 'contains'
+  | 'greater_than'
+  | 'less_than'
+  | 'in'
+  | 'between'
+  | 'not_in'
+  | 'is_null'
+  | 'not_null'
+  | 'regex';
+
+export interface FilterCondition {
   column: string;
-  operator: 'equals' | 'contains' | 'greater_than' | 'less_than' | 'in';
-  value: any;
+  operator: FilterOperator;
+  value?: any;
+}
+
+export interface FilterGroup {
+  logic: 'and' | 'or';
+  filters: FilterDefinition[];
+}
+
+export type FilterDefinition = FilterCondition | FilterGroup;
+
+type TypedArray =
+  | Int8Array | Uint8Array | Int16Array | Uint16Array
+  | Int32Array | Uint32Array | Float32Array | Float64Array;
+
+export interface BinaryColumn {
+  name: string;
+  type: string;
+  size: number;
+  offset: number;
+  byteLength: number;
+  encoding?: 'dictionary' | 'h3' | 'timestamp_ms';
+  dictionary?: any[];
+}
+
+export interface BinaryColumns {
+  length: number;
+  header: BinaryColumn[];
+  columns: Record<string, TypedArray>;
+}
+
+const TYPED_ARRAYS: Record<string, new (buffer: ArrayBuffer, byteOffset: number, length: number) => TypedArray> = {
+  int8: Int8Array,
+  uint8: Uint8Array,
+  int16: Int16Array,
+  uint16: Uint16Array,
+  int32: Int32Array,
+  uint32: Uint32Array,
+  float32: Float32Array,
+  float64: Float64Array
+};
+
+/**
+ * Wrap a binary columnar payload (?format=binary) in typed arrays without copying.
+ * positions holds [lon, lat] float32 pairs; dictionary columns hold codes into column.dictionary.
+ */
+export function decodeBinaryColumns(buffer: ArrayBuffer): BinaryColumns {
+  const view = new DataView(buffer);
+  const magic = new TextDecoder().decode(new Uint8Array(buffer, 0, 4));
+  if (magic !== 'VBC1') {
+    throw new Error('Not a binary columnar payload');
+  }
+  const headerLength = view.getUint32(4, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+  const dataStart = 8 + headerLength;
+
+  const columns: Record<string, TypedArray> = {};
+  for (const column of header.columns as BinaryColumn[]) {
+    const ArrayType = TYPED_ARRAYS[column.type];
+    columns[column.name] = new ArrayType(
+      buffer, dataStart + column.offset, column.byteLength / ArrayType.BYTES_PER_ELEMENT
+    );
+  }
+  return { length: header.length, header: header.columns, columns };
+}
+
+/**
+ * Rebuild the H3 index string of row i from an "h3" encoded [high, low] word column
+ */
+export function h3IndexAt(words: Uint32Array, i: number): string {
+  return words[2 * i].toString(16) + words[2 * i + 1].toString(16).padStart(8, '0');
 }
 
 export class DataService {
@@ -123,6 +204,23 @@ export class DataService {
     }
   }
 
+  /**
+   * Fetch a filtered map layer as typed columns instead of GeoJSON
+   */
+  async getFilteredColumns(sourceId: string, filters: FilterDefinition[], layerConfig: any): Promise<BinaryColumns> {
+    try {
+      const response = await axios.post(
+        `${this.baseUrl}/api/data/${sourceId}/filtered`,
+        { filters, layer_config: layerConfig, format: 'binary' },
+        { responseType: 'arraybuffer' }
+      );
+      return decodeBinaryColumns(response.data);
+    } catch (error) {
+      console.error('Error fetching filtered columns:', error);
+      throw error;
+    }
+  }
+
   /**
    * Cache management methods could be added here
    */